@@ -0,0 +1,22 @@
+import os
+import shutil
+import tempfile
+
+# Workers write their metrics here and /metrics adds them up. This has to be
+# set before prometheus_client is imported, in the master and in every worker.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'applizz-metrics')
+)
+
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    # Values left behind by a previous run would be added to this one's
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges (pool connections) of a worker that exited
+    multiprocess.mark_process_dead(worker.pid)
@@ -5,9 +5,12 @@ from flask_cors import CORS
 from flask_wtf.csrf import CSRFProtect
 from .config.mongodb import init_mongodb, mongo
 from .models.user import User
+from .services.logo_resolver import logo_resolver
+from .services.storage import document_storage
+from .utils.query_profiler import query_profiler
+from .utils.metrics import metrics
 from dotenv import load_dotenv
 import logging
-from bson.objectid import ObjectId
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,11 +31,34 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', 'default-secret-key'),
         MONGODB_URI=os.environ.get('MONGODB_URI'),
+        MONGO_MAX_POOL_SIZE=os.environ.get('MONGO_MAX_POOL_SIZE', 100),
+        MONGO_MIN_POOL_SIZE=os.environ.get('MONGO_MIN_POOL_SIZE', 0),
+        MONGO_MAX_IDLE_TIME_MS=os.environ.get('MONGO_MAX_IDLE_TIME_MS'),
+        MONGO_WAIT_QUEUE_TIMEOUT_MS=os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        MONGO_CONNECT_TIMEOUT_MS=os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000),
+        MONGO_SERVER_SELECTION_TIMEOUT_MS=os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        MONGO_SOCKET_TIMEOUT_MS=os.environ.get('MONGO_SOCKET_TIMEOUT_MS'),
+        MONGO_COMPRESSORS=os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib'),
+        MONGO_RETRY_WRITES=os.environ.get('MONGO_RETRY_WRITES', 'true'),
+        MONGO_RETRY_READS=os.environ.get('MONGO_RETRY_READS', 'true'),
+        MONGO_ANALYTICS_READ_PREFERENCE=os.environ.get('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred'),
+        MONGO_ANALYTICS_MAX_STALENESS_S=os.environ.get('MONGO_ANALYTICS_MAX_STALENESS_S'),
         UPLOAD_FOLDER=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'),
         MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16 MB max upload
+        DOCUMENT_STORAGE=os.environ.get('DOCUMENT_STORAGE', 'local'),  # 'local' or 'gridfs'
+        DOCUMENT_STORAGE_PATH=os.environ.get('DOCUMENT_STORAGE_PATH'),
+        USE_X_SENDFILE=os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true',
+        QUERY_PROFILER=os.environ.get('QUERY_PROFILER', 'true'),
+        SLOW_REQUEST_DB_MS=os.environ.get('SLOW_REQUEST_DB_MS', 100),
+        SERVER_TIMING=os.environ.get('SERVER_TIMING', 'true'),
+        METRICS_TOKEN=os.environ.get('METRICS_TOKEN'),
         DEBUG=os.environ.get('FLASK_ENV') != 'production'
     )
     
+    # Overrides for tests and benchmarks, e.g. another MONGODB_URI or WTF_CSRF_ENABLED=False
+    if test_config:
+        app.config.from_mapping(test_config)
+    
     # Log configuration
     logging.info(f"MongoDB URI: {app.config['MONGODB_URI']}")
     
@@ -46,6 +72,10 @@ def create_app(test_config=None):
     # Initialize extensions
     login_manager.init_app(app)
     csrf.init_app(app)
+    logo_resolver.init_app(app)
+    document_storage.init_app(app)
+    query_profiler.init_app(app)
+    metrics.init_app(app)
     CORS(app)
     
     # Register blueprints
@@ -60,8 +90,7 @@ def create_app(test_config=None):
     # User loader for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        return User(data) if data else None
+        return User.get_cached(user_id)
     
     # Error handlers
     @app.errorhandler(404)
@@ -1,51 +1,112 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from job_app_tracker.models.application import Application
-from job_app_tracker.utils.company_logo import get_company_logo_url
+from job_app_tracker.services.logo_resolver import logo_resolver
+from job_app_tracker.services.bulk_import import IMPORT_FORMATS, detect_format, import_applications
+from job_app_tracker.services.bulk_export import EXPORT_FORMATS, export_applications
+from job_app_tracker.utils.metrics import APPLICATIONS_CREATED
 from datetime import datetime
 
 application = Blueprint('application', __name__)
 
+UPDATABLE_FIELDS = {
+    'company', 'position', 'status', 'notes', 'date_applied', 'url', 'deadline', 'company_logo', 'tags'
+}
+
+def _parse_date(value):
+    """Parse an ISO date string from a JSON payload"""
+    if not value or isinstance(value, datetime):
+        return value or None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
 @application.route('/application/create', methods=['POST'])
 @login_required
 def create_application():
     data = request.get_json()
     
-    # Get company logo if URL is provided
+    # Use the cached company logo if there is one; otherwise it is looked up
+    # in the background once the application exists
     url = data.get('url')
-    company_logo = get_company_logo_url(url) if url else None
-    
-    application = Application.create_application(
-        user_id=current_user.id,
-        company=data.get('company'),
-        position=data.get('position'),
-        status=data.get('status', 'Applied'),
-        notes=data.get('notes', ''),
-        date_applied=data.get('date_applied', datetime.utcnow()),
-        url=url,
-        deadline=data.get('deadline'),
-        company_logo=company_logo
-    )
+    logo_cached, company_logo = logo_resolver.cached(url) if url else (True, None)
+    
+    application = Application.create({
+        'user_id': str(current_user.id),
+        'company': data.get('company'),
+        'position': data.get('position'),
+        'status': data.get('status', 'Applied'),
+        'notes': data.get('notes', ''),
+        'date_applied': _parse_date(data.get('date_applied')) or datetime.utcnow(),
+        'url': url,
+        'deadline': _parse_date(data.get('deadline')),
+        'company_logo': company_logo
+    })
+    APPLICATIONS_CREATED.inc()
+    
+    if not logo_cached:
+        logo_resolver.resolve_async(application.id, url)
     
-    return jsonify(application), 201
+    return jsonify(application.to_dict()), 201
 
 @application.route('/application/update/<application_id>', methods=['PUT'])
 @login_required
 def update_application(application_id):
     data = request.get_json()
     
+    application = Application.get_by_id(application_id, current_user.id)
+    if not application:
+        return jsonify({'error': 'Application not found'}), 404
+    
     # Get company logo if URL is provided and changed
     url = data.get('url')
-    if url:
-        company_logo = get_company_logo_url(url)
-        data['company_logo'] = company_logo
-    
-    application = Application.update_application(
-        application_id=application_id,
-        user_id=current_user.id,
-        **data
-    )
+    logo_cached = True
+    if url and url != application.url:
+        logo_cached, data['company_logo'] = logo_resolver.cached(url)
+    
+    # Only allow updating the application's own fields
+    updates = {key: value for key, value in data.items() if key in UPDATABLE_FIELDS}
+    for key in ('date_applied', 'deadline'):
+        if key in updates:
+            updates[key] = _parse_date(updates[key])
+    
+    application.update(updates)
     
-    if application:
-        return jsonify(application)
-    return jsonify({'error': 'Application not found'}), 404 
\ No newline at end of file
+    if not logo_cached:
+        logo_resolver.resolve_async(application.id, url)
+    
+    return jsonify(application.to_dict())
+
+@application.route('/applications/import', methods=['POST'])
+@login_required
+def import_applications_file():
+    """Import applications from an uploaded CSV, JSON or NDJSON file"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    import_format = request.form.get('format') or detect_format(upload.filename, upload.content_type)
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format; use one of {', '.join(IMPORT_FORMATS)}"}), 400
+    
+    # The upload is read straight from werkzeug's spooled temporary file
+    result = import_applications(current_user.id, upload.stream, import_format)
+    APPLICATIONS_CREATED.inc(result.inserted)
+    return jsonify(result.to_dict()), 200 if result.inserted or not result.error_count else 400
+
+@application.route('/applications/export', methods=['GET'])
+@login_required
+def export_applications_file():
+    """Download all applications, with notes, interviews and reminders, as CSV, NDJSON or JSON"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format; use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    filename = f"applications-{datetime.now().strftime('%Y%m%d')}.{export_format}"
+    chunks = export_applications(current_user.id, export_format)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from job_app_tracker.models.user import User
+from job_app_tracker.models.user_stats import UserStats
 from job_app_tracker.auth.forms import LoginForm, RegistrationForm
 import bcrypt
 from bson import ObjectId
@@ -60,13 +61,10 @@ def profile():
     last_name = request.form.get('last_name')
     
     # Update user information
-    mongo.db.users.update_one(
-        {'_id': ObjectId(current_user.id)},
-        {'$set': {
-            'first_name': first_name,
-            'last_name': last_name
-        }}
-    )
+    current_user.update({
+        'first_name': first_name,
+        'last_name': last_name
+    })
     
     flash('Profile updated successfully!', 'success')
     return redirect(url_for('main.settings'))
@@ -93,10 +91,7 @@ def change_password():
     password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
     
     # Update password
-    mongo.db.users.update_one(
-        {'_id': ObjectId(current_user.id)},
-        {'$set': {'password_hash': password_hash.decode('utf-8')}}
-    )
+    current_user.update({'password_hash': password_hash.decode('utf-8')})
     
     flash('Password updated successfully!', 'success')
     return redirect(url_for('main.settings'))
@@ -113,9 +108,11 @@ def delete_account():
     
     # Delete user's job applications
     mongo.db.applications.delete_many({'user_id': current_user.id})
+    UserStats.reset(current_user.id)
     
     # Delete user account
     mongo.db.users.delete_one({'_id': ObjectId(current_user.id)})
+    User.invalidate_cache(current_user.id)
     
     # Log out the user
     logout_user()
@@ -0,0 +1,406 @@
+import logging
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure
+
+# Emails are compared case-insensitively. Queries on users.email must pass this
+# collation, or MongoDB cannot use the email_1 index and scans the collection.
+EMAIL_COLLATION = {'locale': 'en', 'strength': 2}
+
+# Every index the application relies on. Each entry matches one or more of the
+# query shapes below; create_indexes() creates them at startup.
+INDEXES = [
+    # Login: case-insensitive unique email
+    {
+        'collection': 'users',
+        'keys': [('email', 1)],
+        'name': 'email_1',
+        'options': {'unique': True, 'collation': EMAIL_COLLATION}
+    },
+    # Application list (default sort), date range filters and stats rebuilds
+    {
+        'collection': 'applications',
+        'keys': [('user_id', 1), ('date_applied', -1), ('_id', -1)],
+        'name': 'user_date_applied'
+    },
+    # Status filter on the list, interview-stage applications
+    {
+        'collection': 'applications',
+        'keys': [('user_id', 1), ('status', 1), ('date_applied', -1)],
+        'name': 'user_status_date_applied'
+    },
+    # Application list sorted by company
+    {
+        'collection': 'applications',
+        'keys': [('user_id', 1), ('company', 1), ('_id', 1)],
+        'name': 'user_company'
+    },
+    # Full-text search over a user's applications and everything attached to them.
+    # Equality on user_id is part of every search, so it prefixes the text index.
+    {
+        'collection': 'applications',
+        'keys': [
+            ('user_id', 1),
+            ('company', 'text'),
+            ('position', 'text'),
+            ('tags', 'text'),
+            ('notes', 'text'),
+            ('notes_list.content', 'text'),
+            ('interviews.notes', 'text'),
+            ('documents.name', 'text'),
+            ('documents.text', 'text')
+        ],
+        'name': 'user_search',
+        'options': {
+            'weights': {
+                'company': 10,
+                'position': 10,
+                'tags': 5,
+                'documents.name': 3,
+                'notes_list.content': 2,
+                'interviews.notes': 2,
+                'notes': 1,
+                'documents.text': 1
+            },
+            'default_language': 'english',
+            # Applications have no per-document language; don't read one from a field
+            'language_override': 'search_language'
+        }
+    },
+    # Upcoming deadlines on the dashboard
+    {
+        'collection': 'applications',
+        'keys': [('user_id', 1), ('deadline', 1)],
+        'name': 'user_deadline'
+    },
+    # Upcoming reminders on the dashboard; only pending reminders are ever queried by date
+    {
+        'collection': 'reminders',
+        'keys': [('user_id', 1), ('reminder_date', 1)],
+        'name': 'user_pending_reminder_date',
+        'options': {'partialFilterExpression': {'status': 'pending'}}
+    },
+    # Reminders the notification scheduler still has to send, by due date
+    {
+        'collection': 'reminders',
+        'keys': [('reminder_date', 1)],
+        'name': 'pending_notification_reminder_date',
+        'options': {'partialFilterExpression': {'status': 'pending', 'notification_sent': False}}
+    },
+    # Reminders page of an application
+    {
+        'collection': 'reminders',
+        'keys': [('user_id', 1), ('application_id', 1), ('reminder_date', 1)],
+        'name': 'user_application_reminder_date'
+    },
+    # Pending email suggestions for a user, newest email first
+    {
+        'collection': 'email_suggestions',
+        'keys': [('user_id', 1), ('date', -1), ('_id', -1)],
+        'name': 'user_unprocessed',
+        'options': {'partialFilterExpression': {'processed': False}}
+    },
+    # An email is suggested at most once per user
+    {
+        'collection': 'email_suggestions',
+        'keys': [('user_id', 1), ('email_id', 1)],
+        'name': 'user_email_id',
+        'options': {'unique': True, 'partialFilterExpression': {'email_id': {'$type': 'string'}}}
+    },
+    # Background jobs: at most one queued or running job per type and user
+    {
+        'collection': 'jobs',
+        'keys': [('type', 1), ('user_id', 1)],
+        'name': 'active_job',
+        'options': {'unique': True, 'partialFilterExpression': {'active': True}}
+    },
+    # Queued jobs that are ready to run, and running jobs whose lease expired
+    {
+        'collection': 'jobs',
+        'keys': [('status', 1), ('run_after', 1)],
+        'name': 'status_run_after'
+    },
+    {
+        'collection': 'jobs',
+        'keys': [('status', 1), ('lease_until', 1)],
+        'name': 'status_lease_until'
+    },
+    # Finished jobs are kept for a week
+    {
+        'collection': 'jobs',
+        'keys': [('finished_at', 1)],
+        'name': 'finished_at_ttl',
+        'options': {'expireAfterSeconds': 7 * 24 * 3600}
+    },
+    # Email analysis cache, cleared per user and by age; entries are looked up by _id
+    {
+        'collection': 'analysis_cache',
+        'keys': [('user_id', 1), ('created_at', 1)],
+        'name': 'user_created_at'
+    },
+    # MongoDB removes analysis cache entries once expires_at has passed
+    {
+        'collection': 'analysis_cache',
+        'keys': [('expires_at', 1)],
+        'name': 'expires_at_ttl',
+        'options': {'expireAfterSeconds': 0}
+    },
+    # Documents sharing a stored file, checked before the file is deleted
+    {
+        'collection': 'applications',
+        'keys': [('documents.storage_key', 1)],
+        'name': 'document_storage_key',
+        'options': {'sparse': True}
+    },
+    {
+        'collection': 'applications',
+        'keys': [('documents.thumbnail.key', 1)],
+        'name': 'document_thumbnail_key',
+        'options': {'sparse': True}
+    },
+    # Processed upload of the same file, whose text and thumbnail are reused
+    {
+        'collection': 'applications',
+        'keys': [('user_id', 1), ('documents.sha256', 1)],
+        'name': 'user_document_sha256'
+    },
+    # Stored document with the same content, when deduplicating GridFS uploads
+    {
+        'collection': 'documents.files',
+        'keys': [('metadata.sha256', 1)],
+        'name': 'metadata_sha256'
+    },
+    # Company logo cache; MongoDB removes entries once expires_at has passed
+    {
+        'collection': 'logo_cache',
+        'keys': [('expires_at', 1)],
+        'name': 'expires_at_ttl',
+        'options': {'expireAfterSeconds': 0}
+    }
+]
+
+# Indexes created by earlier versions that the compound indexes above make redundant
+REDUNDANT_INDEXES = {
+    'applications': ['user_id_1', 'status_1', 'date_applied_-1', 'user_id_1_date_applied_-1']
+}
+
+
+def query_shapes():
+    """
+    Representative queries issued by the routes and models, used to check
+    that each one is served by an index. Values are placeholders; only the
+    shape of each query matters to the planner.
+    """
+    user_id = '000000000000000000000000'
+    now = datetime.now()
+
+    return [
+        {
+            'name': 'application list (newest first)',
+            'collection': 'applications',
+            'filter': {'user_id': user_id},
+            'sort': [('date_applied', -1), ('_id', -1)]
+        },
+        {
+            'name': 'application list filtered by status',
+            'collection': 'applications',
+            'filter': {'user_id': user_id, 'status': 'Applied'},
+            'sort': [('date_applied', -1), ('_id', -1)]
+        },
+        {
+            'name': 'application list filtered by date range',
+            'collection': 'applications',
+            'filter': {'user_id': user_id, 'date_applied': {'$gte': now - timedelta(days=30), '$lte': now}},
+            'sort': [('date_applied', -1), ('_id', -1)]
+        },
+        {
+            'name': 'application list sorted by company',
+            'collection': 'applications',
+            'filter': {'user_id': user_id},
+            'sort': [('company', 1), ('_id', 1)]
+        },
+        {
+            'name': 'application search',
+            'collection': 'applications',
+            'filter': {'user_id': user_id, '$text': {'$search': 'engineer "machine learning" -intern'}}
+        },
+        {
+            'name': 'application list filtered by search',
+            'collection': 'applications',
+            'filter': {'user_id': user_id, '$text': {'$search': 'engineer'}},
+            'sort': [('date_applied', -1), ('_id', -1)]
+        },
+        {
+            'name': 'upcoming deadlines',
+            'collection': 'applications',
+            'filter': {'user_id': user_id, 'deadline': {'$gte': now, '$lte': now + timedelta(days=7)}},
+            'sort': [('deadline', 1)]
+        },
+        {
+            'name': 'interview-stage applications',
+            'collection': 'applications',
+            'filter': {'user_id': user_id, 'status': 'Interview'}
+        },
+        {
+            'name': 'upcoming reminders',
+            'collection': 'reminders',
+            'filter': {
+                'user_id': user_id,
+                'status': 'pending',
+                'reminder_date': {'$gte': now, '$lte': now + timedelta(days=7)}
+            },
+            'sort': [('reminder_date', 1)]
+        },
+        {
+            'name': 'due reminder notifications',
+            'collection': 'reminders',
+            'filter': {
+                'status': 'pending',
+                'notification_sent': False,
+                'reminder_date': {'$lte': now},
+                '$or': [{'claimed_until': {'$exists': False}}, {'claimed_until': {'$lt': now}}],
+                'notification_attempts': {'$not': {'$gte': 5}}
+            },
+            'sort': [('reminder_date', 1)]
+        },
+        {
+            'name': 'reminders for an application',
+            'collection': 'reminders',
+            'filter': {'application_id': user_id, 'user_id': user_id},
+            'sort': [('reminder_date', 1)]
+        },
+        {
+            'name': 'pending email suggestions',
+            'collection': 'email_suggestions',
+            'filter': {'user_id': user_id, 'processed': False},
+            'sort': [('date', -1), ('_id', -1)]
+        },
+        {
+            'name': 'next runnable job',
+            'collection': 'jobs',
+            'filter': {
+                'type': {'$in': ['scan_emails']},
+                '$or': [
+                    {'status': 'queued', 'run_after': {'$lte': now}},
+                    {'status': 'running', 'lease_until': {'$lt': now}}
+                ]
+            },
+            'sort': [('created_at', 1)]
+        },
+        {
+            'name': 'background job backlog (/metrics)',
+            'collection': 'jobs',
+            'filter': {'status': {'$in': ['queued', 'running']}}
+        },
+        {
+            'name': 'analysis cache entries of a user',
+            'collection': 'analysis_cache',
+            'filter': {'user_id': user_id, 'created_at': {'$lt': now - timedelta(days=30)}}
+        },
+        {
+            'name': 'documents sharing a stored file',
+            'collection': 'applications',
+            'filter': {'documents.storage_key': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'}
+        },
+        {
+            'name': 'thumbnails sharing a stored file',
+            'collection': 'applications',
+            'filter': {'documents.thumbnail.key': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'}
+        },
+        {
+            'name': 'processed upload of the same file',
+            'collection': 'applications',
+            'filter': {
+                'user_id': '000000000000000000000000',
+                'documents': {'$elemMatch': {
+                    'sha256': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',
+                    'processing': 'done'
+                }}
+            }
+        },
+        {
+            'name': 'stored document by content hash',
+            'collection': 'documents.files',
+            'filter': {'metadata.sha256': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'}
+        },
+        {
+            'name': 'login by email',
+            'collection': 'users',
+            'filter': {'email': 'someone@example.com'},
+            'collation': EMAIL_COLLATION
+        }
+    ]
+
+
+def create_indexes(db):
+    """Create every registered index and drop the ones it makes redundant"""
+    for spec in INDEXES:
+        collection = db[spec['collection']]
+        options = dict(spec.get('options', {}))
+        try:
+            collection.create_index(spec['keys'], name=spec['name'], **options)
+        except OperationFailure as e:
+            # An index with the same name or keys but different options exists; replace it
+            logging.warning(f"Recreating index {spec['collection']}.{spec['name']}: {str(e)}")
+            existing = [
+                name for name, info in collection.index_information().items()
+                if name == spec['name'] or info['key'] == spec['keys']
+            ]
+            for name in existing:
+                collection.drop_index(name)
+            collection.create_index(spec['keys'], name=spec['name'], **options)
+
+    for collection_name, index_names in REDUNDANT_INDEXES.items():
+        existing = db[collection_name].index_information()
+        for name in index_names:
+            if name in existing:
+                db[collection_name].drop_index(name)
+                logging.info(f"Dropped redundant index {collection_name}.{name}")
+
+
+def missing_indexes(db):
+    """Registered indexes that do not exist in the database"""
+    missing = []
+    existing = {}
+    for spec in INDEXES:
+        if spec['collection'] not in existing:
+            existing[spec['collection']] = db[spec['collection']].index_information()
+        if spec['name'] not in existing[spec['collection']]:
+            missing.append(f"{spec['collection']}.{spec['name']}")
+    return missing
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    yield plan.get('stage')
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+
+
+def explain_query_shapes(db):
+    """
+    Run explain() on every registered query shape.
+
+    Returns:
+        list: One dict per shape with its name, the winning plan's stages
+              and whether any stage is a COLLSCAN
+    """
+    results = []
+    for shape in query_shapes():
+        cursor = db[shape['collection']].find(shape['filter'])
+        if shape.get('sort'):
+            cursor = cursor.sort(shape['sort'])
+        if shape.get('collation'):
+            cursor = cursor.collation(shape['collation'])
+
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        stages = [stage for stage in _plan_stages(plan) if stage]
+        results.append({
+            'name': shape['name'],
+            'collection': shape['collection'],
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages
+        })
+    return results
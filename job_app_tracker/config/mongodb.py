@@ -1,11 +1,17 @@
+import importlib.util
 import os
+import threading
+import time
+from collections import defaultdict
 from flask_pymongo import PyMongo
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 import logging
 import certifi
-from pymongo import MongoClient
 from dotenv import load_dotenv
-from flask import current_app
+from job_app_tracker.utils.metrics import metrics
+from job_app_tracker.utils.query_profiler import query_profiler
+from .indexes import create_indexes as ensure_indexes, missing_indexes
 
 # Load environment variables from the root directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
@@ -13,11 +19,289 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(os.path.dir
 # Create a global PyMongo instance
 mongo = PyMongo()
 
+# Wire compressors in order of preference, and the module each one needs
+COMPRESSOR_MODULES = {
+    'zstd': 'zstandard',
+    'snappy': 'snappy',
+    'zlib': 'zlib'
+}
+
+class PoolMetrics(ConnectionPoolListener):
+    """Connection pool counters for every server the client talks to.
+    
+    Updated from pymongo's pool events, so reading them costs nothing extra
+    on the request path.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkout_started = threading.local()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.servers = defaultdict(lambda: {
+                'open': 0,
+                'in_use': 0,
+                'created': 0,
+                'closed': 0,
+                'checkouts': 0,
+                'checkout_failures': 0,
+                'checkout_wait_ms': 0.0,
+                'max_checkout_wait_ms': 0.0,
+                'cleared': 0
+            })
+    
+    def _count(self, address, **changes):
+        with self._lock:
+            server = self.servers[f"{address[0]}:{address[1]}"]
+            for name, change in changes.items():
+                server[name] += change
+    
+    def snapshot(self):
+        """Counters per server, as plain dicts"""
+        with self._lock:
+            servers = {address: dict(server) for address, server in self.servers.items()}
+        for server in servers.values():
+            server['avg_checkout_wait_ms'] = round(server['checkout_wait_ms'] / server['checkouts'], 3) if server['checkouts'] else None
+        return servers
+    
+    def connection_check_out_started(self, event):
+        self._checkout_started.at = time.perf_counter()
+    
+    def connection_checked_out(self, event):
+        started = getattr(self._checkout_started, 'at', None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        with self._lock:
+            server = self.servers[f"{event.address[0]}:{event.address[1]}"]
+            server['in_use'] += 1
+            server['checkouts'] += 1
+            server['checkout_wait_ms'] += wait_ms
+            server['max_checkout_wait_ms'] = max(server['max_checkout_wait_ms'], wait_ms)
+    
+    def connection_check_out_failed(self, event):
+        self._count(event.address, checkout_failures=1)
+    
+    def connection_checked_in(self, event):
+        self._count(event.address, in_use=-1)
+    
+    def connection_created(self, event):
+        self._count(event.address, open=1, created=1)
+    
+    def connection_closed(self, event):
+        self._count(event.address, open=-1, closed=1)
+    
+    def pool_cleared(self, event):
+        self._count(event.address, cleared=1)
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+
+class CommandMetrics(CommandListener):
+    """Count, failures and latency of each database command, from pymongo's command monitoring"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.commands = defaultdict(lambda: {'count': 0, 'failures': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+    
+    def _record(self, event, failed):
+        duration_ms = event.duration_micros / 1000
+        with self._lock:
+            command = self.commands[event.command_name]
+            command['count'] += 1
+            command['failures'] += int(failed)
+            command['total_ms'] += duration_ms
+            command['max_ms'] = max(command['max_ms'], duration_ms)
+    
+    def snapshot(self):
+        with self._lock:
+            commands = {name: dict(command) for name, command in self.commands.items()}
+        for command in commands.values():
+            command['avg_ms'] = round(command['total_ms'] / command['count'], 3) if command['count'] else None
+            command['total_ms'] = round(command['total_ms'], 3)
+            command['max_ms'] = round(command['max_ms'], 3)
+        return commands
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self._record(event, failed=False)
+    
+    def failed(self, event):
+        self._record(event, failed=True)
+
+class MongoClientManager:
+    """Owns the MongoClient behind the global `mongo`.
+    
+    Every part of the app goes through this one client and its connection
+    pool. A MongoClient must not be used across fork(), so when gunicorn
+    forks workers from a master that already connected (preload_app), each
+    child replaces the client with a fresh one before its first request.
+    
+    Configuration (read in init_app; options given in MONGODB_URI win):
+        MONGO_MAX_POOL_SIZE                Connections per server, 100 by default
+        MONGO_MIN_POOL_SIZE                Connections kept open when idle, 0 by default
+        MONGO_MAX_IDLE_TIME_MS             Close connections idle this long; unset keeps them
+        MONGO_WAIT_QUEUE_TIMEOUT_MS        Fail a checkout after waiting this long for a free
+                                           connection; unset waits as long as the operation may
+        MONGO_CONNECT_TIMEOUT_MS           10000 by default
+        MONGO_SERVER_SELECTION_TIMEOUT_MS  5000 by default
+        MONGO_SOCKET_TIMEOUT_MS            Unset by default (no limit)
+        MONGO_COMPRESSORS                  'zstd,snappy,zlib' by default; compressors whose
+                                           module is not installed are left out
+        MONGO_RETRY_WRITES / _READS        true by default
+        MONGO_ANALYTICS_READ_PREFERENCE    Read preference of analytics_db,
+                                           'secondaryPreferred' by default
+        MONGO_ANALYTICS_MAX_STALENESS_S    How far behind a secondary analytics_db may read
+                                           from (at least 90); unset means no limit
+    """
+    
+    def __init__(self, extension):
+        self.mongo = extension
+        self.metrics = PoolMetrics()
+        self.command_metrics = CommandMetrics()
+        self.app = None
+        self.options = {}
+        self.pid = None
+        self._analytics_db = None
+    
+    @staticmethod
+    def _flag(value, default=True):
+        if value is None or value == '':
+            return default
+        return str(value).lower() in ('1', 'true', 'yes', 'on')
+    
+    @staticmethod
+    def compressors(value):
+        """The compressors named in value whose module is installed"""
+        names = [name.strip() for name in (value or '').split(',') if name.strip()]
+        available = [name for name in names
+                     if name in COMPRESSOR_MODULES and importlib.util.find_spec(COMPRESSOR_MODULES[name])]
+        if len(available) < len(names):
+            logging.info(f"MongoDB compressors not available: {', '.join(set(names) - set(available))}")
+        return available
+    
+    @classmethod
+    def client_options(cls, config):
+        options = {
+            'maxPoolSize': int(config.get('MONGO_MAX_POOL_SIZE') or 100),
+            'minPoolSize': int(config.get('MONGO_MIN_POOL_SIZE') or 0),
+            'connectTimeoutMS': int(config.get('MONGO_CONNECT_TIMEOUT_MS') or 10000),
+            'serverSelectionTimeoutMS': int(config.get('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 5000),
+            'retryWrites': cls._flag(config.get('MONGO_RETRY_WRITES')),
+            'retryReads': cls._flag(config.get('MONGO_RETRY_READS')),
+            'appname': config.get('MONGO_APP_NAME') or 'applizz'
+        }
+        if config.get('MONGO_MAX_IDLE_TIME_MS'):
+            options['maxIdleTimeMS'] = int(config['MONGO_MAX_IDLE_TIME_MS'])
+        if config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'):
+            options['waitQueueTimeoutMS'] = int(config['MONGO_WAIT_QUEUE_TIMEOUT_MS'])
+        if config.get('MONGO_SOCKET_TIMEOUT_MS'):
+            options['socketTimeoutMS'] = int(config['MONGO_SOCKET_TIMEOUT_MS'])
+        compressors = cls.compressors(config.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib'))
+        if compressors:
+            options['compressors'] = ','.join(compressors)
+        
+        # Atlas (mongodb+srv) and other TLS URIs: use certifi's CA bundle, which
+        # some Python installs (macOS in particular) lack out of the box
+        uri = config.get('MONGO_URI') or ''
+        if uri.startswith('mongodb+srv://') or 'tls=true' in uri.lower() or 'ssl=true' in uri.lower():
+            options['tlsCAFile'] = config.get('MONGO_TLS_CA_FILE') or certifi.where()
+        return options
+    
+    def _connect(self):
+        listeners = [self.metrics, self.command_metrics, query_profiler, metrics.pool_listener]
+        self.mongo.init_app(self.app, event_listeners=listeners, **self.options)
+        self.pid = os.getpid()
+        self._analytics_db = None
+    
+    def init_app(self, app):
+        # Calling create_app again (scripts, tests) replaces the client instead of leaking it
+        self.close()
+        self.app = app
+        self.options = self.client_options(app.config)
+        self._connect()
+    
+    def reconnect(self):
+        """Replace the client, without touching the old one's sockets"""
+        if self.app is None:
+            return
+        self.metrics.reset()
+        self.command_metrics.reset()
+        self._connect()
+        logging.info(f"Reconnected to MongoDB in process {self.pid}")
+    
+    @property
+    def analytics_db(self):
+        """
+        The database, read with the analytics read preference.
+        
+        For read-only dashboard queries, which can be served by a secondary
+        that is slightly behind instead of loading the primary.
+        """
+        if self._analytics_db is None:
+            config = self.app.config
+            mode = read_pref_mode_from_name(config.get('MONGO_ANALYTICS_READ_PREFERENCE') or 'secondaryPreferred')
+            staleness = int(config.get('MONGO_ANALYTICS_MAX_STALENESS_S') or -1)
+            kwargs = {'max_staleness': staleness} if mode else {}
+            self._analytics_db = self.mongo.db.with_options(read_preference=make_read_preference(mode, None, **kwargs))
+        return self._analytics_db
+    
+    def _after_fork(self):
+        # The parent's client (its sockets and monitor threads) belongs to the parent
+        if self.pid is not None and self.pid != os.getpid():
+            self.reconnect()
+    
+    def close(self):
+        if getattr(self.mongo, 'cx', None) is not None and self.pid == os.getpid():
+            self.mongo.cx.close()
+    
+    def pool_stats(self):
+        """Pool configuration and per-server connection counters of this process"""
+        return {
+            'pid': self.pid,
+            'max_pool_size': self.options.get('maxPoolSize'),
+            'min_pool_size': self.options.get('minPoolSize'),
+            'compressors': self.options.get('compressors'),
+            'servers': self.metrics.snapshot()
+        }
+    
+    def server_rtts(self):
+        """Each known server's type and round-trip time, as measured by the client's monitors"""
+        servers = []
+        for address, description in self.mongo.cx.topology_description.server_descriptions().items():
+            rtt = description.round_trip_time
+            servers.append({
+                'address': f"{address[0]}:{address[1]}",
+                'type': description.server_type_name,
+                'rtt_ms': round(rtt * 1000, 3) if rtt is not None else None
+            })
+        return servers
+
+# The one client manager; see init_mongodb
+mongo_client = MongoClientManager(mongo)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=mongo_client._after_fork)
+
 def init_mongodb(app):
     """Initialize MongoDB connection"""
     try:
-        # Get MongoDB URI from environment variable
-        mongodb_uri = os.getenv('MONGODB_URI')
+        # Get MongoDB URI from the app config (which may override the environment)
+        mongodb_uri = app.config.get('MONGODB_URI') or os.getenv('MONGODB_URI')
         if not mongodb_uri:
             raise ValueError("MongoDB URI not found in environment variables")
         
@@ -26,8 +310,8 @@ def init_mongodb(app):
         # Configure MongoDB URI in Flask app
         app.config['MONGO_URI'] = mongodb_uri
         
-        # Initialize PyMongo with the app
-        mongo.init_app(app)
+        # Initialize PyMongo with the app, through the shared client manager
+        mongo_client.init_app(app)
         
         # Test the connection
         mongo.db.command('ping')
@@ -45,72 +329,14 @@ def init_mongodb(app):
         raise
 
 def create_indexes(db):
-    """Create necessary indexes"""
+    """Create the indexes in the registry and check that they all exist"""
     try:
-        # Create case-insensitive unique index for email in users collection
-        db.users.create_index(
-            [("email", 1)],
-            unique=True,
-            collation={'locale': 'en', 'strength': 2}
-        )
+        ensure_indexes(db)
         
-        # Create indexes for applications collection
-        db.applications.create_index([("user_id", 1)])
-        db.applications.create_index([("status", 1)])
-        db.applications.create_index([("date_applied", -1)])
-        
-        logging.info("MongoDB indexes created successfully")
+        missing = missing_indexes(db)
+        if missing:
+            logging.warning(f"MongoDB indexes missing after startup: {', '.join(missing)}")
+        else:
+            logging.info("MongoDB indexes created successfully")
     except Exception as e:
         logging.warning(f"Error creating indexes: {str(e)}")
-
-# Initialize MongoDB with the URI from environment variables
-def init_mongodb_old(app):
-    try:
-        # Set MongoDB URI from environment variable or use default
-        mongodb_uri = os.getenv('MONGODB_URI')
-        if not mongodb_uri:
-            raise ValueError("MONGODB_URI environment variable is not set")
-            
-        logging.info(f"Using MongoDB URI: {mongodb_uri}")
-        app.config['MONGO_URI'] = mongodb_uri
-        
-        # Set SSL certificate verification
-        app.config['MONGO_OPTIONS'] = {
-            'tlsCAFile': certifi.where(),
-            'connect': True,
-            'serverSelectionTimeoutMS': 5000
-        }
-        
-        # Try direct connection first
-        try:
-            logging.info("Attempting direct MongoDB connection...")
-            client = MongoClient(mongodb_uri, tlsCAFile=certifi.where())
-            client.admin.command('ping')
-            client.close()
-            logging.info("Successfully tested MongoDB connection")
-        except Exception as e:
-            logging.error(f"Direct connection test failed: {str(e)}")
-            raise
-        
-        # Initialize PyMongo with the app
-        mongo.init_app(app)
-        
-        # Test connection and create indexes
-        with app.app_context():
-            mongo.db.command('ping')
-            
-            # Create indexes if they don't exist
-            try:
-                # Create case-insensitive unique index for email
-                mongo.db.users.create_index([("email", 1)], unique=True, collation={'locale': 'en', 'strength': 2})
-                
-                # Create other indexes
-                mongo.db.applications.create_index([("user_id", 1), ("date_applied", -1)])
-                logging.info("MongoDB indexes created successfully")
-            except OperationFailure as e:
-                logging.warning(f"Error creating indexes: {str(e)}")
-        
-        return mongo
-    except ConnectionFailure as e:
-        logging.error(f"Failed to connect to MongoDB: {str(e)}")
-        raise 
\ No newline at end of file
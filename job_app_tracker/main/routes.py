@@ -1,17 +1,32 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session
 from flask_login import login_required, current_user
-from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.config.mongodb import mongo, mongo_client
 from datetime import datetime, timedelta
 from bson import ObjectId
 from job_app_tracker.services.email_service import EmailService
 import os
+import time
+import pymongo
 from job_app_tracker.models.application import Application
 from werkzeug.utils import secure_filename
 from flask import current_app
 from job_app_tracker.models.reminder import Reminder
+from job_app_tracker.services.dashboard_stats import DashboardStatsService, GRANULARITIES, STATUSES, parse_time_range
+from job_app_tracker.models.user_stats import UserStats
+from job_app_tracker.models.email_suggestion import EmailSuggestion
+from job_app_tracker.services.job_queue import job_queue, job_status
+from job_app_tracker.services.logo_resolver import logo_resolver
+from job_app_tracker.services.storage import document_storage, legacy_path
+from job_app_tracker.services.search import search_applications
+from job_app_tracker.utils.metrics import APPLICATIONS_CREATED
 
 main = Blueprint('main', __name__)
 
+# Applications shown per page on the dashboard, and the most the API returns at once
+APPLICATIONS_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+SUGGESTIONS_PAGE_SIZE = 50
+
 @main.route('/')
 def index():
     if current_user.is_authenticated:
@@ -25,28 +40,22 @@ def faq():
 @main.route('/dashboard')
 @login_required
 def dashboard():
-    # Get all applications for the current user
-    applications = list(mongo.db.applications.find({'user_id': str(current_user.id)}))
+    # Only the first page of applications is rendered; later pages come from /api/applications
+    applications, next_cursor, _ = Application.get_page_for_user(current_user.id, limit=APPLICATIONS_PAGE_SIZE)
     
-    # Convert ObjectId to string and format dates
-    for app in applications:
-        app['_id'] = str(app['_id'])
-        if isinstance(app.get('date_applied'), str):
-            try:
-                app['date_applied'] = datetime.strptime(app['date_applied'], '%Y-%m-%d')
-            except ValueError:
-                app['date_applied'] = datetime.now()
-        elif not app.get('date_applied'):
-            app['date_applied'] = datetime.now()
-    
-    # Calculate statistics
-    today = datetime.now()
-    one_week_ago = today - timedelta(days=7)
-    two_weeks_ago = today - timedelta(days=14)
-    three_weeks_ago = today - timedelta(days=21)
-    four_weeks_ago = today - timedelta(days=28)
+    # Get time range from query parameters
+    try:
+        time_range = parse_time_range(request.args.get('time_range'))  # Default to 28 days
+    except ValueError:
+        flash('Invalid time range; showing the last 28 days.', 'error')
+        time_range = parse_time_range(None)
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
+    stats = DashboardStatsService.compute(current_user.id, days=time_range, granularity=granularity)
     
     # Get upcoming reminders (next 7 days)
+    today = datetime.now()
     upcoming_reminders = list(mongo.db.reminders.find({
         'user_id': str(current_user.id),
         'status': 'pending',
@@ -56,158 +65,111 @@ def dashboard():
         }
     }).sort('reminder_date', 1))
 
+    # Get application details for the reminders in one query
+    reminder_app_ids = [ObjectId(r['application_id']) for r in upcoming_reminders if ObjectId.is_valid(r.get('application_id'))]
+    applications_by_id = {}
+    if reminder_app_ids:
+        for app in mongo.db.applications.find(
+            {'_id': {'$in': reminder_app_ids}, 'user_id': str(current_user.id)},
+            {'company': 1, 'position': 1}
+        ):
+            app['_id'] = str(app['_id'])
+            applications_by_id[app['_id']] = app
+    
     # Convert ObjectId to string for reminders
     for reminder in upcoming_reminders:
         reminder['_id'] = str(reminder['_id'])
         # Get application details for each reminder
-        app = next((app for app in applications if str(app['_id']) == str(reminder['application_id'])), None)
+        app = applications_by_id.get(str(reminder['application_id']))
         if app:
             reminder['application'] = app
     
-    # Status counts for the template
-    status_counts = {}
-    for status in ['Applied', 'In Progress', 'Interview', 'Offer', 'Rejected', 'Withdrawn']:
-        status_counts[status] = mongo.db.applications.count_documents({
-            'user_id': str(current_user.id),
-            'status': status
-        })
-    
-    # Additional stats
-    total_applications = mongo.db.applications.count_documents({'user_id': str(current_user.id)})
-    active_applications = mongo.db.applications.count_documents({
-        'user_id': str(current_user.id),
-        'status': {'$in': ['Applied', 'In Progress', 'Interview']}
-    })
-    
-    # Weekly stats
-    weekly_stats = {
-        'last_week': sum(1 for app in applications if app.get('date_applied') and app.get('date_applied') >= one_week_ago),
-        'two_weeks_ago': sum(1 for app in applications if app.get('date_applied') and two_weeks_ago <= app.get('date_applied') < one_week_ago),
-        'three_weeks_ago': sum(1 for app in applications if app.get('date_applied') and three_weeks_ago <= app.get('date_applied') < two_weeks_ago),
-        'four_weeks_ago': sum(1 for app in applications if app.get('date_applied') and four_weeks_ago <= app.get('date_applied') < three_weeks_ago)
-    }
-    
-    # Get upcoming deadlines (next 7 days)
-    seven_days_later = today + timedelta(days=7)
-    upcoming_deadlines = [
-        app for app in applications 
-        if app.get('deadline') and today <= app.get('deadline') <= seven_days_later
-    ]
-    upcoming_deadlines.sort(key=lambda x: x.get('deadline'))
-    
-    # Get applications with interview status
-    upcoming_interviews = [
-        app for app in applications 
-        if app.get('status') == 'Interview'
-    ]
-    
-    # Get time range from query parameters
-    time_range = request.args.get('time_range', '28')  # Default to 28 days
-    days_to_show = int(time_range)
-    
-    # Generate timeline data for the selected time range
-    timeline_data = []
-    for i in range(days_to_show - 1, -1, -1):
-        date = datetime.utcnow() - timedelta(days=i)
-        start_of_day = datetime.combine(date.date(), datetime.min.time())
-        end_of_day = datetime.combine(date.date(), datetime.max.time())
-        
-        # Count applications for each status on this day
-        status_counts = {
-            'Applied': 0,
-            'In Progress': 0,
-            'Interview': 0,
-            'Offer': 0,
-            'Rejected': 0,
-            'Withdrawn': 0,
-            'Wishlist': 0
-        }
-        
-        for app in applications:
-            date_applied = app.get('date_applied')
-            if isinstance(date_applied, str):
-                try:
-                    date_applied = datetime.fromisoformat(date_applied.replace('Z', '+00:00'))
-                except ValueError:
-                    continue
-            
-            if date_applied and start_of_day <= date_applied <= end_of_day:
-                status = app.get('status', 'Applied')
-                if status in status_counts:
-                    status_counts[status] += 1
-        
-        timeline_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'counts': status_counts
-        })
-    
-    # Calculate success rate
-    total_applications = mongo.db.applications.count_documents({'user_id': str(current_user.id)})
-    successful_applications = mongo.db.applications.count_documents({
-        'user_id': str(current_user.id),
-        'status': {'$in': ['Offer', 'Interview']}
-    })
-    rejected_applications = mongo.db.applications.count_documents({
-        'user_id': str(current_user.id),
-        'status': 'Rejected'
-    })
-    
-    success_rate = {
-        'total': total_applications,
-        'successful': successful_applications,
-        'rejected': rejected_applications,
-        'percentage': (successful_applications / total_applications * 100) if total_applications > 0 else 0
-    }
-    
-    # Calculate velocity metrics
-    def calculate_velocity_metrics():
-        # Get all application dates ordered by date_applied
-        applications_dates = list(mongo.db.applications.find(
-            {'user_id': str(current_user.id)},
-            {'date_applied': 1}
-        ).sort('date_applied', 1))
-        
-        if not applications_dates:
-            return None
-            
-        dates = [app.get('date_applied') for app in applications_dates if app.get('date_applied')]
-        if len(dates) < 2:
-            return {
-                'avg_time_between': 0,
-                'apps_per_week': len(dates)  # If only one application, count it as one per week
-            }
-            
-        # Calculate average time between applications
-        time_diffs = [(dates[i] - dates[i-1]).days for i in range(1, len(dates))]
-        avg_time_between = sum(time_diffs) / len(time_diffs)
-        
-        # Calculate applications per week
-        total_days = (max(dates) - min(dates)).days
-        weeks = total_days / 7 if total_days > 0 else 1
-        apps_per_week = len(dates) / weeks
-        
-        return {
-            'avg_time_between': round(avg_time_between, 1),
-            'apps_per_week': round(apps_per_week, 1)
-        }
-    
-    velocity_metrics = calculate_velocity_metrics()
-    
     return render_template(
         'dashboard.html',
-        status_counts=status_counts,
-        total_applications=total_applications,
-        active_applications=active_applications,
-        weekly_stats=weekly_stats,
         applications=applications,
-        upcoming_deadlines=upcoming_deadlines,
-        upcoming_interviews=upcoming_interviews,
+        next_cursor=next_cursor,
+        page_size=APPLICATIONS_PAGE_SIZE,
         upcoming_reminders=upcoming_reminders,
-        timeline_data=timeline_data,
-        success_rate=success_rate,
-        velocity_metrics=velocity_metrics
+        **stats.template_context()
     )
 
+@main.route('/api/applications')
+@login_required
+def list_applications():
+    """One page of the current user's applications, filtered and sorted on the server"""
+    try:
+        limit = min(max(int(request.args.get('limit', APPLICATIONS_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        # Include the whole end day
+        date_to = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1, microseconds=-1) if date_to else None
+        
+        applications, next_cursor, total = Application.get_page_for_user(
+            current_user.id,
+            status=request.args.get('status') or None,
+            date_from=date_from,
+            date_to=date_to,
+            search=request.args.get('q', '').strip() or None,
+            sort=request.args.get('sort', 'date-desc'),
+            cursor=request.args.get('cursor') or None,
+            limit=limit,
+            include_total=request.args.get('include_total') == '1'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    items = [{
+        'id': app['_id'],
+        'company': app.get('company'),
+        'position': app.get('position'),
+        'status': app.get('status'),
+        'date_applied': app['date_applied'].strftime('%Y-%m-%d') if app.get('date_applied') else None,
+        'company_logo': app.get('company_logo')
+    } for app in applications]
+    
+    return jsonify({
+        'applications': items,
+        'html': render_template('partials/application_rows.html', applications=applications),
+        'next_cursor': next_cursor,
+        'total': total
+    })
+
+# Where each kind of search highlight links to
+SEARCH_HIT_PAGES = {
+    'note': 'main.application_notes',
+    'interview': 'main.application_interviews',
+    'document': 'main.application_documents'
+}
+
+@main.route('/api/search')
+@login_required
+def search():
+    """Ranked full-text search over the current user's applications, with highlighted snippets"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', APPLICATIONS_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    hits, next_page = search_applications(current_user.id, query, page=page, limit=limit)
+    for hit in hits:
+        hit['url'] = url_for('main.edit_application', application_id=hit['id'])
+        hit['date_applied'] = hit['date_applied'].strftime('%Y-%m-%d') if isinstance(hit['date_applied'], datetime) else hit['date_applied']
+        for highlight in hit['highlights']:
+            endpoint = SEARCH_HIT_PAGES.get(highlight['field'])
+            highlight['url'] = url_for(endpoint, application_id=hit['id']) if endpoint else hit['url']
+    
+    return jsonify({
+        'results': hits,
+        'html': render_template('partials/search_hits.html', hits=hits),
+        'page': page,
+        'next_page': next_page
+    })
+
 @main.route('/application/new', methods=['GET', 'POST'])
 @login_required
 def add_application():
@@ -220,6 +182,9 @@ def add_application():
             except ValueError:
                 pass
         
+        url = request.form.get('url') if request.form.get('url') else None
+        logo_cached, company_logo = logo_resolver.cached(url) if url else (True, None)
+        
         application = {
             'user_id': str(current_user.id),
             'company': request.form.get('company'),
@@ -227,12 +192,16 @@ def add_application():
             'status': request.form.get('status'),
             'notes': request.form.get('notes'),
             'date_applied': datetime.now(),
-            'url': request.form.get('url') if request.form.get('url') else None,
+            'url': url,
             'deadline': deadline,
-            'company_logo': None  # You can add logo functionality later
+            'company_logo': company_logo
         }
         
-        mongo.db.applications.insert_one(application)
+        result = mongo.db.applications.insert_one(application)
+        UserStats.record_created(current_user.id, application['status'], application['date_applied'])
+        APPLICATIONS_CREATED.inc()
+        if not logo_cached:
+            logo_resolver.resolve_async(result.inserted_id, url)
         flash('Application added successfully!', 'success')
         return redirect(url_for('main.dashboard'))
         
@@ -270,10 +239,19 @@ def edit_application(application_id):
             'deadline': deadline
         }
         
+        logo_cached = True
+        if updates['url'] and updates['url'] != application.get('url'):
+            logo_cached, updates['company_logo'] = logo_resolver.cached(updates['url'])
+        
         mongo.db.applications.update_one(
             {'_id': ObjectId(application_id)},
             {'$set': updates}
         )
+        if not logo_cached:
+            logo_resolver.resolve_async(application_id, updates['url'])
+        UserStats.record_status_change(
+            current_user.id, application.get('status'), updates['status'], application.get('date_applied')
+        )
         
         flash('Application updated successfully!', 'success')
         return redirect(url_for('main.dashboard'))
@@ -289,10 +267,7 @@ def settings():
         # Handle profile update
         name = request.form.get('name')
         if name:
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$set': {'name': name}}
-            )
+            current_user.update({'name': name})
             flash('Profile updated successfully!', 'success')
         return redirect(url_for('main.settings'))
     
@@ -305,18 +280,12 @@ def update_email_settings():
     require_approval = 'require_approval' in request.form
     scan_attachments = 'scan_attachments' in request.form
     
-    settings = {
+    # Only the form's own fields; last_scan and the UID watermark stay as they are
+    current_user.update_email_settings({
         'auto_scan': auto_scan,
         'require_approval': require_approval,
-        'scan_attachments': scan_attachments,
-        'last_scan': current_user.email_settings.get('last_scan') if hasattr(current_user, 'email_settings') and current_user.email_settings else None
-    }
-    
-    # Update user settings
-    mongo.db.users.update_one(
-        {'_id': ObjectId(current_user.id)},
-        {'$set': {'email_settings': settings}}
-    )
+        'scan_attachments': scan_attachments
+    })
     
     flash('Email settings updated successfully!', 'success')
     return redirect(url_for('main.settings'))
@@ -406,183 +375,166 @@ def scan_emails():
         flash('Please connect your email first.', 'error')
         return redirect(url_for('main.settings'))
     
-    # Scan emails
-    success, message = EmailService.scan_emails(current_user)
-    
-    if success:
-        flash(message, 'success')
-        return redirect(url_for('main.email_suggestions'))
-    else:
-        flash(f'Failed to scan emails: {message}', 'error')
-        return redirect(url_for('main.settings'))
+    # Scan emails in the background; the suggestions page shows its progress
+    job = job_queue.enqueue('scan_emails', current_user.id)
+    return redirect(url_for('main.email_suggestions', job=str(job['_id'])))
+
+@main.route('/api/jobs/<job_id>')
+@login_required
+def get_job_status(job_id):
+    """Progress of a background job, polled by the UI"""
+    job = job_queue.get(job_id, current_user.id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status(job))
 
 @main.route('/email_suggestions')
 @login_required
 def email_suggestions():
-    # Get suggestions for current user
-    suggestions_doc = mongo.db.email_suggestions.find_one({
-        'user_id': str(current_user.id),
-        'processed': False
-    })
-    
-    if not suggestions_doc:
-        return render_template('email_suggestions.html', suggestions=None)
+    page = max(request.args.get('page', 1, type=int), 1)
+    suggestions, total = EmailSuggestion.get_pending(current_user.id, page=page, per_page=SUGGESTIONS_PAGE_SIZE)
+    total_pages = max((total + SUGGESTIONS_PAGE_SIZE - 1) // SUGGESTIONS_PAGE_SIZE, 1)
     
     # Process suggestions
-    status_updates = []
-    new_applications = []
+    status_updates = [suggestion for suggestion in suggestions if suggestion.type == 'update']
+    new_applications = [suggestion for suggestion in suggestions if suggestion.type == 'new']
     
-    for suggestion in suggestions_doc['suggestions']:
-        suggestion['id'] = str(suggestions_doc['_id'])
-        if suggestion['type'] == 'update':
-            status_updates.append(suggestion)
-        elif suggestion['type'] == 'new':
-            new_applications.append(suggestion)
+    # A scan that is still running, whose progress the page polls
+    scan_job_id = request.args.get('job')
+    if not scan_job_id:
+        active_scan = job_queue.active('scan_emails', current_user.id)
+        scan_job_id = str(active_scan['_id']) if active_scan else None
     
     return render_template(
         'email_suggestions.html',
-        suggestions=suggestions_doc,
+        suggestions=suggestions,
+        total_suggestions=total,
         status_updates=status_updates,
-        new_applications=new_applications
+        new_applications=new_applications,
+        current_page=page,
+        total_pages=total_pages,
+        has_prev=page > 1,
+        has_next=page < total_pages,
+        scan_job_id=scan_job_id
     )
 
 @main.route('/accept_suggestion/<suggestion_id>', methods=['POST'])
 @login_required
 def accept_suggestion(suggestion_id):
-    # Find suggestion
-    suggestions_doc = mongo.db.email_suggestions.find_one({
-        '_id': ObjectId(suggestion_id),
-        'user_id': str(current_user.id)
-    })
+    result = EmailSuggestion.accept_many(current_user.id, [suggestion_id])
+    APPLICATIONS_CREATED.inc(result['created'])
     
-    if not suggestions_doc:
-        flash('Suggestion not found.', 'error')
+    if not result['suggestions']:
+        flash('Suggestion not found or already processed.', 'error')
         return redirect(url_for('main.email_suggestions'))
     
-    # Get suggestion index from form
-    index = int(request.form.get('index', 0))
-    
-    if index >= len(suggestions_doc['suggestions']):
-        flash('Invalid suggestion index.', 'error')
-        return redirect(url_for('main.email_suggestions'))
-    
-    suggestion = suggestions_doc['suggestions'][index]
-    
-    # Process suggestion
-    if suggestion['type'] == 'update':
-        # Update application status
-        mongo.db.applications.update_one(
-            {'_id': ObjectId(suggestion['application_id'])},
-            {'$set': {'status': suggestion['new_status']}}
-        )
-        flash(f"Updated status for {suggestion['company']} to {suggestion['new_status']}.", 'success')
-    elif suggestion['type'] == 'new':
-        # Add new application
-        new_app = {
-            'user_id': str(current_user.id),
-            'company': suggestion['company'],
-            'position': suggestion['position'] if suggestion['position'] != 'Unknown Position' else '',
-            'status': suggestion['status'],
-            'date_applied': suggestion['date'],
-            'notes': f"Automatically added from email: {suggestion['email_subject']}",
-            'created_at': datetime.utcnow()
-        }
-        mongo.db.applications.insert_one(new_app)
-        flash(f"Added new application for {suggestion['company']}.", 'success')
-    
-    # Mark suggestion as processed
-    suggestions_doc['suggestions'].pop(index)
-    
-    if not suggestions_doc['suggestions']:
-        # If no more suggestions, mark the whole document as processed
-        mongo.db.email_suggestions.update_one(
-            {'_id': ObjectId(suggestion_id)},
-            {'$set': {'processed': True}}
-        )
+    suggestion = result['suggestions'][0]
+    if suggestion.type == 'update':
+        flash(f"Updated status for {suggestion.company} to {suggestion.new_status}.", 'success')
     else:
-        # Otherwise, update the suggestions list
-        mongo.db.email_suggestions.update_one(
-            {'_id': ObjectId(suggestion_id)},
-            {'$set': {'suggestions': suggestions_doc['suggestions']}}
-        )
+        flash(f"Added new application for {suggestion.company}.", 'success')
     
     return redirect(url_for('main.email_suggestions'))
 
 @main.route('/reject_suggestion/<suggestion_id>', methods=['POST'])
 @login_required
 def reject_suggestion(suggestion_id):
-    # Find suggestion
-    suggestions_doc = mongo.db.email_suggestions.find_one({
-        '_id': ObjectId(suggestion_id),
-        'user_id': str(current_user.id)
-    })
-    
-    if not suggestions_doc:
-        flash('Suggestion not found.', 'error')
-        return redirect(url_for('main.email_suggestions'))
-    
-    # Get suggestion index from form
-    index = int(request.form.get('index', 0))
+    rejected = EmailSuggestion.reject_many(current_user.id, [suggestion_id])
     
-    if index >= len(suggestions_doc['suggestions']):
-        flash('Invalid suggestion index.', 'error')
+    if not rejected:
+        flash('Suggestion not found or already processed.', 'error')
         return redirect(url_for('main.email_suggestions'))
     
-    # Remove suggestion
-    suggestion = suggestions_doc['suggestions'].pop(index)
-    
-    if not suggestions_doc['suggestions']:
-        # If no more suggestions, mark the whole document as processed
-        mongo.db.email_suggestions.update_one(
-            {'_id': ObjectId(suggestion_id)},
-            {'$set': {'processed': True}}
-        )
+    flash(f"Ignored suggestion for {rejected[0].company}.", 'success')
+    return redirect(url_for('main.email_suggestions'))
+
+@main.route('/suggestions/process', methods=['POST'])
+@login_required
+def process_suggestions():
+    """Accept or reject the suggestions selected on the suggestions page"""
+    action = request.form.get('action', 'accept')
+    if request.form.get('process_all') == 'true':
+        suggestion_ids = None
     else:
-        # Otherwise, update the suggestions list
-        mongo.db.email_suggestions.update_one(
-            {'_id': ObjectId(suggestion_id)},
-            {'$set': {'suggestions': suggestions_doc['suggestions']}}
-        )
+        suggestion_ids = request.form.getlist('suggestion_ids')
+        if not suggestion_ids:
+            flash('No suggestions selected.', 'error')
+            return redirect(url_for('main.email_suggestions'))
+    
+    if action == 'reject':
+        rejected = EmailSuggestion.reject_many(current_user.id, suggestion_ids)
+        flash(f"Ignored {len(rejected)} suggestions.", 'success')
+    else:
+        result = EmailSuggestion.accept_many(current_user.id, suggestion_ids)
+        APPLICATIONS_CREATED.inc(result['created'])
+        flash(f"Added {result['created']} new applications and updated {result['updated']}.", 'success')
     
-    flash(f"Ignored suggestion for {suggestion['company']}.", 'success')
     return redirect(url_for('main.email_suggestions'))
 
-@main.route('/test_db')
-def test_db():
+@main.route('/api/suggestions/bulk', methods=['POST'])
+@login_required
+def bulk_process_suggestions():
+    """Accept or reject many suggestions at once: {"action": "accept"|"reject", "ids": [...] or "all"}"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    suggestion_ids = data.get('ids')
+    
+    if action not in ('accept', 'reject'):
+        return jsonify({'error': "action must be 'accept' or 'reject'"}), 400
+    if suggestion_ids == 'all':
+        suggestion_ids = None
+    elif not isinstance(suggestion_ids, list) or not suggestion_ids:
+        return jsonify({'error': "ids must be a non-empty list or 'all'"}), 400
+    
+    if action == 'reject':
+        processed = EmailSuggestion.reject_many(current_user.id, suggestion_ids)
+        created = updated = 0
+    else:
+        result = EmailSuggestion.accept_many(current_user.id, suggestion_ids)
+        APPLICATIONS_CREATED.inc(result['created'])
+        processed, created, updated = result['suggestions'], result['created'], result['updated']
+    
+    return jsonify({
+        'action': action,
+        'processed': [suggestion.id for suggestion in processed],
+        'created': created,
+        'updated': updated
+    })
+
+@main.route('/clear_all_user_data', methods=['POST'])
+@login_required
+def clear_all_user_data():
+    result = EmailService.clear_all_user_data(current_user)
+    flash(f"Deleted {result['applications']} applications and {result['suggestions']} suggestions.", 'success')
+    return redirect(url_for('main.email_suggestions'))
+
+@main.route('/healthz')
+def healthz():
+    """
+    Liveness of this process and its MongoDB client: ping latency, each
+    server's round-trip time, connection pool usage and checkout wait, and
+    command latencies. Returns 503 if MongoDB does not answer.
+    """
+    started = time.perf_counter()
     try:
-        # Test the database connection
-        mongo.db.command('ping')
-        
-        # Get database information
-        db_stats = mongo.db.command("dbStats")
-        
-        # Get collection stats
-        users_count = mongo.db.users.count_documents({})
-        apps_count = mongo.db.applications.count_documents({})
-        
-        # Get MongoDB connection info
-        conn_info = mongo.cx.address if mongo.cx else "Not connected"
-        
-        return {
-            'status': 'success',
-            'connection': str(conn_info),
-            'database_name': mongo.db.name,
-            'collections': {
-                'users': users_count,
-                'applications': apps_count
-            },
-            'database_stats': {
-                'collections': db_stats.get('collections', 0),
-                'objects': db_stats.get('objects', 0),
-                'avgObjSize': db_stats.get('avgObjSize', 0),
-                'dataSize': db_stats.get('dataSize', 0),
-            }
-        }
+        with pymongo.timeout(2):
+            mongo.db.command('ping')
+        status, error = 'ok', None
     except Exception as e:
-        return {
-            'status': 'error',
-            'message': str(e)
+        status, error = 'error', str(e)
+    ping_ms = round((time.perf_counter() - started) * 1000, 3)
+    
+    body = {
+        'status': status,
+        'mongodb': {
+            'ping_ms': ping_ms if error is None else None,
+            'error': error,
+            'servers': mongo_client.server_rtts(),
+            'pool': mongo_client.pool_stats(),
+            'commands': mongo_client.command_metrics.snapshot()
         }
+    }
+    return jsonify(body), 200 if error is None else 503
 
 @main.route('/application/delete/<application_id>', methods=['POST'])
 @login_required
@@ -604,6 +556,8 @@ def delete_application(application_id):
     })
     
     if result.deleted_count > 0:
+        UserStats.record_deleted(current_user.id, application.get('status'), application.get('date_applied'))
+        document_storage.release_documents(application.get('documents', []))
         flash('Application deleted successfully!', 'success')
     else:
         flash('Failed to delete application.', 'error')
@@ -614,7 +568,7 @@ def delete_application(application_id):
 @login_required
 def application_notes(application_id):
     # Get the application using our new model
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=('notes_list',))
     
     if not application:
         flash('Application not found.', 'error')
@@ -633,7 +587,7 @@ def application_notes(application_id):
 @main.route('/application/note/edit/<application_id>/<note_id>', methods=['POST'])
 @login_required
 def edit_note(application_id, note_id):
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=())
     
     if not application:
         return jsonify({'success': False, 'message': 'Application not found'}), 404
@@ -652,7 +606,7 @@ def edit_note(application_id, note_id):
 @main.route('/application/note/delete/<application_id>/<note_id>', methods=['POST'])
 @login_required
 def delete_note(application_id, note_id):
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=())
     
     if not application:
         return jsonify({'success': False, 'message': 'Application not found'}), 404
@@ -667,7 +621,7 @@ def delete_note(application_id, note_id):
 @main.route('/application/documents/<application_id>', methods=['GET', 'POST'])
 @login_required
 def application_documents(application_id):
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=('documents',))
     
     if not application:
         flash('Application not found.', 'error')
@@ -688,27 +642,26 @@ def application_documents(application_id):
             # Generate a secure filename
             filename = secure_filename(file.filename)
             
-            # Create a unique filename with timestamp
-            unique_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-            
-            # Create user directory if it doesn't exist
-            user_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], str(current_user.id))
-            if not os.path.exists(user_dir):
-                os.makedirs(user_dir)
-            
-            # Save the file
-            file_path = os.path.join(user_dir, unique_filename)
-            file.save(file_path)
-            
-            # Get file size
-            file_size = os.path.getsize(file_path)
+            # Stream the upload into document storage
+            stored = document_storage.save(file.stream)
             
             # Add document to application
-            application.add_document(
+            document = application.add_document(
                 name=filename,
-                file_path=file_path,
+                file_path=None,
                 file_type=file.content_type,
-                size=file_size
+                size=stored.size,
+                storage=stored.backend,
+                storage_key=stored.key,
+                sha256=stored.sha256
+            )
+            
+            # Text extraction and the thumbnail are done by the job workers
+            job_queue.enqueue(
+                'process_document',
+                current_user.id,
+                payload={'application_id': application.id, 'document_id': document['id']},
+                unique=False
             )
             
             flash('Document uploaded successfully!', 'success')
@@ -720,42 +673,73 @@ def application_documents(application_id):
 @main.route('/application/document/delete/<application_id>/<document_id>', methods=['POST'])
 @login_required
 def delete_document(application_id, document_id):
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=())
     
     if not application:
         return jsonify({'success': False, 'message': 'Application not found'}), 404
     
     # Find the document to get its file path
-    document = None
-    for doc in application.documents:
-        if doc['id'] == document_id:
-            document = doc
-            break
+    document = application.get_document(document_id)
     
     if not document:
         return jsonify({'success': False, 'message': 'Document not found'}), 404
     
-    # Delete the file if it exists
-    if 'file_path' in document and os.path.exists(document['file_path']):
-        try:
-            os.remove(document['file_path'])
-        except:
-            # Log the error but continue
-            current_app.logger.error(f"Failed to delete file: {document['file_path']}")
-    
     # Remove document from application
     success = application.delete_document(document_id)
     
+    # Delete the file unless another document has the same content
+    document_storage.release_documents([document])
+    try:
+        if not document.get('storage_key') and legacy_path(document):
+            os.remove(legacy_path(document))
+    except Exception as e:
+        # Log the error but continue
+        current_app.logger.error(f"Failed to delete file of document {document_id}: {str(e)}")
+    
     if success:
         return jsonify({'success': True, 'message': 'Document deleted successfully'})
     else:
         return jsonify({'success': False, 'message': 'Failed to delete document'}), 500
 
+@main.route('/application/document/<application_id>/<document_id>')
+@login_required
+def download_document(application_id, document_id):
+    """Serve a document inline, or as a download with ?download=1; supports Range requests"""
+    application = Application.get_by_id(application_id, current_user.id, include=())
+    if not application:
+        return "Application not found", 404
+    
+    document = application.get_document(document_id)
+    response = document_storage.send(document, as_attachment=request.args.get('download') == '1') if document else None
+    if response is None:
+        return "Document not found", 404
+    return response
+
+@main.route('/application/document/<application_id>/<document_id>/thumbnail')
+@login_required
+def document_thumbnail(application_id, document_id):
+    """Serve the first-page thumbnail made when the document was processed"""
+    application = Application.get_by_id(application_id, current_user.id, include=())
+    document = application.get_document(document_id) if application else None
+    thumbnail = (document or {}).get('thumbnail')
+    if not thumbnail:
+        return "Thumbnail not found", 404
+    
+    response = document_storage.send({
+        'storage': thumbnail['storage'],
+        'storage_key': thumbnail['key'],
+        'name': 'thumbnail.png',
+        'file_type': 'image/png'
+    })
+    if response is None:
+        return "Thumbnail not found", 404
+    return response
+
 @main.route('/application/interviews/<application_id>', methods=['GET', 'POST'])
 @login_required
 def application_interviews(application_id):
     # Get the application using our new model
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=('interviews',))
     if not application:
         flash('Application not found.', 'error')
         return redirect(url_for('main.dashboard'))
@@ -801,34 +785,14 @@ def application_interviews(application_id):
 @login_required
 def delete_interview(application_id, interview_id):
     # Get the application
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=())
     if not application:
         return jsonify({'success': False, 'message': 'Application not found.'})
     
-    # Check if the interview exists
-    interview_exists = False
-    for interview in application.interviews:
-        if interview.get('id') == interview_id:
-            interview_exists = True
-            break
-    
-    if not interview_exists:
-        return jsonify({'success': False, 'message': 'Interview not found.'})
-    
     # Delete the interview
     try:
-        # Update MongoDB
-        mongo.db.applications.update_one(
-            {'_id': ObjectId(application_id)},
-            {
-                '$pull': {'interviews': {'id': interview_id}},
-                '$set': {'updated_at': datetime.now()}
-            }
-        )
-        
-        # Update local object
-        application.interviews = [i for i in application.interviews if i.get('id') != interview_id]
-        application.updated_at = datetime.now()
+        if not application.delete_interview(interview_id):
+            return jsonify({'success': False, 'message': 'Interview not found.'})
         
         return jsonify({'success': True})
     except Exception as e:
@@ -838,7 +802,7 @@ def delete_interview(application_id, interview_id):
 @login_required
 def edit_interview(application_id, interview_id):
     # Get the application
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=())
     if not application:
         return jsonify({'success': False, 'message': 'Application not found.'})
     
@@ -871,8 +835,11 @@ def edit_interview(application_id, interview_id):
 @login_required
 def delete_all_applications():
     try:
-        # Delete all applications for the current user
+        # Delete all applications for the current user, then the files only they referred to
+        documents = Application.stored_documents(current_user.id)
         result = mongo.db.applications.delete_many({'user_id': str(current_user.id)})
+        UserStats.reset(current_user.id)
+        document_storage.release_documents(documents)
         
         if result.deleted_count > 0:
             flash('All applications have been deleted successfully.', 'success')
@@ -887,49 +854,26 @@ def delete_all_applications():
 @main.route('/api/applications/timeline')
 @login_required
 def get_timeline_data():
-    days = int(request.args.get('days', '28'))  # Default to 28 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
+    # 'all' covers the whole history; granularity is day, week or month
+    try:
+        days = parse_time_range(request.args.get('days'))  # Default to 28 days
+    except ValueError:
+        return jsonify({'error': 'Invalid days parameter'}), 400
     
-    # Get applications within the date range
-    applications = list(mongo.db.applications.find({
-        'user_id': str(current_user.id),
-        'date_applied': {'$gte': start_date, '$lte': end_date}
-    }))
-    
-    # Initialize the timeline data with separate status counts
-    timeline_data = {
-        'labels': [],
-        'Applied': [],
-        'In Progress': [],
-        'Interview': [],
-        'Offer': [],
-        'Rejected': [],
-        'Withdrawn': []
-    }
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'Unsupported granularity: {granularity}'}), 400
     
-    # Generate dates for the timeline
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        timeline_data['labels'].append(date_str)
-        
-        # Count applications for each status on this day
-        for status in ['Applied', 'In Progress', 'Interview', 'Offer', 'Rejected', 'Withdrawn']:
-            count = sum(1 for app in applications 
-                       if app.get('date_applied').date() == current_date.date() 
-                       and app.get('status') == status)
-            timeline_data[status].append(count)
-            
-        current_date += timedelta(days=1)
-    
-    return jsonify(timeline_data)
+    stats = DashboardStatsService.compute(
+        current_user.id, days=days, granularity=granularity, include_upcoming=False
+    )
+    return jsonify(stats.timeline_series())
 
 @main.route('/application/reminders/<application_id>', methods=['GET', 'POST'])
 @login_required
 def application_reminders(application_id):
     # Get the application
-    application = Application.get_by_id(application_id, current_user.id)
+    application = Application.get_by_id(application_id, current_user.id, include=())
     if not application:
         flash('Application not found.', 'error')
         return redirect(url_for('main.dashboard'))
@@ -1028,6 +972,9 @@ def update_reminder(reminder_id):
         }
         if status:
             update_data['status'] = status
+        # A rescheduled reminder is notified again at its new time
+        if reminder_date != reminder.reminder_date:
+            update_data['notification_sent'] = False
         
         if reminder.update(update_data):
             return jsonify({'success': True, 'message': 'Reminder updated successfully'})
@@ -1049,12 +996,6 @@ def mark_reminder_completed(reminder_id):
 @main.route('/api/status-counts')
 @login_required
 def get_status_counts():
-    # Get status counts for the current user
-    status_counts = {}
-    for status in ['Applied', 'In Progress', 'Interview', 'Offer', 'Rejected', 'Withdrawn']:
-        status_counts[status] = mongo.db.applications.count_documents({
-            'user_id': str(current_user.id),
-            'status': status
-        })
-    
-    return jsonify(status_counts) 
\ No newline at end of file
+    # Get status counts for the current user from their stats document
+    status_counts = UserStats.get(current_user.id).get('status_counts', {})
+    return jsonify({status: status_counts.get(status, 0) for status in STATUSES})
@@ -1,9 +1,53 @@
 from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user_stats import UserStats
 from bson.objectid import ObjectId
+from job_app_tracker.utils.pagination import encode_cursor, keyset_filter
 from datetime import datetime
 
+class _SubCollection:
+    """Embedded array that is fetched from MongoDB the first time it is read"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.name not in instance.__dict__:
+            # The others are usually read next, so fetch all the missing ones at once
+            instance._load_sub_collections()
+        return instance.__dict__[self.name]
+    
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
 class Application:
-    def __init__(self, app_data):
+    # Embedded arrays that can grow large; loaded only when asked for or first read
+    SUB_COLLECTIONS = ('notes_list', 'documents', 'contacts', 'interviews')
+    
+    notes_list = _SubCollection()
+    documents = _SubCollection()
+    contacts = _SubCollection()
+    interviews = _SubCollection()
+    
+    # Fields needed to render a row in the applications list
+    LIST_FIELDS = ['company', 'position', 'status', 'date_applied', 'company_logo', 'location', 'deadline']
+    
+    # Sort options offered by the dashboard, as (field, direction)
+    SORT_OPTIONS = {
+        'date-desc': ('date_applied', -1),
+        'date-asc': ('date_applied', 1),
+        'company': ('company', 1),
+        'status': ('status', 1)
+    }
+    
+    def __init__(self, app_data, include=None):
+        """
+        Args:
+            app_data: Application document
+            include: Sub-collections present in app_data; the others are loaded
+                     lazily. None means the document was loaded in full.
+        """
         self.id = str(app_data.get('_id', ''))
         self.user_id = app_data.get('user_id')
         self.company = app_data.get('company')
@@ -16,10 +60,9 @@ class Application:
         self.notes = app_data.get('notes', '')
         
         # New fields for enhanced functionality
-        self.notes_list = app_data.get('notes_list', [])
-        self.documents = app_data.get('documents', [])
-        self.contacts = app_data.get('contacts', [])
-        self.interviews = app_data.get('interviews', [])
+        for name in Application.SUB_COLLECTIONS:
+            if include is None or name in include:
+                setattr(self, name, app_data.get(name, []))
         self.salary_info = app_data.get('salary_info', {})
         self.created_at = app_data.get('created_at')
         self.updated_at = app_data.get('updated_at')
@@ -28,20 +71,51 @@ class Application:
         self.tags = app_data.get('tags', [])
     
     @staticmethod
-    def get_by_id(app_id, user_id=None):
-        """Get application by ID, optionally filtering by user_id for security"""
+    def _projection(include):
+        """Projection that leaves out the sub-collections not in include"""
+        if include is None:
+            return None
+        excluded = {name: 0 for name in Application.SUB_COLLECTIONS if name not in include}
+        return excluded or None
+    
+    def _is_loaded(self, name):
+        return name in self.__dict__
+    
+    def _load_sub_collections(self, names=None):
+        """Fetch sub-collections that were left out when the application was loaded, in one query"""
+        if names is None:
+            names = [name for name in Application.SUB_COLLECTIONS if not self._is_loaded(name)]
+        if not names:
+            return
+        app_data = mongo.db.applications.find_one(
+            {'_id': ObjectId(self.id)},
+            {name: 1 for name in names}
+        ) if self.id else None
+        for name in names:
+            self.__dict__[name] = (app_data or {}).get(name, [])
+    
+    @staticmethod
+    def get_by_id(app_id, user_id=None, include=None):
+        """
+        Get application by ID, optionally filtering by user_id for security
+        
+        include lists the sub-collections (SUB_COLLECTIONS) to load up front,
+        e.g. include=() for routes that only need the application's own fields.
+        Sub-collections left out are fetched on first access. By default the
+        whole document is loaded.
+        """
         try:
             query = {'_id': ObjectId(app_id)}
             if user_id:
                 query['user_id'] = str(user_id)
                 
-            app_data = mongo.db.applications.find_one(query)
-            return Application(app_data) if app_data else None
+            app_data = mongo.db.applications.find_one(query, Application._projection(include))
+            return Application(app_data, include) if app_data else None
         except:
             return None
     
     @staticmethod
-    def get_all_for_user(user_id, filters=None, sort=None):
+    def get_all_for_user(user_id, filters=None, sort=None, include=None):
         """Get all applications for a user with optional filtering and sorting"""
         query = {'user_id': str(user_id)}
         
@@ -53,8 +127,65 @@ class Application:
         # Default sort by date applied descending
         sort_params = sort if sort else [('date_applied', -1)]
         
-        apps_data = mongo.db.applications.find(query).sort(sort_params)
-        return [Application(app) for app in apps_data]
+        apps_data = mongo.db.applications.find(query, Application._projection(include)).sort(sort_params)
+        return [Application(app, include) for app in apps_data]
+    
+    @staticmethod
+    def get_page_for_user(user_id, status=None, date_from=None, date_to=None, search=None,
+                          sort='date-desc', cursor=None, limit=20, include_total=False):
+        """
+        Get one page of a user's applications for the list view.
+        
+        Uses keyset pagination on (sort field, _id), so later pages cost the same
+        as the first. Only LIST_FIELDS are loaded.
+        
+        Returns:
+            tuple: (applications as dicts, cursor for the next page or None,
+                    total matching applications or None unless include_total)
+        """
+        if sort not in Application.SORT_OPTIONS:
+            raise ValueError(f"Unsupported sort: {sort}")
+        field, direction = Application.SORT_OPTIONS[sort]
+        
+        query = {'user_id': str(user_id)}
+        if status:
+            query['status'] = status
+        if date_from or date_to:
+            query['date_applied'] = {}
+            if date_from:
+                query['date_applied']['$gte'] = date_from
+            if date_to:
+                query['date_applied']['$lte'] = date_to
+        if search:
+            # Whole words in any indexed field, including notes and document text
+            query['$text'] = {'$search': search}
+        
+        total = mongo.db.applications.count_documents(query) if include_total else None
+        
+        if cursor:
+            query = {'$and': [query, keyset_filter(field, direction, cursor)]}
+        
+        projection = {name: 1 for name in Application.LIST_FIELDS}
+        docs = list(mongo.db.applications.find(query, projection)
+                    .sort([(field, direction), ('_id', direction)])
+                    .limit(limit + 1))
+        
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = encode_cursor(last.get(field), last['_id'])
+        
+        for doc in docs:
+            doc['_id'] = str(doc['_id'])
+            # Older records stored the date as a string
+            if isinstance(doc.get('date_applied'), str):
+                try:
+                    doc['date_applied'] = datetime.strptime(doc['date_applied'], '%Y-%m-%d')
+                except ValueError:
+                    doc['date_applied'] = None
+        
+        return docs, next_cursor, total
     
     @staticmethod
     def create(app_data):
@@ -73,6 +204,7 @@ class Application:
         
         result = mongo.db.applications.insert_one(app_data)
         app_data['_id'] = result.inserted_id
+        UserStats.record_created(app_data.get('user_id'), app_data.get('status'), app_data.get('date_applied'))
         return Application(app_data)
     
     def update(self, updates):
@@ -108,6 +240,13 @@ class Application:
             {'$set': updates}
         )
         
+        if 'status' in updates or 'date_applied' in updates:
+            UserStats.record_moved(
+                self.user_id,
+                self.status, self.date_applied,
+                updates.get('status', self.status), updates.get('date_applied', self.date_applied)
+            )
+        
         # Update local attributes
         for key, value in updates.items():
             setattr(self, key, value)
@@ -135,9 +274,8 @@ class Application:
         )
         
         # Update local attributes
-        if not self.notes_list:
-            self.notes_list = []
-        self.notes_list.append(note)
+        if self._is_loaded('notes_list'):
+            self.notes_list.append(note)
         self.notes = content
         self.updated_at = note['updated_at']
         
@@ -145,7 +283,7 @@ class Application:
     
     def update_note(self, note_id, content):
         """Update a specific note"""
-        mongo.db.applications.update_one(
+        result = mongo.db.applications.update_one(
             {'_id': ObjectId(self.id), 'notes_list.id': note_id},
             {
                 '$set': {
@@ -157,19 +295,20 @@ class Application:
         )
         
         # Update local attributes
-        for note in self.notes_list:
-            if note['id'] == note_id:
-                note['content'] = content
-                note['updated_at'] = datetime.now()
-                break
-        
-        # Update the main notes field with the most recent note
-        if self.notes_list:
-            self.notes = self.notes_list[-1]['content']
+        if self._is_loaded('notes_list'):
+            for note in self.notes_list:
+                if note.get('id') == note_id:
+                    note['content'] = content
+                    note['updated_at'] = datetime.now()
+                    break
+            
+            # Update the main notes field with the most recent note
+            if self.notes_list:
+                self.notes = self.notes_list[-1]['content']
         
         self.updated_at = datetime.now()
         
-        return True
+        return result.matched_count > 0
     
     def delete_note(self, note_id):
         """Delete a specific note"""
@@ -182,26 +321,38 @@ class Application:
         )
         
         # Update local attributes
-        self.notes_list = [note for note in self.notes_list if note['id'] != note_id]
-        
-        # Update the main notes field with the most recent note
-        if self.notes_list:
-            self.notes = self.notes_list[-1]['content']
-        else:
-            self.notes = ''
+        if self._is_loaded('notes_list'):
+            self.notes_list = [note for note in self.notes_list if note.get('id') != note_id]
+            
+            # Update the main notes field with the most recent note
+            if self.notes_list:
+                self.notes = self.notes_list[-1]['content']
+            else:
+                self.notes = ''
         
         self.updated_at = datetime.now()
         
         return True
     
-    def add_document(self, name, file_path, file_type, size):
-        """Add a document to the application"""
+    def add_document(self, name, file_path, file_type, size, storage=None, storage_key=None, sha256=None):
+        """
+        Add a document to the application
+        
+        storage and storage_key locate the file in the document storage
+        (services.storage); file_path is only set on documents saved before it.
+        Stored documents start out with processing 'pending' until a
+        'process_document' job extracts their text and thumbnail.
+        """
         document = {
             'id': str(ObjectId()),
             'name': name,
             'file_path': file_path,
             'file_type': file_type,
             'size': size,
+            'storage': storage,
+            'storage_key': storage_key,
+            'sha256': sha256,
+            'processing': 'pending' if storage_key else None,
             'uploaded_at': datetime.now()
         }
         
@@ -214,9 +365,8 @@ class Application:
         )
         
         # Update local attributes
-        if not self.documents:
-            self.documents = []
-        self.documents.append(document)
+        if self._is_loaded('documents'):
+            self.documents.append(document)
         self.updated_at = document['uploaded_at']
         
         return document
@@ -232,11 +382,32 @@ class Application:
         )
         
         # Update local attributes
-        self.documents = [doc for doc in self.documents if doc['id'] != document_id]
+        if self._is_loaded('documents'):
+            self.documents = [doc for doc in self.documents if doc['id'] != document_id]
         self.updated_at = datetime.now()
         
         return True
     
+    def update_document(self, document_id, fields):
+        """
+        Set fields on a document entry, e.g. the results of processing it
+        
+        Returns:
+            bool: Whether the document still exists
+        """
+        result = mongo.db.applications.update_one(
+            {'_id': ObjectId(self.id), 'documents.id': document_id},
+            {'$set': {f'documents.$.{name}': value for name, value in fields.items()}}
+        )
+        
+        # Update local attributes
+        if self._is_loaded('documents'):
+            for doc in self.documents:
+                if doc['id'] == document_id:
+                    doc.update(fields)
+        
+        return result.matched_count > 0
+    
     def add_interview(self, date, interview_type, notes=None):
         """Add an interview to the application"""
         interview = {
@@ -257,75 +428,105 @@ class Application:
         )
         
         # Update local attributes
-        if not self.interviews:
-            self.interviews = []
-        self.interviews.append(interview)
+        if self._is_loaded('interviews'):
+            self.interviews.append(interview)
         self.updated_at = interview['created_at']
         
         return interview
     
     def delete_interview(self, interview_id):
-        """Delete an interview"""
-        mongo.db.applications.update_one(
-            {'_id': ObjectId(self.id)},
+        """Delete an interview, returning False if it does not exist"""
+        result = mongo.db.applications.update_one(
+            {'_id': ObjectId(self.id), 'interviews.id': interview_id},
             {
                 '$pull': {'interviews': {'id': interview_id}},
                 '$set': {'updated_at': datetime.now()}
             }
         )
         
+        if result.matched_count == 0:
+            return False
+        
         # Update local attributes
-        self.interviews = [i for i in self.interviews if i.get('id') != interview_id]
+        if self._is_loaded('interviews'):
+            self.interviews = [i for i in self.interviews if i.get('id') != interview_id]
         self.updated_at = datetime.now()
         
         return True
     
     def edit_interview(self, interview_id, date, interview_type, notes=None):
         """Edit an existing interview"""
-        # Find the interview in the local list
-        interview_index = None
-        for i, interview in enumerate(self.interviews):
-            if interview.get('id') == interview_id:
-                interview_index = i
-                break
-                
-        if interview_index is None:
-            raise ValueError("Interview not found")
-            
-        # Create updated interview data
-        updated_interview = {
-            'id': interview_id,
-            'date': date,
-            'type': interview_type,
-            'notes': notes,
-            'created_at': self.interviews[interview_index]['created_at'],
-            'updated_at': datetime.now()
-        }
+        updated_at = datetime.now()
         
-        # Update in MongoDB using array filters to target the specific interview
-        mongo.db.applications.update_one(
+        # Update only the edited fields of the matching interview, so the
+        # interviews array does not need to be loaded first
+        result = mongo.db.applications.update_one(
             {'_id': ObjectId(self.id), 'interviews.id': interview_id},
             {
                 '$set': {
-                    'interviews.$': updated_interview,
-                    'updated_at': datetime.now()
+                    'interviews.$.date': date,
+                    'interviews.$.type': interview_type,
+                    'interviews.$.notes': notes,
+                    'interviews.$.updated_at': updated_at,
+                    'updated_at': updated_at
                 }
             }
         )
         
+        if result.matched_count == 0:
+            raise ValueError("Interview not found")
+        
+        updated_interview = {
+            'id': interview_id,
+            'date': date,
+            'type': interview_type,
+            'notes': notes,
+            'updated_at': updated_at
+        }
+        
         # Update local attributes
-        self.interviews[interview_index] = updated_interview
-        self.updated_at = updated_interview['updated_at']
+        if self._is_loaded('interviews'):
+            for interview in self.interviews:
+                if interview.get('id') == interview_id:
+                    interview.update(updated_interview)
+                    updated_interview = interview
+                    break
+        self.updated_at = updated_at
         
         return updated_interview
     
+    @staticmethod
+    def stored_documents(user_id):
+        """Document entries of all of a user's applications, with only the fields locating their files"""
+        projection = {'documents.id': 1, 'documents.storage': 1, 'documents.storage_key': 1, 'documents.thumbnail': 1}
+        return [
+            document
+            for app_data in mongo.db.applications.find({'user_id': str(user_id), 'documents': {'$ne': []}}, projection)
+            for document in app_data.get('documents', [])
+        ]
+    
+    def get_document(self, document_id):
+        """Get a single document entry without loading the rest of the documents array"""
+        if self._is_loaded('documents'):
+            return next((doc for doc in self.documents if doc.get('id') == document_id), None)
+        
+        app_data = mongo.db.applications.find_one(
+            {'_id': ObjectId(self.id)},
+            {'documents': {'$elemMatch': {'id': document_id}}}
+        )
+        documents = (app_data or {}).get('documents', [])
+        return documents[0] if documents else None
+    
     def delete(self):
         """Delete the application"""
         result = mongo.db.applications.delete_one({'_id': ObjectId(self.id)})
+        if result.deleted_count > 0:
+            UserStats.record_deleted(self.user_id, self.status, self.date_applied)
         return result.deleted_count > 0
     
     def to_dict(self):
         """Convert to dictionary"""
+        self._load_sub_collections()
         return {
             'id': self.id,
             'user_id': self.user_id,
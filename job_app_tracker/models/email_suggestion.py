@@ -0,0 +1,261 @@
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user_stats import UserStats
+from job_app_tracker.utils.metrics import SUGGESTIONS_ACCEPTED
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime
+import logging
+
+logger = logging.getLogger('email_suggestion')
+
+# Duplicate key error code, raised when an email was already suggested
+DUPLICATE_KEY = 11000
+
+class EmailSuggestion:
+    """A suggested change found in a user's email, stored one document per suggestion.
+
+    type 'new' suggests adding an application (company, position, status, date);
+    type 'update' suggests moving an existing application (application_id) to
+    new_status. Accepting or rejecting a suggestion marks it processed and
+    records the decision; it is never removed from an array.
+    """
+
+    def __init__(self, data):
+        self.id = str(data.get('_id', ''))
+        self.user_id = data.get('user_id')
+        self.type = data.get('type')
+        self.email_id = data.get('email_id')
+        self.email_subject = data.get('email_subject')
+        self.email_from = data.get('email_from')
+        self.date = data.get('date')
+        self.timestamp = data.get('timestamp')
+        self.company = data.get('company')
+        self.position = data.get('position')
+        self.status = data.get('status')
+        self.application_id = data.get('application_id')
+        self.current_status = data.get('current_status')
+        self.new_status = data.get('new_status')
+        self.confidence = data.get('confidence')
+        self.reasoning = data.get('reasoning')
+        self.notes = data.get('notes')
+        self.application_platform = data.get('application_platform')
+        self.job_url = data.get('job_url')
+        self.processed = data.get('processed', False)
+        self.decision = data.get('decision')
+        self.created_at = data.get('created_at')
+
+    @staticmethod
+    def _object_ids(suggestion_ids):
+        return [ObjectId(s) for s in suggestion_ids if ObjectId.is_valid(str(s))]
+
+    @staticmethod
+    def create_many(user_id, suggestions):
+        """
+        Store new suggestions for a user, skipping emails that were already suggested.
+
+        Returns:
+            int: Number of suggestions stored
+        """
+        if not suggestions:
+            return 0
+
+        now = datetime.now()
+        documents = []
+        for suggestion in suggestions:
+            document = dict(suggestion)
+            document.pop('_id', None)
+            document.update({
+                'user_id': str(user_id),
+                'processed': False,
+                'created_at': document.get('created_at') or now
+            })
+            documents.append(document)
+
+        try:
+            result = mongo.db.email_suggestions.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            unexpected = [error for error in errors if error.get('code') != DUPLICATE_KEY]
+            if unexpected:
+                logger.error(f"Failed to store {len(unexpected)} suggestions for user {user_id}: {unexpected[0].get('errmsg')}")
+            return e.details.get('nInserted', 0)
+
+    @staticmethod
+    def get_pending(user_id, page=1, per_page=50):
+        """
+        Get a page of a user's unprocessed suggestions, newest email first.
+
+        Returns:
+            tuple: (list of EmailSuggestion, total number of unprocessed suggestions)
+        """
+        query = {'user_id': str(user_id), 'processed': False}
+        total = mongo.db.email_suggestions.count_documents(query)
+        cursor = mongo.db.email_suggestions.find(query).sort(
+            [('date', -1), ('_id', -1)]
+        ).skip((page - 1) * per_page).limit(per_page)
+        return [EmailSuggestion(doc) for doc in cursor], total
+
+    @staticmethod
+    def count_pending(user_id):
+        return mongo.db.email_suggestions.count_documents({'user_id': str(user_id), 'processed': False})
+
+    @staticmethod
+    def _claim(user_id, suggestion_ids, decision):
+        """
+        Mark unprocessed suggestions as processed with a decision.
+
+        The update only matches suggestions that are still unprocessed, so when
+        the same suggestion is submitted twice concurrently only one request
+        claims it. Returns the claimed suggestion documents.
+        """
+        token = ObjectId()
+        if suggestion_ids is None:
+            ids = mongo.db.email_suggestions.distinct('_id', {'user_id': str(user_id), 'processed': False})
+        else:
+            ids = EmailSuggestion._object_ids(suggestion_ids)
+        if not ids:
+            return []
+
+        result = mongo.db.email_suggestions.update_many(
+            {'_id': {'$in': ids}, 'user_id': str(user_id), 'processed': False},
+            {'$set': {
+                'processed': True,
+                'decision': decision,
+                'processed_at': datetime.now(),
+                'claim': token
+            }}
+        )
+        if result.modified_count == 0:
+            return []
+        return list(mongo.db.email_suggestions.find({'_id': {'$in': ids}, 'claim': token}))
+
+    @staticmethod
+    def _release(suggestions):
+        """Return claimed suggestions to the unprocessed state"""
+        mongo.db.email_suggestions.update_many(
+            {'_id': {'$in': [s['_id'] for s in suggestions]}},
+            {
+                '$set': {'processed': False},
+                '$unset': {'decision': '', 'processed_at': '', 'claim': ''}
+            }
+        )
+
+    @staticmethod
+    def reject_many(user_id, suggestion_ids=None):
+        """
+        Reject suggestions; None rejects every unprocessed suggestion.
+
+        Returns:
+            list: The rejected suggestions
+        """
+        return [EmailSuggestion(doc) for doc in EmailSuggestion._claim(user_id, suggestion_ids, 'rejected')]
+
+    @staticmethod
+    def accept_many(user_id, suggestion_ids=None):
+        """
+        Accept suggestions, applying all of them with a single bulk_write on
+        the applications collection. None accepts every unprocessed suggestion.
+
+        Returns:
+            dict: Numbers of applications created and updated, and the accepted suggestions
+        """
+        user_id = str(user_id)
+        suggestions = EmailSuggestion._claim(user_id, suggestion_ids, 'accepted')
+
+        updates = [s for s in suggestions if s.get('type') == 'update' and ObjectId.is_valid(str(s.get('application_id')))]
+        new = [s for s in suggestions if s.get('type') == 'new']
+
+        # Current status of the applications being updated, for the stats
+        previous = {}
+        if updates:
+            app_ids = list({ObjectId(s['application_id']) for s in updates})
+            for app in mongo.db.applications.find(
+                {'_id': {'$in': app_ids}, 'user_id': user_id},
+                {'status': 1, 'date_applied': 1}
+            ):
+                previous[str(app['_id'])] = app
+
+        now = datetime.now()
+        operations = []
+        moves = []
+        for suggestion in updates:
+            app = previous.get(str(suggestion['application_id']))
+            if app is None:
+                continue
+            operations.append(UpdateOne(
+                {'_id': app['_id'], 'user_id': user_id},
+                {'$set': {'status': suggestion['new_status'], 'updated_at': now}}
+            ))
+            moves.append((app.get('status'), app.get('date_applied'), suggestion['new_status'], app.get('date_applied')))
+            # A later suggestion for the same application starts from this status
+            app['status'] = suggestion['new_status']
+
+        created = []
+        for suggestion in new:
+            position = suggestion.get('position')
+            application = {
+                'user_id': user_id,
+                'company': suggestion.get('company'),
+                'position': position if position != 'Unknown Position' else '',
+                'status': suggestion.get('status') or 'Applied',
+                'date_applied': suggestion.get('date') or now,
+                'notes': f"Automatically added from email: {suggestion.get('email_subject')}",
+                'source': 'email',
+                'email_ids': [suggestion['email_id']] if suggestion.get('email_id') else [],
+                'created_at': now,
+                'updated_at': now
+            }
+            operations.append(InsertOne(application))
+            created.append(application)
+
+        if operations:
+            try:
+                mongo.db.applications.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Some writes went through; rebuild_stats reconciles the counters
+                logger.error(f"Some accepted suggestions failed to apply for user {user_id}: {e.details.get('writeErrors', [])[:1]}")
+            except Exception:
+                # Nothing was applied; leave the suggestions to be accepted again
+                EmailSuggestion._release(suggestions)
+                raise
+
+        if created:
+            UserStats.record_created_many(user_id, [(app['status'], app['date_applied']) for app in created])
+        if moves:
+            UserStats.record_moved_many(user_id, moves)
+        SUGGESTIONS_ACCEPTED.labels('new').inc(len(created))
+        SUGGESTIONS_ACCEPTED.labels('update').inc(len(moves))
+
+        return {
+            'created': len(created),
+            'updated': len(moves),
+            'suggestions': [EmailSuggestion(doc) for doc in suggestions]
+        }
+
+    @staticmethod
+    def delete_all_for_user(user_id):
+        result = mongo.db.email_suggestions.delete_many({'user_id': str(user_id)})
+        return result.deleted_count
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'email_id': self.email_id,
+            'email_subject': self.email_subject,
+            'email_from': self.email_from,
+            'date': self.date,
+            'company': self.company,
+            'position': self.position,
+            'status': self.status,
+            'application_id': self.application_id,
+            'current_status': self.current_status,
+            'new_status': self.new_status,
+            'confidence': self.confidence,
+            'reasoning': self.reasoning,
+            'processed': self.processed,
+            'decision': self.decision
+        }
@@ -1,5 +1,6 @@
 from datetime import datetime
 from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user_stats import UserStats
 from bson import ObjectId
 
 class JobApplication:
@@ -26,6 +27,7 @@ class JobApplication:
         data['updated_at'] = datetime.utcnow()
         result = mongo.db.applications.insert_one(data)
         data['_id'] = result.inserted_id
+        UserStats.record_created(data.get('user_id'), data.get('status', 'Applied'), data.get('date_applied'))
         return cls(data)
 
     @classmethod
@@ -43,6 +45,8 @@ class JobApplication:
             {'$set': data}
         )
         if result.modified_count > 0:
+            if 'status' in data:
+                UserStats.record_status_change(self.user_id, self.status, data['status'], self.date_applied)
             for key, value in data.items():
                 setattr(self, key, value)
             return True
@@ -19,6 +19,8 @@ class Reminder:
     @staticmethod
     def create(reminder_data):
         """Create a new reminder"""
+        reminder_data.setdefault('status', 'pending')
+        reminder_data.setdefault('notification_sent', False)
         reminder_data['created_at'] = datetime.now()
         reminder_data['updated_at'] = datetime.now()
         result = mongo.db.reminders.insert_one(reminder_data)
@@ -1,10 +1,21 @@
 from flask_login import UserMixin
 import bcrypt
 from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.config.indexes import EMAIL_COLLATION
+from job_app_tracker.utils.cache import TTLCache
 from bson import ObjectId
 from datetime import datetime
+import copy
+import os
 
 class User(UserMixin):
+    # User documents by id, so that loading the logged-in user does not hit the
+    # database on every request. Writes through this model invalidate the entry.
+    _cache = TTLCache(
+        maxsize=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+        ttl=int(os.environ.get('USER_CACHE_TTL', 60))
+    )
+
     def __init__(self, data):
         if data is None:
             return None
@@ -26,7 +37,8 @@ class User(UserMixin):
     def get_by_email(cls, email):
         # Convert email to lowercase before searching
         email = email.lower()
-        data = mongo.db.users.find_one({'email': email})
+        # With the index's collation, so the lookup uses email_1 instead of a collection scan
+        data = mongo.db.users.find_one({'email': email}, collation=EMAIL_COLLATION)
         return cls(data) if data else None
 
     @classmethod
@@ -42,6 +54,7 @@ class User(UserMixin):
             {'_id': ObjectId(self.id)},
             {'$set': data}
         )
+        User.invalidate_cache(self.id)
         if result.modified_count > 0:
             for key, value in data.items():
                 setattr(self, key, value)
@@ -119,6 +132,27 @@ class User(UserMixin):
         except:
             return None
     
+    @staticmethod
+    def get_cached(user_id):
+        """Get user by ID, reading from the user cache when possible"""
+        user_id = str(user_id)
+        user_data = User._cache.get(user_id)
+        if user_data is None:
+            try:
+                user_data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+            except:
+                return None
+            if not user_data:
+                return None
+            User._cache.set(user_id, user_data)
+        # Each request gets its own copy, so local changes never leak into the cache
+        return User(copy.deepcopy(user_data))
+    
+    @staticmethod
+    def invalidate_cache(user_id):
+        """Drop a user from the user cache after their document changed"""
+        User._cache.pop(str(user_id))
+    
     def update_email_connection(self, connected_email, provider, token, refresh_token, expiry):
         """Update email connection details"""
         update_data = {
@@ -134,6 +168,7 @@ class User(UserMixin):
             {'_id': ObjectId(self.id)},
             {'$set': update_data}
         )
+        User.invalidate_cache(self.id)
         
         # Update local attributes
         self.email_connected = True
@@ -146,18 +181,19 @@ class User(UserMixin):
         return True
     
     def update_email_settings(self, settings):
-        """Update email scanning settings"""
-        update_data = {
-            'email_settings': settings
-        }
-        
+        """Update email scanning settings, keeping the others (such as the scan watermark)"""
+        return self.update_scan_state(**settings)
+    
+    def update_scan_state(self, **fields):
+        """Set individual email_settings fields, such as the scan watermark, keeping the rest"""
         mongo.db.users.update_one(
             {'_id': ObjectId(self.id)},
-            {'$set': update_data}
+            {'$set': {f'email_settings.{key}': value for key, value in fields.items()}}
         )
+        User.invalidate_cache(self.id)
         
         # Update local attributes
-        self.email_settings = settings
+        self.email_settings = dict(self.email_settings or {}, **fields)
         
         return True
     
@@ -175,10 +211,13 @@ class User(UserMixin):
     @property
     def has_suggestions(self):
         """Check if user has unprocessed email suggestions"""
-        # Check if there are any unprocessed suggestions
-        count = mongo.db.email_suggestions.count_documents({
-            'user_id': str(self.id),
-            'processed': False
-        })
+        # The user object lives for one request, so the answer is computed once
+        # per request however many times templates read it
+        if getattr(self, '_has_suggestions', None) is None:
+            # Check if there are any unprocessed suggestions
+            self._has_suggestions = mongo.db.email_suggestions.find_one(
+                {'user_id': str(self.id), 'processed': False},
+                {'_id': 1}
+            ) is not None
         
-        return count > 0 
\ No newline at end of file
+        return self._has_suggestions 
\ No newline at end of file
@@ -0,0 +1,283 @@
+from pymongo.errors import DuplicateKeyError
+from job_app_tracker.config.mongodb import mongo
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger('user_stats')
+
+
+class UserStats:
+    """Per-user application counters kept in the user_stats collection.
+
+    One document per user, keyed by the user id:
+
+        {
+            '_id': user_id,
+            'total': 42,
+            'status_counts': {'Applied': 30, 'Interview': 4, ...},
+            'daily': {'2024-05-01': {'Applied': 2, 'Rejected': 1}, ...},
+            'first_applied': datetime,
+            'last_applied': datetime,
+            'updated_at': datetime,
+            'built_at': datetime,
+            'version': 17
+        }
+
+    Write paths keep it current with atomic $inc updates, which also bump
+    version and create the document when it is missing. A document without
+    built_at only holds the increments made since it was created, so it is
+    rebuilt from the applications collection on first read. A rebuild only
+    replaces the version it started from, and starts over when an increment
+    landed in between, so no update is lost.
+    """
+
+    # Times a rebuild starts over because increments kept landing
+    REBUILD_ATTEMPTS = 5
+
+    @staticmethod
+    def _coerce_date(value):
+        """
+        Return date_applied as a naive UTC datetime, accepting the string
+        formats older code stored. Days are bucketed in UTC, as $dateToString
+        does in compute().
+        """
+        if isinstance(value, str) and value:
+            try:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return None
+        if not isinstance(value, datetime):
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def _status_key(status):
+        """Make a status safe to use as a field name"""
+        return (status or 'Unknown').replace('.', '_').lstrip('$')
+
+    @staticmethod
+    def _increments(status, date_applied, delta):
+        """$inc fields for adding (delta=1) or removing (delta=-1) one application"""
+        status_key = UserStats._status_key(status)
+        inc = {
+            'total': delta,
+            f'status_counts.{status_key}': delta
+        }
+        date_applied = UserStats._coerce_date(date_applied)
+        if date_applied:
+            inc[f"daily.{date_applied.strftime('%Y-%m-%d')}.{status_key}"] = delta
+        return inc
+
+    @staticmethod
+    def _apply(user_id, update):
+        update.setdefault('$set', {})['updated_at'] = datetime.now()
+        update['$inc']['version'] = 1
+        try:
+            mongo.db.user_stats.update_one({'_id': str(user_id)}, update, upsert=True)
+        except Exception as e:
+            # Stats are derived data; a failed update is reconciled by rebuild_stats
+            logger.error(f"Failed to update stats for user {user_id}: {str(e)}")
+
+    @staticmethod
+    def record_created(user_id, status, date_applied):
+        """Count a newly created application"""
+        UserStats.record_created_many(user_id, [(status, date_applied)])
+
+    @staticmethod
+    def record_created_many(user_id, applications):
+        """Count several new applications given as (status, date_applied) pairs in one update"""
+        inc = {}
+        dates = []
+        for status, date_applied in applications:
+            for field, delta in UserStats._increments(status, date_applied, 1).items():
+                inc[field] = inc.get(field, 0) + delta
+            date_applied = UserStats._coerce_date(date_applied)
+            if date_applied:
+                dates.append(date_applied)
+
+        if not inc:
+            return
+
+        update = {'$inc': inc}
+        if dates:
+            update['$min'] = {'first_applied': min(dates)}
+            update['$max'] = {'last_applied': max(dates)}
+        UserStats._apply(user_id, update)
+
+    @staticmethod
+    def record_deleted(user_id, status, date_applied):
+        """Stop counting a deleted application.
+
+        first_applied/last_applied are bounds and are not narrowed here;
+        rebuild_stats tightens them.
+        """
+        UserStats._apply(user_id, {'$inc': UserStats._increments(status, date_applied, -1)})
+
+    @staticmethod
+    def record_status_change(user_id, old_status, new_status, date_applied):
+        """Move an application from one status to another"""
+        UserStats.record_moved(user_id, old_status, date_applied, new_status, date_applied)
+
+    @staticmethod
+    def record_moved(user_id, old_status, old_date, new_status, new_date):
+        """Re-count an application whose status and/or date_applied changed"""
+        UserStats.record_moved_many(user_id, [(old_status, old_date, new_status, new_date)])
+
+    @staticmethod
+    def record_moved_many(user_id, moves):
+        """Re-count several applications given as (old_status, old_date, new_status, new_date) in one update"""
+        inc = {}
+        dates = []
+        for old_status, old_date, new_status, new_date in moves:
+            if old_status == new_status and UserStats._coerce_date(old_date) == UserStats._coerce_date(new_date):
+                continue
+            for field, delta in UserStats._increments(old_status, old_date, -1).items():
+                inc[field] = inc.get(field, 0) + delta
+            for field, delta in UserStats._increments(new_status, new_date, 1).items():
+                inc[field] = inc.get(field, 0) + delta
+            new_date = UserStats._coerce_date(new_date)
+            if new_date:
+                dates.append(new_date)
+
+        inc = {field: delta for field, delta in inc.items() if delta}
+        if not inc:
+            return
+
+        update = {'$inc': inc}
+        if dates:
+            update['$min'] = {'first_applied': min(dates)}
+            update['$max'] = {'last_applied': max(dates)}
+        UserStats._apply(user_id, update)
+
+    @staticmethod
+    def reset(user_id):
+        """Drop a user's counters, e.g. after all their applications are deleted"""
+        mongo.db.user_stats.delete_one({'_id': str(user_id)})
+
+    @staticmethod
+    def _applied_stage():
+        """Project each application's status and date_applied as a date, or None where it is not one"""
+        return {'$project': {
+            'status': 1,
+            'applied': {'$convert': {
+                'input': '$date_applied', 'to': 'date', 'onError': None, 'onNull': None
+            }}
+        }}
+
+    @staticmethod
+    def _group_stage():
+        """Count projected applications per UTC day and status, with the first and last date"""
+        return {'$group': {
+            '_id': {
+                'day': {'$cond': [
+                    {'$eq': ['$applied', None]},
+                    None,
+                    {'$dateToString': {'format': '%Y-%m-%d', 'date': '$applied'}}
+                ]},
+                'status': '$status'
+            },
+            'count': {'$sum': 1},
+            'first': {'$min': '$applied'},
+            'last': {'$max': '$applied'}
+        }}
+
+    @staticmethod
+    def pipeline(user_id):
+        """Aggregation behind compute(), one row per (day, status)"""
+        return [
+            {'$match': {'user_id': str(user_id)}},
+            UserStats._applied_stage(),
+            UserStats._group_stage()
+        ]
+
+    @staticmethod
+    def _fold(user_id, rows):
+        """Build a stats document from the rows of pipeline()"""
+        stats = {
+            '_id': str(user_id),
+            'total': 0,
+            'status_counts': {},
+            'daily': {}
+        }
+        for row in rows:
+            status_key = UserStats._status_key(row['_id'].get('status'))
+            count = row['count']
+            stats['total'] += count
+            stats['status_counts'][status_key] = stats['status_counts'].get(status_key, 0) + count
+
+            day = row['_id'].get('day')
+            if day:
+                day_counts = stats['daily'].setdefault(day, {})
+                day_counts[status_key] = day_counts.get(status_key, 0) + count
+            # Left unset rather than null when there are no dated applications,
+            # so that later $min/$max updates can fill them in
+            if row.get('first') and ('first_applied' not in stats or row['first'] < stats['first_applied']):
+                stats['first_applied'] = row['first']
+            if row.get('last') and ('last_applied' not in stats or row['last'] > stats['last_applied']):
+                stats['last_applied'] = row['last']
+
+        stats['updated_at'] = datetime.now()
+        return stats
+
+    @staticmethod
+    def compute(user_id):
+        """Recompute a user's stats document from the applications collection"""
+        return UserStats._fold(user_id, mongo.db.applications.aggregate(UserStats.pipeline(user_id)))
+
+    @staticmethod
+    def rebuild(user_id):
+        """Recompute and store a user's stats, returning (stats, drift).
+
+        drift maps each counter that differed to its (stored, actual) values.
+        """
+        stats = None
+        for _ in range(UserStats.REBUILD_ATTEMPTS):
+            existing = mongo.db.user_stats.find_one({'_id': str(user_id)}) or {}
+            stats = UserStats.compute(user_id)
+            stats['built_at'] = stats['updated_at']
+            stats['version'] = existing.get('version', 0)
+            try:
+                if existing:
+                    result = mongo.db.user_stats.replace_one(
+                        {'_id': str(user_id), 'version': existing.get('version')}, stats
+                    )
+                    if result.matched_count:
+                        break
+                else:
+                    mongo.db.user_stats.insert_one(stats)
+                    break
+            except DuplicateKeyError:
+                pass
+            # An increment created or changed the document while counting; count again
+        else:
+            logger.warning(f"Gave up storing rebuilt stats for user {user_id} after {UserStats.REBUILD_ATTEMPTS} attempts")
+
+        drift = {}
+        if existing.get('total', 0) != stats['total']:
+            drift['total'] = (existing.get('total', 0), stats['total'])
+        stored_counts = existing.get('status_counts', {})
+        for status in set(stored_counts) | set(stats['status_counts']):
+            stored = stored_counts.get(status, 0)
+            actual = stats['status_counts'].get(status, 0)
+            if stored != actual:
+                drift[f'status_counts.{status}'] = (stored, actual)
+        return stats, drift
+
+    @staticmethod
+    def get(user_id, db=None):
+        """
+        Get a user's stats document, building it on first use
+        
+        db can be mongo_client.analytics_db, to read from a secondary. Whether
+        to rebuild is decided on the primary, so a lagging secondary does not
+        cause repeated rebuilds.
+        """
+        stats = (db if db is not None else mongo.db).user_stats.find_one({'_id': str(user_id)})
+        if stats is None or 'built_at' not in stats:
+            if db is not None:
+                stats = mongo.db.user_stats.find_one({'_id': str(user_id)})
+            if stats is None or 'built_at' not in stats:
+                stats, _ = UserStats.rebuild(user_id)
+        return stats
@@ -0,0 +1,348 @@
+import argparse
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.scripts.seed_benchmark import (BENCHMARK_PASSWORD, add_seed_arguments, benchmark_app, seed,
+                                                    sizes_from_args)
+
+# Percentiles reported for latency and database time
+PERCENTILES = (50, 95, 99)
+
+_CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+_DB_TIMING_PATTERN = re.compile(r'(?:^|,)\s*db;dur=([\d.]+)(?:;desc="(\d+) queries")?')
+
+
+class Target:
+    """What a request acts on: a user and one of their applications, notes and interviews"""
+
+    def __init__(self, user, application, rng):
+        self.user = user
+        self.application_id = application['id']
+        self.note_id = rng.choice(application['note_ids']) if application['note_ids'] else None
+        self.interview_id = rng.choice(application['interview_ids']) if application['interview_ids'] else None
+        self.value = rng.randint(1000, 9999)
+
+
+def _interview_form(target):
+    return {
+        'interview_date': f"2030-01-{target.value % 28 + 1:02d}T10:00",
+        'interview_type': 'Technical',
+        'interview_notes': f"Benchmark interview {target.value}"
+    }
+
+
+class Scenario:
+    """A route to measure, with how to build its URL and form from a Target"""
+
+    def __init__(self, name, method, path, form=None, requires=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.form = form
+        self.requires = requires
+
+    def request(self, target):
+        """(method, path, form data), or None if target lacks what the route needs"""
+        if self.requires and getattr(target, self.requires) is None:
+            return None
+        return self.method, self.path(target), self.form(target) if self.form else None
+
+
+SCENARIOS = [
+    Scenario('dashboard', 'GET', lambda t: '/dashboard'),
+    Scenario('status_counts', 'GET', lambda t: '/api/status-counts'),
+    Scenario('timeline', 'GET', lambda t: '/api/applications/timeline?days=90&granularity=week'),
+    Scenario('email_suggestions', 'GET', lambda t: '/email_suggestions'),
+    Scenario('add_note', 'POST', lambda t: f'/application/notes/{t.application_id}',
+             form=lambda t: {'note_content': f"Benchmark note {t.value}"}),
+    Scenario('edit_note', 'POST', lambda t: f'/application/note/edit/{t.application_id}/{t.note_id}',
+             form=lambda t: {'content': f"Edited benchmark note {t.value}"}, requires='note_id'),
+    Scenario('add_interview', 'POST', lambda t: f'/application/interviews/{t.application_id}',
+             form=_interview_form),
+    Scenario('edit_interview', 'POST', lambda t: f'/application/interview/edit/{t.application_id}/{t.interview_id}',
+             form=_interview_form, requires='interview_id')
+]
+
+
+def _succeeded(status, content_type, body):
+    """Whether a response counts as served; the edit routes report failures as JSON with status 200"""
+    if status >= 400:
+        return False
+    if content_type.startswith('application/json'):
+        try:
+            return json.loads(body).get('success', True) is not False
+        except (ValueError, AttributeError):
+            return True
+    return True
+
+
+def _db_timing(header):
+    """(database ms, commands) from a Server-Timing header, or (None, None)"""
+    match = _DB_TIMING_PATTERN.search(header or '')
+    if not match:
+        return None, None
+    return float(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+
+class TestClientDriver:
+    """Requests through the Flask test client, in process, without network or WSGI server"""
+
+    name = 'test-client'
+
+    def __init__(self, app):
+        self.app = app
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def _client(self, user):
+        key = (threading.get_ident(), user['id'])
+        with self.lock:
+            client = self.clients.get(key)
+        if client is None:
+            client = self.app.test_client()
+            # Log in the way Flask-Login remembers a user in the session
+            with client.session_transaction() as session:
+                session['_user_id'] = user['id']
+                session['_fresh'] = True
+            with self.lock:
+                self.clients[key] = client
+        return client
+
+    def send(self, user, method, path, form):
+        response = self._client(user).open(path, method=method, data=form)
+        body = response.get_data()
+        return response.status_code, response.headers.get('Content-Type', ''), body, response.headers.get('Server-Timing')
+
+
+class HTTPDriver:
+    """Requests over HTTP to a running server, one logged-in session per worker thread and user"""
+
+    name = 'http'
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.local = threading.local()
+
+    def _session(self, user):
+        sessions = self.local.__dict__.setdefault('sessions', {})
+        if user['id'] in sessions:
+            return sessions[user['id']]
+
+        session = requests.Session()
+        page = session.get(f"{self.base_url}/auth/login")
+        match = _CSRF_PATTERN.search(page.text)
+        token = match.group(1) if match else None
+        response = session.post(f"{self.base_url}/auth/login", allow_redirects=False, data={
+            'csrf_token': token,
+            'email': user['email'],
+            'password': BENCHMARK_PASSWORD
+        })
+        if response.status_code != 302:
+            raise RuntimeError(f"Could not log in as {user['email']} (HTTP {response.status_code})")
+        sessions[user['id']] = (session, token)
+        return session, token
+
+    def send(self, user, method, path, form):
+        session, token = self._session(user)
+        if form is not None:
+            form = dict(form, csrf_token=token)
+        response = session.request(method, f"{self.base_url}{path}", data=form, allow_redirects=False)
+        return response.status_code, response.headers.get('Content-Type', ''), response.content, response.headers.get('Server-Timing')
+
+
+def percentiles(values):
+    """Linear-interpolated PERCENTILES of values, keyed 'p50', 'p95', ..."""
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    ordered = sorted(values)
+    result = {}
+    for p in PERCENTILES:
+        position = (len(ordered) - 1) * p / 100
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        result[f"p{p}"] = round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 3)
+    return result
+
+
+def run_scenario(driver, scenario, targets, requests_count, concurrency, warmup):
+    """
+    Send requests_count requests of a scenario from concurrency threads.
+
+    Returns:
+        dict: Request and error counts, throughput, and latency and
+              database time percentiles in milliseconds
+    """
+    planned = [(target.user, scenario.request(target)) for target in targets if scenario.request(target)]
+    if not planned:
+        return {'skipped': 'no data for this route in the seeded dataset'}
+    plan = [planned[i % len(planned)] for i in range(warmup + requests_count)]
+
+    def send(item):
+        user, (method, path, form) = item
+        started = time.perf_counter()
+        try:
+            status, content_type, body, timing = driver.send(user, method, path, form)
+        except Exception as e:
+            return (time.perf_counter() - started) * 1000, False, None, None, str(e)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        db_ms, commands = _db_timing(timing)
+        ok = _succeeded(status, content_type, body)
+        return elapsed_ms, ok, db_ms, commands, None if ok else f"HTTP {status}"
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, plan[:warmup]))
+        started = time.perf_counter()
+        results = list(pool.map(send, plan[warmup:]))
+        wall_seconds = time.perf_counter() - started
+
+    latencies = [result[0] for result in results if result[1]]
+    db_times = [result[2] for result in results if result[1] and result[2] is not None]
+    commands = [result[3] for result in results if result[1] and result[3] is not None]
+    errors = [result[4] for result in results if not result[1]]
+    summary = {
+        'requests': len(results),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        'latency_ms': dict(percentiles(latencies),
+                           mean=round(sum(latencies) / len(latencies), 3) if latencies else None,
+                           max=round(max(latencies), 3) if latencies else None),
+        'db_ms': percentiles(db_times),
+        'db_commands_mean': round(sum(commands) / len(commands), 2) if commands else None
+    }
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(results, baseline, max_regression):
+    """
+    Print each scenario's p95 latency against a baseline run.
+
+    Returns:
+        list: Names of scenarios whose p95 grew by more than max_regression (a fraction)
+    """
+    regressions = []
+    print(f"\n{'scenario':<20}{'baseline p95':>14}{'p95':>10}{'change':>10}")
+    for name, summary in results['scenarios'].items():
+        before = (baseline.get('scenarios', {}).get(name) or {}).get('latency_ms', {}).get('p95')
+        after = (summary.get('latency_ms') or {}).get('p95')
+        if not before or after is None:
+            print(f"{name:<20}{'-':>14}{after if after is not None else '-':>10}")
+            continue
+        change = after / before - 1
+        flag = ' !' if change > max_regression else ''
+        print(f"{name:<20}{before:>14.1f}{after:>10.1f}{change:>+10.1%}{flag}")
+        if change > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def benchmark(args):
+    # The test client posts forms without a CSRF token; the http driver scrapes one from the login page
+    app = benchmark_app(args, WTF_CSRF_ENABLED=False)
+    sizes = sizes_from_args(args)
+    with app.app_context():
+        manifest = seed(mongo.db, sizes, seed=args.seed, anchor=args.anchor)
+        server_version = mongo.db.command('buildInfo').get('version')
+
+    # Targets come from their own generator, so they don't depend on how much was seeded before
+    rng = random.Random(args.seed)
+    targets = [
+        Target(user, rng.choice(user['applications']), rng)
+        for user in manifest['users'] if user['applications']
+        for _ in range(args.targets_per_user)
+    ]
+    if not targets:
+        raise SystemExit('Nothing to benchmark; seed at least one user with one application')
+
+    driver = HTTPDriver(args.url) if args.driver == 'http' else TestClientDriver(app)
+    selected = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+
+    commit, dirty = _git_commit()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'driver': driver.name,
+        'url': args.url if args.driver == 'http' else None,
+        'concurrency': args.concurrency,
+        'requests_per_scenario': args.requests,
+        'warmup': args.warmup,
+        'dataset': dict(sizes.as_dict(), seed=args.seed,
+                        anchor=args.anchor.strftime('%Y-%m-%d') if args.anchor else None,
+                        documents=manifest['counts']),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mongodb': server_version
+        },
+        'scenarios': {}
+    }
+
+    for scenario in selected:
+        summary = run_scenario(driver, scenario, targets, args.requests, args.concurrency, args.warmup)
+        results['scenarios'][scenario.name] = summary
+        if 'skipped' in summary:
+            print(f"{scenario.name:<20} skipped: {summary['skipped']}")
+            continue
+        latency = summary['latency_ms']
+        print(f"{scenario.name:<20} p50 {latency['p50'] or 0:8.1f} ms  p95 {latency['p95'] or 0:8.1f} ms  "
+              f"p99 {latency['p99'] or 0:8.1f} ms  {summary['throughput_rps'] or 0:8.1f} req/s  "
+              f"{summary['errors']} errors")
+
+    output = args.output or f"benchmark-{(commit or 'unknown')[:8]}-{driver.name}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"p95 regressed by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Seed a benchmark database, then measure the latency and throughput of the main routes'
+    )
+    add_seed_arguments(parser)
+    parser.add_argument('--driver', choices=['test-client', 'http'], default='test-client',
+                        help='Send requests through the Flask test client, or over HTTP to --url')
+    parser.add_argument('--url', default='http://localhost:5000',
+                        help='Server for the http driver; it must use the same database as the seed')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route, sent first')
+    parser.add_argument('--concurrency', type=int, default=1, help='Threads sending requests at once')
+    parser.add_argument('--targets-per-user', type=int, default=5,
+                        help='Applications per user that requests are spread over')
+    parser.add_argument('--scenario', action='append', choices=[scenario.name for scenario in SCENARIOS],
+                        help='Only run this route (repeatable)')
+    parser.add_argument('--output', help='JSON results file; benchmark-<commit>-<driver>.json by default')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare p95 latencies with')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='With --compare, exit non-zero if any p95 grew by more than this fraction')
+    sys.exit(benchmark(parser.parse_args()))
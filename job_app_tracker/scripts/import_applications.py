@@ -0,0 +1,34 @@
+import argparse
+from job_app_tracker import create_app
+from job_app_tracker.models.user import User
+from job_app_tracker.services.bulk_import import IMPORT_BATCH_SIZE, IMPORT_FORMATS, detect_format, import_applications
+
+def import_file(path, email, import_format=None, batch_size=IMPORT_BATCH_SIZE):
+    """Import applications from a CSV, JSON or NDJSON file for a user"""
+    app = create_app()
+    with app.app_context():
+        user = User.get_by_email(email)
+        if not user:
+            print("User not found")
+            return
+
+        import_format = import_format or detect_format(path)
+        with open(path, 'rb') as stream:
+            result = import_applications(user.id, stream, import_format, batch_size=batch_size)
+
+        for error in result.errors:
+            location = f"Row {error['row']}" if error['row'] is not None else "File"
+            print(f"{location}: {error['error']}")
+        if result.error_count > len(result.errors):
+            print(f"... and {result.error_count - len(result.errors)} more errors")
+
+        print(f"Imported {result.inserted} of {result.rows} rows, {result.error_count} failed")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import job applications for a user')
+    parser.add_argument('path', help='CSV, JSON array or NDJSON file to import')
+    parser.add_argument('--email', required=True, help='Email of the user to import applications for')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='File format (default: from the file extension)')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows inserted per batch')
+    args = parser.parse_args()
+    import_file(args.path, args.email, import_format=args.format, batch_size=args.batch_size)
@@ -0,0 +1,40 @@
+import argparse
+import logging
+import multiprocessing
+from job_app_tracker import create_app
+from job_app_tracker.services.job_queue import job_queue, default_handlers
+
+def run_job_worker():
+    """Run queued background jobs, until interrupted"""
+    # Each process builds its own app, so it gets its own MongoDB client
+    app = create_app()
+    with app.app_context():
+        try:
+            job_queue.work(default_handlers())
+        except KeyboardInterrupt:
+            logging.info("Job worker stopped")
+
+def run_job_workers(processes=2):
+    """Run a pool of job worker processes"""
+    if processes <= 1:
+        run_job_worker()
+        return
+
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=run_job_worker, name=f'job-worker-{i}') for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run background jobs such as email scans')
+    parser.add_argument('--processes', type=int, default=2, help='Number of worker processes')
+    args = parser.parse_args()
+    run_job_workers(processes=args.processes)
@@ -0,0 +1,34 @@
+from job_app_tracker import create_app
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.email_suggestion import EmailSuggestion
+
+def migrate_suggestions():
+    """
+    Split the old one-document-per-user suggestion arrays into one document
+    per suggestion. Pending suggestions are copied over; processed documents
+    are dropped. Safe to run more than once.
+    """
+    app = create_app()
+    with app.app_context():
+        legacy = mongo.db.email_suggestions.find({'suggestions': {'$exists': True}})
+
+        documents = 0
+        migrated = 0
+        for doc in legacy:
+            documents += 1
+            if not doc.get('processed'):
+                suggestions = []
+                for suggestion in doc.get('suggestions', []):
+                    suggestion = dict(suggestion)
+                    # The old per-array ids pointed at the parent document
+                    suggestion.pop('id', None)
+                    suggestion.pop('index', None)
+                    suggestion.setdefault('created_at', doc.get('created_at'))
+                    suggestions.append(suggestion)
+                migrated += EmailSuggestion.create_many(doc['user_id'], suggestions)
+            mongo.db.email_suggestions.delete_one({'_id': doc['_id']})
+
+        print(f"Migrated {migrated} suggestions from {documents} legacy documents")
+
+if __name__ == '__main__':
+    migrate_suggestions()
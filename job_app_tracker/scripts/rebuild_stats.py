@@ -0,0 +1,40 @@
+import argparse
+from job_app_tracker import create_app
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user import User
+from job_app_tracker.models.user_stats import UserStats
+
+def rebuild_stats(user_id=None, email=None):
+    """Recompute user_stats documents and report any counters that had drifted"""
+    app = create_app()
+    with app.app_context():
+        if email:
+            user = User.get_by_email(email)
+            if not user:
+                print("User not found")
+                return
+            user_ids = [user.id]
+        elif user_id:
+            user_ids = [user_id]
+        else:
+            # Every user with applications or an existing stats document
+            user_ids = set(mongo.db.applications.distinct('user_id'))
+            user_ids.update(doc['_id'] for doc in mongo.db.user_stats.find({}, {'_id': 1}))
+            user_ids = sorted(str(uid) for uid in user_ids if uid)
+
+        drifted = 0
+        for uid in user_ids:
+            stats, drift = UserStats.rebuild(uid)
+            if drift:
+                drifted += 1
+                changes = ', '.join(f"{field}: {stored} -> {actual}" for field, (stored, actual) in sorted(drift.items()))
+                print(f"User {uid}: {changes}")
+
+        print(f"Rebuilt stats for {len(user_ids)} users, {drifted} had drifted")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild per-user application statistics')
+    parser.add_argument('--user-id', help='Only rebuild stats for this user id')
+    parser.add_argument('--email', help='Only rebuild stats for the user with this email')
+    args = parser.parse_args()
+    rebuild_stats(user_id=args.user_id, email=args.email)
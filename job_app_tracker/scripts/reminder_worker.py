@@ -0,0 +1,26 @@
+import argparse
+import logging
+from datetime import timedelta
+from job_app_tracker import create_app
+from job_app_tracker.services.reminder_scheduler import ReminderScheduler, notifier_from_env
+
+def run_reminder_worker(batch_size=100, lookahead_minutes=10):
+    """Send reminder notifications as they come due, until interrupted"""
+    app = create_app()
+    with app.app_context():
+        scheduler = ReminderScheduler(
+            notifier_from_env(),
+            lookahead=timedelta(minutes=lookahead_minutes),
+            batch_size=batch_size
+        )
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            logging.info("Reminder worker stopped")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send notifications for due reminders')
+    parser.add_argument('--batch-size', type=int, default=100, help='Notifications handed to the notifier at once')
+    parser.add_argument('--lookahead', type=int, default=10, help='Minutes ahead to queue upcoming reminders')
+    args = parser.parse_args()
+    run_reminder_worker(batch_size=args.batch_size, lookahead_minutes=args.lookahead)
@@ -0,0 +1,335 @@
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+import bcrypt
+from bson import ObjectId
+
+from job_app_tracker import create_app
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user_stats import UserStats
+
+# Password of every benchmark user
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# Documents written per insert_many
+BATCH_SIZE = 1000
+
+COMPANIES = [
+    "Google", "Microsoft", "Amazon", "Meta", "Apple", "Netflix", "Stripe",
+    "LinkedIn", "Uber", "Airbnb", "Twitter", "Pinterest", "Adobe", "Salesforce",
+    "Oracle", "IBM", "Intel", "NVIDIA", "AMD", "Qualcomm"
+]
+
+POSITIONS = [
+    "Software Engineer", "Full Stack Developer", "Frontend Developer",
+    "Backend Developer", "DevOps Engineer", "Data Engineer", "ML Engineer",
+    "Product Manager", "Technical Lead", "Senior Software Engineer"
+]
+
+TAGS = [
+    'Remote', 'Hybrid', 'On-site', 'Entry Level', 'Mid Level',
+    'Senior Level', 'Tech Stack', 'Benefits', '401k', 'Healthcare'
+]
+
+INTERVIEW_TYPES = ['Phone', 'Technical', 'Behavioral', 'Final']
+TOPICS = ['system design', 'algorithms', 'past experience', 'team fit']
+REMINDER_TYPES = ['follow_up', 'interview', 'deadline']
+
+
+class Sizes:
+    """How much data to generate per user"""
+
+    def __init__(self, users=10, applications=200, notes=3, interviews=1, reminders=20, suggestions=20):
+        self.users = users
+        self.applications = applications
+        self.notes = notes
+        self.interviews = interviews
+        self.reminders = reminders
+        self.suggestions = suggestions
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def benchmark_email(index):
+    return f"bench-user-{index}@example.com"
+
+
+def _object_id(rng):
+    """An ObjectId drawn from rng, so the same seed gives the same ids"""
+    return ObjectId(rng.randbytes(12))
+
+
+def _status(rng, days_since_applied):
+    # Older applications have moved further along, as in add_sample_applications
+    if days_since_applied < 7:
+        return rng.choice(['Applied', 'In Progress'])
+    if days_since_applied < 14:
+        return rng.choice(['Applied', 'In Progress', 'Interview'])
+    if days_since_applied < 30:
+        return rng.choice(['Interview', 'Offer', 'Rejected'])
+    return rng.choice(['Offer', 'Rejected', 'Withdrawn'])
+
+
+def generate_application(rng, user_id, anchor, sizes):
+    """One application with its notes and interviews, dated up to 180 days before anchor"""
+    date_applied = anchor - timedelta(days=rng.randint(0, 180), minutes=rng.randint(0, 24 * 60 - 1))
+    days_since_applied = (anchor - date_applied).days
+    company = rng.choice(COMPANIES)
+    position = rng.choice(POSITIONS)
+
+    notes_list = []
+    for index in range(sizes.notes):
+        created_at = date_applied + timedelta(days=index)
+        notes_list.append({
+            'id': str(_object_id(rng)),
+            'content': f"Note {index + 1} on the {position} application at {company}",
+            'created_at': created_at,
+            'updated_at': created_at
+        })
+
+    interviews = []
+    for index in range(sizes.interviews):
+        interview_date = date_applied + timedelta(days=rng.randint(3, 30), hours=rng.randint(9, 17))
+        interviews.append({
+            'id': str(_object_id(rng)),
+            'date': interview_date,
+            'type': rng.choice(INTERVIEW_TYPES),
+            'notes': f"Discussed {rng.choice(TOPICS)}",
+            'created_at': date_applied,
+            'updated_at': date_applied
+        })
+
+    application = {
+        '_id': _object_id(rng),
+        'user_id': user_id,
+        'company': company,
+        'position': position,
+        'status': _status(rng, days_since_applied),
+        'date_applied': date_applied,
+        'notes': notes_list[-1]['content'] if notes_list else '',
+        'notes_list': notes_list,
+        'interviews': interviews,
+        'documents': [],
+        'url': f"https://careers.{company.lower()}.com/jobs/{rng.randint(1000, 9999)}",
+        'deadline': date_applied + timedelta(days=rng.randint(7, 30)) if rng.random() > 0.5 else None,
+        'tags': rng.sample(TAGS, rng.randint(2, 5)),
+        'created_at': date_applied,
+        'updated_at': date_applied
+    }
+    if rng.random() > 0.5:
+        application['salary_info'] = {
+            'range': f"${rng.randint(80, 200)}k - ${rng.randint(200, 400)}k",
+            'currency': 'USD',
+            'type': rng.choice(['Full-time', 'Contract', 'Internship'])
+        }
+    return application
+
+
+def generate_reminder(rng, user_id, application, anchor):
+    # Half due within the next two weeks, half already past
+    reminder_date = anchor + timedelta(days=rng.randint(-14, 14), hours=rng.randint(8, 18))
+    return {
+        '_id': _object_id(rng),
+        'user_id': user_id,
+        'application_id': str(application['_id']),
+        'title': f"Follow up with {application['company']}",
+        'description': f"About the {application['position']} application",
+        'reminder_date': reminder_date,
+        'reminder_type': rng.choice(REMINDER_TYPES),
+        'status': 'pending',
+        'notification_sent': reminder_date < anchor,
+        'created_at': anchor,
+        'updated_at': anchor
+    }
+
+
+def generate_suggestion(rng, user_id, index, applications, anchor):
+    date = anchor - timedelta(days=rng.randint(0, 15), minutes=rng.randint(0, 24 * 60 - 1))
+    suggestion = {
+        '_id': _object_id(rng),
+        'user_id': user_id,
+        'email_id': f"bench-{index}",
+        'email_subject': f"Your application #{index}",
+        'email_from': 'careers@example.com',
+        'date': date,
+        'confidence': round(rng.uniform(0.5, 1.0), 2),
+        'processed': False,
+        'created_at': date
+    }
+    if applications and rng.random() < 0.3:
+        application = rng.choice(applications)
+        suggestion.update({
+            'type': 'update',
+            'application_id': str(application['_id']),
+            'company': application['company'],
+            'position': application['position'],
+            'current_status': application['status'],
+            'new_status': 'Interview'
+        })
+    else:
+        suggestion.update({
+            'type': 'new',
+            'company': rng.choice(COMPANIES),
+            'position': rng.choice(POSITIONS),
+            'status': 'Applied'
+        })
+    return suggestion
+
+
+class _BatchWriter:
+    """Buffers documents per collection and writes them with insert_many"""
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, collection, document):
+        batch = self.pending.setdefault(collection, [])
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            self.flush(collection)
+
+    def flush(self, collection=None):
+        for name in [collection] if collection else list(self.pending):
+            batch = self.pending.get(name)
+            if batch:
+                self.db[name].insert_many(batch, ordered=False)
+                self.counts[name] = self.counts.get(name, 0) + len(batch)
+                self.pending[name] = []
+
+
+def clear_benchmark_data(db):
+    """Remove the users made by an earlier seed and everything they own"""
+    user_ids = [str(doc['_id']) for doc in db.users.find({'benchmark': True}, {'_id': 1})]
+    if not user_ids:
+        return 0
+    for collection in ('applications', 'reminders', 'email_suggestions', 'jobs'):
+        db[collection].delete_many({'user_id': {'$in': user_ids}})
+    db.user_stats.delete_many({'_id': {'$in': user_ids}})
+    db.users.delete_many({'benchmark': True})
+    return len(user_ids)
+
+
+def seed(db, sizes, seed=42, anchor=None):
+    """
+    Fill db with benchmark users and their data, replacing any earlier benchmark data.
+
+    The same seed and anchor always give the same documents, ids included.
+
+    Args:
+        db: Database to write to
+        sizes: Sizes
+        seed: Random seed
+        anchor: Date the data is generated relative to; today at midnight by default
+
+    Returns:
+        dict: Per user, their id, email, and the ids of their applications
+              with the ids of each application's notes and interviews
+    """
+    rng = random.Random(seed)
+    anchor = anchor or datetime.combine(datetime.now().date(), datetime.min.time())
+    clear_benchmark_data(db)
+
+    # bcrypt is slow on purpose; every user shares one hash
+    password_hash = bcrypt.hashpw(BENCHMARK_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4))
+
+    writer = _BatchWriter(db)
+    manifest = {'users': []}
+    for user_index in range(sizes.users):
+        user_oid = _object_id(rng)
+        user_id = str(user_oid)
+        writer.add('users', {
+            '_id': user_oid,
+            'email': benchmark_email(user_index),
+            'password_hash': password_hash,
+            'name': f"Benchmark User {user_index}",
+            'email_connected': False,
+            'email_settings': {},
+            'benchmark': True,
+            'created_at': anchor,
+            'updated_at': anchor
+        })
+
+        applications = [generate_application(rng, user_id, anchor, sizes) for _ in range(sizes.applications)]
+        for application in applications:
+            writer.add('applications', application)
+        if applications:
+            for _ in range(sizes.reminders):
+                writer.add('reminders', generate_reminder(rng, user_id, rng.choice(applications), anchor))
+        for index in range(sizes.suggestions):
+            writer.add('email_suggestions', generate_suggestion(rng, user_id, index, applications, anchor))
+
+        manifest['users'].append({
+            'id': user_id,
+            'email': benchmark_email(user_index),
+            'applications': [
+                {
+                    'id': str(application['_id']),
+                    'note_ids': [note['id'] for note in application['notes_list']],
+                    'interview_ids': [interview['id'] for interview in application['interviews']]
+                }
+                for application in applications
+            ]
+        })
+    writer.flush()
+
+    # The dashboard counters are normally kept up to date write by write
+    for user in manifest['users']:
+        UserStats.rebuild(user['id'])
+
+    manifest['counts'] = writer.counts
+    return manifest
+
+
+def add_seed_arguments(parser):
+    """Dataset options shared with the benchmark script"""
+    parser.add_argument('--users', type=int, default=10, help='Benchmark users to create')
+    parser.add_argument('--applications', type=int, default=200, help='Applications per user')
+    parser.add_argument('--notes', type=int, default=3, help='Notes per application')
+    parser.add_argument('--interviews', type=int, default=1, help='Interviews per application')
+    parser.add_argument('--reminders', type=int, default=20, help='Reminders per user')
+    parser.add_argument('--suggestions', type=int, default=20, help='Pending email suggestions per user')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+    parser.add_argument('--anchor', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help='Date (YYYY-MM-DD) the data is generated relative to; today by default')
+    parser.add_argument('--mongodb-uri', help='Database to seed; BENCHMARK_MONGODB_URI by default')
+    parser.add_argument('--allow-any-database', action='store_true',
+                        help="Seed even if the database name does not contain 'benchmark'")
+
+
+def sizes_from_args(args):
+    return Sizes(users=args.users, applications=args.applications, notes=args.notes,
+                 interviews=args.interviews, reminders=args.reminders, suggestions=args.suggestions)
+
+
+def benchmark_app(args, **config):
+    """App connected to the benchmark database, refusing to write to any other unless allowed"""
+    uri = args.mongodb_uri or os.getenv('BENCHMARK_MONGODB_URI', 'mongodb://localhost:27017/applizz_benchmark')
+    app = create_app(dict(config, MONGODB_URI=uri))
+    with app.app_context():
+        if mongo.db is None:
+            raise SystemExit(f"The MongoDB URI must name a database: {uri}")
+        name = mongo.db.name
+    if 'benchmark' not in name and not args.allow_any_database:
+        raise SystemExit(f"Refusing to seed database '{name}'; use a database named *benchmark* or --allow-any-database")
+    return app
+
+
+def seed_benchmark(args):
+    app = benchmark_app(args)
+    with app.app_context():
+        manifest = seed(mongo.db, sizes_from_args(args), seed=args.seed, anchor=args.anchor)
+    counts = ', '.join(f"{count} {name}" for name, count in sorted(manifest['counts'].items()))
+    print(f"Seeded {counts} (seed {args.seed})")
+    print(f"Log in as {benchmark_email(0)} with password '{BENCHMARK_PASSWORD}'")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed a local MongoDB with benchmark users and applications')
+    add_seed_arguments(parser)
+    seed_benchmark(parser.parse_args())
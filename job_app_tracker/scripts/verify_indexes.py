@@ -0,0 +1,28 @@
+import argparse
+import sys
+from job_app_tracker import create_app
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.config.indexes import explain_query_shapes, missing_indexes
+
+def verify_indexes():
+    """Explain every registered query shape and report any that scan a whole collection"""
+    # create_app creates the registered indexes on startup
+    app = create_app()
+    with app.app_context():
+        missing = missing_indexes(mongo.db)
+        for name in missing:
+            print(f"MISSING   index {name}")
+
+        results = explain_query_shapes(mongo.db)
+        for result in results:
+            label = 'COLLSCAN' if result['collscan'] else 'ok'
+            print(f"{label:<9} {result['collection']}: {result['name']} [{' > '.join(result['stages'])}]")
+
+        failures = [r for r in results if r['collscan']]
+        print(f"{len(results)} query shapes checked, {len(failures)} collection scans, {len(missing)} missing indexes")
+        return not failures and not missing
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that every registered query shape uses an index')
+    parser.parse_args()
+    sys.exit(0 if verify_indexes() else 1)
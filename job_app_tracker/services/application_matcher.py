@@ -0,0 +1,173 @@
+import bisect
+import re
+from collections import defaultdict
+from datetime import datetime
+from difflib import SequenceMatcher
+from email.utils import parseaddr
+
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user_stats import UserStats
+from job_app_tracker.services.email_classifier import ATS_DOMAINS, FREE_MAIL_DOMAINS
+
+# How far along the hiring process each status is; an email only suggests
+# moving an application forward
+STATUS_RANK = {
+    'Applied': 0,
+    'In Progress': 1,
+    'Interview': 2,
+    'Offer': 3,
+    'Rejected': 3,
+    'Withdrawn': 3
+}
+
+# Similarity above which two company names are taken to be the same company
+FUZZY_CUTOFF = 0.85
+
+# Sorted company names either side of the lookup position compared by the fuzzy match
+FUZZY_WINDOW = 3
+
+_LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company',
+    'gmbh', 'plc', 'sa', 'ag', 'bv', 'group', 'holdings', 'the'
+}
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+_POSITION_STOPWORDS = {'the', 'a', 'an', 'and', 'of', 'for', 'to', 'in', 'at', 'with', 'i', 'ii', 'iii', 'role', 'position'}
+
+
+def normalize_company(name):
+    """Lowercased company name without punctuation or legal suffixes, e.g. 'Acme, Inc.' -> 'acme'"""
+    words = [word for word in _WORD_PATTERN.findall((name or '').lower()) if word not in _LEGAL_SUFFIXES]
+    return ' '.join(words)
+
+
+def position_tokens(position):
+    return {word for word in _WORD_PATTERN.findall((position or '').lower()) if word not in _POSITION_STOPWORDS}
+
+
+def _registered_label(host):
+    """'jobs.acme.co.uk' -> 'acme'; the label a company registers"""
+    parts = [part for part in (host or '').lower().split('.') if part]
+    if len(parts) >= 3 and len(parts[-1]) == 2 and parts[-2] in ('co', 'com', 'org', 'net', 'ac'):
+        parts = parts[:-1]
+    return parts[-2] if len(parts) >= 2 else None
+
+
+def sender_domain(from_email):
+    """Registered domain label of a sender, unless it is a mail provider or an ATS"""
+    _, address = parseaddr(from_email or '')
+    if '@' not in address:
+        return None
+    label = _registered_label(address.rsplit('@', 1)[1])
+    if not label or label in FREE_MAIL_DOMAINS or label in ATS_DOMAINS:
+        return None
+    return label
+
+
+def _url_domain(url):
+    if not url:
+        return None
+    host = re.sub(r'^[a-z]+://', '', url.strip().lower()).split('/', 1)[0].split(':', 1)[0]
+    label = _registered_label(host)
+    return label if label not in ATS_DOMAINS else None
+
+
+class ApplicationMatch:
+    """An application an email refers to, and how it was found"""
+
+    def __init__(self, application, method, score):
+        self.application = application
+        self.method = method
+        self.score = score
+
+
+class ApplicationIndex:
+    """In-memory index of one user's applications, for matching emails to them.
+
+    Applications are keyed by normalized company name, by the domain of their
+    website and by the company name written as a domain label ('Acme Corp' ->
+    'acmecorp'), so each email is matched with dictionary lookups rather than
+    by comparing it with every application. Names that differ slightly (a
+    typo, a missing word) fall back to a fuzzy comparison against the few
+    sorted company names next to the email's, found by binary search.
+
+    When a company has several applications, the one whose position shares
+    the most words with the email's wins, then the most recent one.
+    """
+
+    def __init__(self, applications):
+        self.by_company = defaultdict(list)
+        self.by_domain = defaultdict(list)
+        for application in applications:
+            company = normalize_company(application.get('company'))
+            application['_position_tokens'] = position_tokens(application.get('position'))
+            if company:
+                self.by_company[company].append(application)
+                self.by_domain[company.replace(' ', '')].append(application)
+            domain = _url_domain(application.get('url'))
+            if domain:
+                self.by_domain[domain].append(application)
+        self.company_keys = sorted(self.by_company)
+
+    @classmethod
+    def for_user(cls, user_id):
+        cursor = mongo.db.applications.find(
+            {'user_id': str(user_id)},
+            {'company': 1, 'position': 1, 'status': 1, 'url': 1, 'date_applied': 1}
+        )
+        return cls(list(cursor))
+
+    def __len__(self):
+        return sum(len(applications) for applications in self.by_company.values())
+
+    def _fuzzy(self, company):
+        position = bisect.bisect_left(self.company_keys, company)
+        best, best_score = None, FUZZY_CUTOFF
+        for key in self.company_keys[max(position - FUZZY_WINDOW, 0):position + FUZZY_WINDOW]:
+            score = SequenceMatcher(None, company, key).ratio()
+            if score >= best_score:
+                best, best_score = key, score
+        return best, best_score
+
+    @staticmethod
+    def _best(applications, position):
+        tokens = position_tokens(position)
+
+        def rank(application):
+            overlap = len(tokens & application['_position_tokens'])
+            union = len(tokens | application['_position_tokens']) or 1
+            # Older applications may store date_applied as a string
+            return (overlap / union, UserStats._coerce_date(application.get('date_applied')) or datetime.min)
+
+        return max(applications, key=rank)
+
+    def match(self, company=None, position=None, from_email=None):
+        """
+        Find the application an email is about.
+
+        Returns:
+            ApplicationMatch or None
+        """
+        if not self.company_keys:
+            return None
+
+        normalized = normalize_company(company) if company and company != 'Unknown Company' else ''
+        if normalized in self.by_company:
+            return ApplicationMatch(self._best(self.by_company[normalized], position), 'company name', 1.0)
+
+        domain = sender_domain(from_email)
+        if domain and domain in self.by_domain:
+            return ApplicationMatch(self._best(self.by_domain[domain], position), 'sender domain', 0.9)
+
+        if normalized:
+            key, score = self._fuzzy(normalized)
+            if key is not None:
+                return ApplicationMatch(self._best(self.by_company[key], position), 'similar company name', round(score, 3))
+
+        return None
+
+
+def is_status_advance(current_status, new_status):
+    """Whether moving from current_status to new_status moves an application forward"""
+    if not new_status or new_status == current_status:
+        return False
+    return STATUS_RANK.get(new_status, 0) > STATUS_RANK.get(current_status, 0)
@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+from job_app_tracker.config.mongodb import mongo
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+# Applications fetched, joined with their reminders and written per chunk
+EXPORT_BATCH_SIZE = 500
+
+# Application fields included in an export
+EXPORT_FIELDS = [
+    'company', 'position', 'status', 'date_applied', 'deadline', 'url', 'location',
+    'tags', 'notes', 'notes_list', 'interviews', 'created_at', 'updated_at'
+]
+
+REMINDER_FIELDS = ['title', 'description', 'reminder_date', 'reminder_type', 'status']
+
+# CSV columns; the first ones match the names accepted by the bulk import
+CSV_COLUMNS = [
+    'id', 'company', 'position', 'status', 'date_applied', 'deadline', 'url', 'location',
+    'tags', 'notes', 'notes_list', 'interviews', 'reminders', 'created_at', 'updated_at'
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, ensure_ascii=False)
+
+
+def _iter_batches(user_id, batch_size):
+    """Yield lists of a user's applications, each joined with its reminders"""
+    projection = {field: 1 for field in EXPORT_FIELDS}
+    # Read from the primary: a user exporting right after an edit expects to see it
+    cursor = mongo.db.applications.find(
+        {'user_id': str(user_id)}, projection
+    ).sort([('date_applied', -1), ('_id', -1)]).batch_size(batch_size)
+
+    batch = []
+    for application in cursor:
+        batch.append(application)
+        if len(batch) >= batch_size:
+            yield _attach_reminders(user_id, batch)
+            batch = []
+    if batch:
+        yield _attach_reminders(user_id, batch)
+
+
+def _attach_reminders(user_id, applications):
+    """Fetch the reminders of a batch of applications with one query"""
+    by_id = {}
+    for application in applications:
+        application['id'] = str(application.pop('_id'))
+        application['reminders'] = []
+        by_id[application['id']] = application
+
+    reminders = mongo.db.reminders.find(
+        {'user_id': str(user_id), 'application_id': {'$in': list(by_id)}},
+        {field: 1 for field in REMINDER_FIELDS + ['application_id']}
+    ).sort('reminder_date', 1)
+    for reminder in reminders:
+        application = by_id.get(str(reminder.pop('application_id', '')))
+        if application is not None:
+            reminder['id'] = str(reminder.pop('_id'))
+            application['reminders'].append(reminder)
+
+    return applications
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return ', '.join(value)
+    if isinstance(value, (list, dict)):
+        return _dumps(value)
+    return value
+
+
+def _export_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for applications in batches:
+        for application in applications:
+            writer.writerow({column: _csv_value(application.get(column)) for column in CSV_COLUMNS})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _export_ndjson(batches):
+    for applications in batches:
+        yield ''.join(_dumps(application) + '\n' for application in applications)
+
+
+def _export_json(batches):
+    yield '['
+    first = True
+    for applications in batches:
+        chunk = ',\n'.join(_dumps(application) for application in applications)
+        yield chunk if first else ',\n' + chunk
+        first = False
+    yield ']\n'
+
+
+def export_applications(user_id, export_format='csv', batch_size=EXPORT_BATCH_SIZE):
+    """
+    Export a user's applications, with their notes, interviews and reminders.
+
+    Returns a generator of text chunks, one per batch of applications, so the
+    export can be streamed without holding every application in memory.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    batches = _iter_batches(user_id, batch_size)
+    if export_format == 'csv':
+        return _export_csv(batches)
+    if export_format == 'ndjson':
+        return _export_ndjson(batches)
+    return _export_json(batches)
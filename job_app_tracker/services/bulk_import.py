@@ -0,0 +1,384 @@
+import codecs
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user_stats import UserStats
+from job_app_tracker.services.dashboard_stats import STATUSES
+
+logger = logging.getLogger('bulk_import')
+
+IMPORT_FORMATS = ('csv', 'json', 'ndjson')
+
+# Rows inserted per insert_many call
+IMPORT_BATCH_SIZE = 1000
+
+# Per-row errors returned to the caller; the rest are only counted
+MAX_REPORTED_ERRORS = 500
+
+# Bytes read from the upload at a time when parsing JSON
+READ_CHUNK_SIZE = 64 * 1024
+
+# Longest element of a JSON array import, in characters; keeps a malformed
+# element from buffering the rest of the file
+MAX_JSON_ITEM_CHARS = 1024 * 1024
+
+# Spreadsheet column names accepted for each application field
+FIELD_ALIASES = {
+    'company': 'company',
+    'company_name': 'company',
+    'employer': 'company',
+    'position': 'position',
+    'role': 'position',
+    'title': 'position',
+    'job_title': 'position',
+    'status': 'status',
+    'date_applied': 'date_applied',
+    'applied': 'date_applied',
+    'applied_on': 'date_applied',
+    'date': 'date_applied',
+    'deadline': 'deadline',
+    'url': 'url',
+    'link': 'url',
+    'job_url': 'url',
+    'location': 'location',
+    'notes': 'notes',
+    'tags': 'tags'
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d', '%d %b %Y', '%b %d, %Y')
+
+_STATUS_LOOKUP = {status.lower(): status for status in STATUSES}
+
+
+class ImportResult:
+    """Outcome of a bulk import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors)
+        }
+
+
+def detect_format(filename, content_type=None):
+    """Guess the import format from an upload's file name or content type"""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.json'):
+        return 'json'
+    if name.endswith('.csv'):
+        return 'csv'
+    content_type = (content_type or '').lower()
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        return 'ndjson'
+    if 'json' in content_type:
+        return 'json'
+    return 'csv'
+
+
+def _text_chunks(stream):
+    """Decode a binary stream as UTF-8 in chunks"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        data = stream.read(READ_CHUNK_SIZE)
+        if not data:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        text = decoder.decode(data) if isinstance(data, bytes) else data
+        if text:
+            yield text
+
+
+def iter_csv_rows(stream):
+    """Yield (row number, row dict) from a CSV stream; row 1 is the header"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') if _is_binary(stream) else stream
+    reader = csv.DictReader(text)
+    for row in reader:
+        # Columns beyond the header land under the None key
+        row.pop(None, None)
+        yield reader.line_num, row
+
+
+def iter_ndjson_rows(stream):
+    """Yield (line number, object) from a newline-delimited JSON stream"""
+    line_number = 0
+    buffer = ''
+    for chunk in _text_chunks(stream):
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, _loads(line)
+    if buffer.strip():
+        yield line_number + 1, _loads(buffer)
+
+
+def iter_json_rows(stream):
+    """
+    Yield (item number, object) from a JSON array of objects, decoding one
+    element at a time so the whole array is never held in memory.
+
+    Raises:
+        ValueError: If the file is not a single well-formed JSON array, or an
+                    element is longer than MAX_JSON_ITEM_CHARS
+    """
+    decoder = json.JSONDecoder()
+    chunks = _text_chunks(stream)
+    buffer = ''
+    position = 0
+    item_number = 0
+
+    def fill():
+        nonlocal buffer, position
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def peek():
+        """Skip whitespace and return the next character, or None at the end of the file"""
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                return None
+
+    if peek() != '[':
+        raise ValueError("Expected a JSON array")
+    position += 1
+
+    if peek() == ']':
+        position += 1
+    else:
+        while True:
+            if peek() in (None, ',', ']'):
+                raise ValueError(f"Expected item {item_number + 1}")
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer may continue in the next chunk
+                    if end < len(buffer) or not fill():
+                        break
+                except json.JSONDecodeError:
+                    # The element may continue in the next chunk, up to a limit
+                    if len(buffer) - position > MAX_JSON_ITEM_CHARS or not fill():
+                        raise ValueError(f"Invalid JSON in item {item_number + 1}")
+            position = end
+            item_number += 1
+            yield item_number, item
+
+            # Exactly one comma between elements
+            separator = peek()
+            if separator == ']':
+                position += 1
+                break
+            if separator != ',':
+                raise ValueError(f"Expected ',' or ']' after item {item_number}")
+            position += 1
+
+    if peek() is not None:
+        raise ValueError("Unexpected content after the JSON array")
+
+
+def _is_binary(stream):
+    return not isinstance(stream, io.TextIOBase)
+
+
+def _loads(text):
+    """Decode one JSON line; a decoding error is returned so it is reported against that row"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        return ValueError(f"Invalid JSON: {e.msg}")
+
+
+def iter_rows(stream, import_format):
+    """Yield (row number, row) from an upload in the given format"""
+    if import_format == 'csv':
+        return iter_csv_rows(stream)
+    if import_format == 'ndjson':
+        return iter_ndjson_rows(stream)
+    if import_format == 'json':
+        return iter_json_rows(stream)
+    raise ValueError(f"Unsupported import format: {import_format}")
+
+
+def parse_date(value):
+    """Parse a date cell, returning None for an empty cell"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+
+def _normalize_key(key):
+    return str(key or '').strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def validate_row(row, user_id, now):
+    """
+    Turn an imported row into an application document.
+
+    Raises:
+        ValueError: If the row is missing required fields or has invalid values
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("Expected an object")
+
+    fields = {}
+    for key, value in row.items():
+        field = FIELD_ALIASES.get(_normalize_key(key))
+        if field and field not in fields:
+            fields[field] = value.strip() if isinstance(value, str) else value
+
+    company = fields.get('company')
+    position = fields.get('position')
+    if not company:
+        raise ValueError("Missing company")
+    if not position:
+        raise ValueError("Missing position")
+
+    status = fields.get('status') or 'Applied'
+    if str(status).strip().lower() not in _STATUS_LOOKUP:
+        raise ValueError(f"Unknown status: {status}")
+    status = _STATUS_LOOKUP[str(status).strip().lower()]
+
+    date_applied = parse_date(fields.get('date_applied')) or now
+    deadline = parse_date(fields.get('deadline'))
+
+    tags = fields.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+    elif not isinstance(tags, list):
+        raise ValueError("Tags must be a list or a comma-separated string")
+
+    notes = fields.get('notes') or ''
+    document = {
+        'user_id': str(user_id),
+        'company': str(company),
+        'position': str(position),
+        'status': status,
+        'date_applied': date_applied,
+        'deadline': deadline,
+        'url': fields.get('url') or None,
+        'location': fields.get('location') or None,
+        'notes': str(notes),
+        'tags': tags,
+        'company_logo': None,
+        'created_at': now,
+        'updated_at': now
+    }
+    if notes:
+        document['notes_list'] = [{
+            'id': str(ObjectId()),
+            'content': str(notes),
+            'created_at': now,
+            'updated_at': now
+        }]
+    return document
+
+
+def _insert_batch(user_id, batch, result):
+    """Insert a batch of (row number, document) pairs, recording failed rows"""
+    documents = [document for _, document in batch]
+    failed = set()
+    try:
+        mongo.db.applications.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            failed.add(error['index'])
+            result.add_error(batch[error['index']][0], error.get('errmsg', 'Insert failed'))
+
+    inserted = [document for index, document in enumerate(documents) if index not in failed]
+    result.inserted += len(inserted)
+    UserStats.record_created_many(
+        user_id, [(document['status'], document['date_applied']) for document in inserted]
+    )
+
+
+def import_applications(user_id, stream, import_format='csv', batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import applications for a user from a CSV, JSON or NDJSON stream.
+
+    Rows are parsed and validated one at a time and inserted in unordered
+    batches, so memory use depends on the batch size rather than the file
+    size and one bad row never blocks the rest.
+
+    Returns:
+        ImportResult: Row counts and per-row errors
+    """
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {import_format}")
+
+    result = ImportResult()
+    now = datetime.now()
+    batch = []
+    try:
+        for row_number, row in iter_rows(stream, import_format):
+            result.rows += 1
+            try:
+                batch.append((row_number, validate_row(row, user_id, now)))
+            except ValueError as e:
+                result.add_error(row_number, str(e))
+                continue
+
+            if len(batch) >= batch_size:
+                _insert_batch(user_id, batch, result)
+                batch = []
+    except (ValueError, csv.Error, UnicodeDecodeError) as e:
+        # The file itself is malformed; keep what was parsed so far
+        result.add_error(None, f"Could not read file: {str(e)}")
+
+    if batch:
+        _insert_batch(user_id, batch, result)
+
+    logger.info(
+        f"Imported {result.inserted} of {result.rows} applications for user {user_id} "
+        f"({result.error_count} errors)"
+    )
+    return result
@@ -0,0 +1,242 @@
+from datetime import datetime, timedelta
+from job_app_tracker.config.mongodb import mongo_client
+from job_app_tracker.models.user_stats import UserStats
+
+# Statuses shown on the dashboard cards and charts
+STATUSES = ['Applied', 'In Progress', 'Interview', 'Offer', 'Rejected', 'Withdrawn']
+ACTIVE_STATUSES = ['Applied', 'In Progress', 'Interview']
+SUCCESSFUL_STATUSES = ['Offer', 'Interview']
+
+# Timeline bucket sizes and the label format used for each
+GRANULARITIES = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',  # Labelled by the Monday that starts the week
+    'month': '%Y-%m'
+}
+
+
+def truncate_date(value, granularity):
+    """Truncate a datetime to the start of its day, week or month"""
+    day = datetime.combine(value.date(), datetime.min.time())
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_labels(start, end, granularity):
+    """Labels for every bucket between start and end, inclusive"""
+    label_format = GRANULARITIES[granularity]
+    current = truncate_date(start, granularity)
+    end = truncate_date(end, granularity)
+    labels = []
+    while current <= end:
+        labels.append(current.strftime(label_format))
+        if granularity == 'month':
+            current = (current + timedelta(days=32)).replace(day=1)
+        elif granularity == 'week':
+            current += timedelta(days=7)
+        else:
+            current += timedelta(days=1)
+    return labels
+
+
+def parse_time_range(value, default=28):
+    """Parse a time range query parameter; 'all' means no lower bound"""
+    if value is None or value == '':
+        return default
+    if str(value).lower() == 'all':
+        return None
+    return max(int(value), 1)
+
+
+class DashboardStats:
+    """Statistics shown on the dashboard"""
+
+    def __init__(self, status_counts, total, weekly_counts, velocity, timeline_counts,
+                 timeline_labels, upcoming_deadlines=None, upcoming_interviews=None):
+        # Counts for every status, including ones not shown on the charts
+        self.all_status_counts = status_counts
+        self.status_counts = {status: status_counts.get(status, 0) for status in STATUSES}
+        self.total_applications = total
+        self.active_applications = sum(status_counts.get(s, 0) for s in ACTIVE_STATUSES)
+        self.weekly_stats = {
+            'last_week': weekly_counts.get(0, 0),
+            'two_weeks_ago': weekly_counts.get(1, 0),
+            'three_weeks_ago': weekly_counts.get(2, 0),
+            'four_weeks_ago': weekly_counts.get(3, 0)
+        }
+        self.velocity_metrics = velocity
+        # {bucket label: {status: count}}
+        self.timeline_counts = timeline_counts
+        self.timeline_labels = timeline_labels
+        self.upcoming_deadlines = upcoming_deadlines or []
+        self.upcoming_interviews = upcoming_interviews or []
+
+    @property
+    def success_rate(self):
+        successful = sum(self.all_status_counts.get(s, 0) for s in SUCCESSFUL_STATUSES)
+        total = self.total_applications
+        return {
+            'total': total,
+            'successful': successful,
+            'rejected': self.all_status_counts.get('Rejected', 0),
+            'percentage': (successful / total * 100) if total > 0 else 0
+        }
+
+    @property
+    def timeline_data(self):
+        """Timeline as a list of {'date', 'counts'} entries for the dashboard template"""
+        return [
+            {
+                'date': label,
+                'counts': {s: self.timeline_counts.get(label, {}).get(s, 0) for s in STATUSES}
+            }
+            for label in self.timeline_labels
+        ]
+
+    def timeline_series(self):
+        """Timeline as one series per status, as returned by /api/applications/timeline"""
+        series = {'labels': list(self.timeline_labels)}
+        for status in STATUSES:
+            series[status] = [self.timeline_counts.get(label, {}).get(status, 0) for label in self.timeline_labels]
+        return series
+
+    def template_context(self):
+        """Keyword arguments for rendering dashboard.html"""
+        return {
+            'status_counts': self.status_counts,
+            'total_applications': self.total_applications,
+            'active_applications': self.active_applications,
+            'weekly_stats': self.weekly_stats,
+            'upcoming_deadlines': self.upcoming_deadlines,
+            'upcoming_interviews': self.upcoming_interviews,
+            'timeline_data': self.timeline_data,
+            'success_rate': self.success_rate,
+            'velocity_metrics': self.velocity_metrics
+        }
+
+
+class DashboardStatsService:
+    """Builds dashboard statistics from a user's materialized user_stats document"""
+
+    @staticmethod
+    def _upcoming_pipeline(user_id, now):
+        """Upcoming deadlines and interview-stage applications in one aggregation"""
+        deadline_window = {'$gte': now, '$lte': now + timedelta(days=7)}
+        return [
+            {'$match': {
+                'user_id': str(user_id),
+                '$or': [{'status': 'Interview'}, {'deadline': deadline_window}]
+            }},
+            {'$project': {'company': 1, 'position': 1, 'status': 1, 'deadline': 1}},
+            {'$facet': {
+                'upcoming_deadlines': [
+                    {'$match': {'deadline': deadline_window}},
+                    {'$sort': {'deadline': 1}}
+                ],
+                'upcoming_interviews': [
+                    {'$match': {'status': 'Interview'}}
+                ]
+            }}
+        ]
+
+    @staticmethod
+    def _velocity(stats, dated_count):
+        """Applications per week and average days between applications"""
+        if not stats.get('total'):
+            return None
+
+        if dated_count < 2 or not stats.get('first_applied') or not stats.get('last_applied'):
+            return {
+                'avg_time_between': 0,
+                'apps_per_week': dated_count  # If only one application, count it as one per week
+            }
+
+        total_days = (stats['last_applied'] - stats['first_applied']).days
+        weeks = total_days / 7 if total_days > 0 else 1
+        return {
+            'avg_time_between': round(total_days / (dated_count - 1), 1),
+            'apps_per_week': round(dated_count / weeks, 1)
+        }
+
+    @staticmethod
+    def timeline_start(days, now=None):
+        """Start of the first day in a range of `days` days ending today, or None for all time"""
+        if days is None:
+            return None
+        now = now or datetime.now()
+        return datetime.combine(now.date(), datetime.min.time()) - timedelta(days=days - 1)
+
+    @staticmethod
+    def compute(user_id, days=28, granularity='day', now=None, include_upcoming=True):
+        """Compute all dashboard statistics for a user
+
+        Counters come from the user's user_stats document, so the cost depends on
+        the number of distinct days with applications rather than on the number
+        of applications. `days` of None covers the user's whole history.
+        `granularity` is one of 'day', 'week' or 'month' and sets the timeline
+        bucket size.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+
+        now = now or datetime.now()
+        today = datetime.combine(now.date(), datetime.min.time())
+        timeline_start = DashboardStatsService.timeline_start(days, now)
+        label_format = GRANULARITIES[granularity]
+
+        # Read-only and fine slightly behind, so served by a secondary when there is one
+        stats = UserStats.get(user_id, db=mongo_client.analytics_db)
+
+        # One pass over the per-day histogram fills the weekly buckets and the timeline
+        weekly_counts = {}
+        timeline_counts = {}
+        dated_count = 0
+        first_bucket = today
+        for day, day_counts in stats.get('daily', {}).items():
+            date = datetime.strptime(day, '%Y-%m-%d')
+            day_total = sum(day_counts.values())
+            dated_count += day_total
+
+            week = max((today - date).days // 7, 0)
+            if week < 4:
+                weekly_counts[week] = weekly_counts.get(week, 0) + day_total
+
+            if timeline_start is None or date >= timeline_start:
+                bucket = truncate_date(date, granularity)
+                first_bucket = min(first_bucket, bucket)
+                counts = timeline_counts.setdefault(bucket.strftime(label_format), {})
+                for status, count in day_counts.items():
+                    counts[status] = counts.get(status, 0) + count
+
+        # Applications without a usable date count as applied today, as the dashboard always did
+        undated = dict(stats.get('status_counts', {}))
+        for day_counts in stats.get('daily', {}).values():
+            for status, count in day_counts.items():
+                undated[status] = undated.get(status, 0) - count
+        undated = {status: count for status, count in undated.items() if count > 0}
+        if undated:
+            weekly_counts[0] = weekly_counts.get(0, 0) + sum(undated.values())
+            counts = timeline_counts.setdefault(truncate_date(today, granularity).strftime(label_format), {})
+            for status, count in undated.items():
+                counts[status] = counts.get(status, 0) + count
+
+        upcoming = {}
+        if include_upcoming:
+            pipeline = DashboardStatsService._upcoming_pipeline(user_id, now)
+            upcoming = next(mongo_client.analytics_db.applications.aggregate(pipeline), {})
+            for app in upcoming.get('upcoming_deadlines', []) + upcoming.get('upcoming_interviews', []):
+                app['_id'] = str(app['_id'])
+
+        return DashboardStats(
+            status_counts=stats.get('status_counts', {}),
+            total=stats.get('total', 0),
+            weekly_counts=weekly_counts,
+            velocity=DashboardStatsService._velocity(stats, dated_count),
+            timeline_counts=timeline_counts,
+            timeline_labels=bucket_labels(timeline_start or first_bucket, now, granularity),
+            upcoming_deadlines=upcoming.get('upcoming_deadlines'),
+            upcoming_interviews=upcoming.get('upcoming_interviews')
+        )
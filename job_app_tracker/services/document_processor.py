@@ -0,0 +1,262 @@
+"""Text extraction, page counts and thumbnails of uploaded documents.
+
+PDFs are read with PyMuPDF, which also renders the first-page thumbnails of
+PDFs and images. PyMuPDF is in requirements.txt, but the import is optional:
+without it PDFs are read with pypdf, images are left as they are, and no
+document gets a thumbnail.
+"""
+import codecs
+import io
+import logging
+import os
+import re
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+
+from charset_normalizer import from_bytes
+from pymongo.errors import PyMongoError
+from pypdf import PdfReader
+
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.application import Application
+from job_app_tracker.services.storage import document_storage, legacy_path
+
+try:
+    import pymupdf
+except ImportError:  # Optional; without it PDFs are read with pypdf and get no thumbnail
+    pymupdf = None
+
+logger = logging.getLogger('document_processor')
+
+# Processing states of a document entry; pending -> done | unsupported | failed
+PENDING = 'pending'
+DONE = 'done'
+UNSUPPORTED = 'unsupported'
+FAILED = 'failed'
+
+# Extracted text kept per document, enough for searching without bloating the application
+MAX_TEXT_CHARS = 50000
+
+# Width in pixels of first-page thumbnails
+THUMBNAIL_WIDTH = 240
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_SPACES = re.compile(r'[ \t\r\f\v\xa0]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def document_kind(document):
+    """'pdf', 'docx', 'txt', 'image' or None, from a document's name and content type"""
+    extension = os.path.splitext(document.get('name') or '')[1].lower()
+    file_type = (document.get('file_type') or '').lower()
+    if extension == '.pdf' or file_type == 'application/pdf':
+        return 'pdf'
+    if extension == '.docx' or file_type == DOCX_MIMETYPE:
+        return 'docx'
+    if extension in ('.txt', '.md', '.csv') or file_type.startswith('text/'):
+        return 'txt'
+    if file_type.startswith('image/') or extension in ('.png', '.jpg', '.jpeg', '.gif'):
+        return 'image'
+    return None
+
+
+def _clean(parts):
+    """Join extracted text, collapsing whitespace and cutting it at MAX_TEXT_CHARS"""
+    text = _SPACES.sub(' ', ''.join(parts))
+    text = _BLANK_LINES.sub('\n\n', '\n'.join(line.strip() for line in text.split('\n'))).strip()
+    return text[:MAX_TEXT_CHARS]
+
+
+def extract_txt(stream):
+    # A few bytes per character at most; the decoder leaves a character cut at the end out
+    data = stream.read(MAX_TEXT_CHARS * 4)
+    try:
+        text = codecs.getincrementaldecoder('utf-8')().decode(data)
+    except UnicodeDecodeError:
+        best = from_bytes(data).best()
+        text = str(best) if best else data.decode('latin-1')
+    return {'text': _clean([text]), 'page_count': None}
+
+
+def extract_docx(stream):
+    """Text of a .docx, read from its XML without loading the whole document tree"""
+    parts = []
+    length = 0
+    with zipfile.ZipFile(stream) as archive:
+        with archive.open('word/document.xml') as xml:
+            for _, element in ElementTree.iterparse(xml):
+                if element.tag == _WORD_NS + 't' and element.text:
+                    parts.append(element.text)
+                    length += len(element.text)
+                elif element.tag == _WORD_NS + 'tab':
+                    parts.append('\t')
+                elif element.tag in (_WORD_NS + 'p', _WORD_NS + 'br'):
+                    parts.append('\n')
+                if element.tag == _WORD_NS + 'p':
+                    element.clear()
+                if length > MAX_TEXT_CHARS:
+                    break
+
+        # Word records the page count when it saves; other editors may not
+        page_count = None
+        if 'docProps/app.xml' in archive.namelist():
+            pages = next((element for element in ElementTree.fromstring(archive.read('docProps/app.xml'))
+                          if element.tag.endswith('}Pages')), None)
+            if pages is not None and (pages.text or '').isdigit():
+                page_count = int(pages.text)
+
+    return {'text': _clean(parts), 'page_count': page_count}
+
+
+def _thumbnail(page):
+    """PNG of a PyMuPDF page, THUMBNAIL_WIDTH pixels wide"""
+    zoom = THUMBNAIL_WIDTH / page.rect.width
+    return page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False).tobytes('png')
+
+
+def extract_pdf(stream):
+    parts = []
+    length = 0
+    if pymupdf is None:
+        reader = PdfReader(stream)
+        for page in reader.pages:
+            if length > MAX_TEXT_CHARS:
+                break
+            text = page.extract_text() or ''
+            parts.append(text + '\n')
+            length += len(text)
+        return {'text': _clean(parts), 'page_count': len(reader.pages)}
+
+    with pymupdf.open(stream=stream.read(), filetype='pdf') as pdf:
+        for page in pdf:
+            if length > MAX_TEXT_CHARS:
+                break
+            text = page.get_text()
+            parts.append(text + '\n')
+            length += len(text)
+        return {
+            'text': _clean(parts),
+            'page_count': pdf.page_count,
+            'thumbnail': _thumbnail(pdf[0]) if pdf.page_count else None
+        }
+
+
+def extract_image(stream):
+    if pymupdf is None:
+        return {'text': None, 'page_count': None}
+    with pymupdf.open(stream=stream.read()) as image:
+        return {'text': None, 'page_count': None, 'thumbnail': _thumbnail(image[0])}
+
+
+EXTRACTORS = {
+    'pdf': extract_pdf,
+    'docx': extract_docx,
+    'txt': extract_txt,
+    'image': extract_image
+}
+
+
+def _open(document):
+    """Open a document's stored file for reading"""
+    if document.get('storage_key'):
+        stream, _ = document_storage.backend(document.get('storage')).open(document['storage_key'])
+        return stream
+    path = legacy_path(document)
+    if not path:
+        raise FileNotFoundError(f"File of document {document.get('id')} not found")
+    return open(path, 'rb')
+
+
+def _processed_copy(user_id, document):
+    """
+    Results of an earlier upload of the same file by the same user, if it
+    was processed. Takes a reference to the shared thumbnail.
+    """
+    if not document.get('sha256'):
+        return None
+    processed_match = {'sha256': document['sha256'], 'processing': DONE}
+    app_data = mongo.db.applications.find_one(
+        {'user_id': str(user_id), 'documents': {'$elemMatch': processed_match}},
+        {'documents': {'$elemMatch': processed_match}}
+    )
+    if not app_data:
+        return None
+    processed = app_data['documents'][0]
+    thumbnail = processed.get('thumbnail')
+    if thumbnail and not document_storage.retain(thumbnail['storage'], thumbnail['key']):
+        # The thumbnail is being deleted along with the other document; make a new one
+        return None
+    return {name: processed.get(name) for name in ('text', 'page_count', 'thumbnail')}
+
+
+def process_document(user_id, document):
+    """
+    Extract a document's text, page count and first-page thumbnail.
+
+    Returns:
+        dict: Fields to set on the document entry
+    """
+    kind = document_kind(document)
+    if kind is None:
+        return {'processing': UNSUPPORTED, 'processed_at': datetime.now()}
+
+    copied = _processed_copy(user_id, document)
+    if copied:
+        return dict(copied, processing=DONE, processed_at=datetime.now())
+
+    stream = _open(document)
+    try:
+        extracted = EXTRACTORS[kind](stream)
+    except PyMongoError:
+        raise
+    except Exception as e:
+        # A damaged or encrypted file; retrying will not help
+        logger.warning(f"Could not process document {document.get('id')} ({kind}): {str(e)}")
+        return {'processing': FAILED, 'processing_error': str(e), 'processed_at': datetime.now()}
+    finally:
+        stream.close()
+
+    thumbnail = None
+    if extracted.get('thumbnail'):
+        stored = document_storage.save(io.BytesIO(extracted['thumbnail']))
+        thumbnail = {'storage': stored.backend, 'key': stored.key}
+    return {
+        'processing': DONE,
+        'text': extracted['text'],
+        'page_count': extracted['page_count'],
+        'thumbnail': thumbnail,
+        'processed_at': datetime.now()
+    }
+
+
+def run_document_job(job, progress):
+    """
+    Process an uploaded document (job type 'process_document').
+
+    Args:
+        job: Job document; its payload names the application and document
+        progress: JobProgress
+
+    Returns:
+        dict: Result stored on the job
+    """
+    payload = job['payload']
+    application = Application.get_by_id(payload['application_id'], job['user_id'], include=())
+    document = application.get_document(payload['document_id']) if application else None
+    if not document:
+        # Deleted before it was processed
+        return {'processing': None}
+
+    progress.update(message=f"Processing {document.get('name')}", force=True)
+    fields = process_document(job['user_id'], document)
+    if not application.update_document(payload['document_id'], fields):
+        thumbnail = fields.get('thumbnail')
+        if thumbnail:
+            document_storage.release(thumbnail['storage'], thumbnail['key'])
+        return {'processing': None}
+
+    progress.update(processed=1, total=1, force=True)
+    return {'processing': fields['processing'], 'page_count': fields.get('page_count')}
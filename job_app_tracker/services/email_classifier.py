@@ -0,0 +1,370 @@
+import hashlib
+import logging
+import os
+import re
+import zlib
+from email.utils import parseaddr
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger('email_classifier')
+
+# Output classes; every class but 'other' is an application status
+CLASSES = ('other', 'Applied', 'In Progress', 'Interview', 'Offer', 'Rejected')
+OTHER = 0
+
+# Size of the hashed feature space
+N_FEATURES = 1 << 18
+
+# Characters of each body that are read; job emails say what they are early on
+MAX_BODY_CHARS = 3000
+
+# Probability of being job-related above which an email is suggested
+JOB_THRESHOLD = 0.5
+
+# Header patterns, matched in one pass over "subject \n sender". Each named
+# group becomes a feature; the names are also reported as validation checks.
+HEADER_PATTERNS = {
+    'ats_sender': r'@(?:[\w-]+\.)*(?:greenhouse(?:-mail)?|lever|myworkday(?:jobs)?|workday|smartrecruiters|icims|taleo|jobvite|ashbyhq|bamboohr|workable|recruitee|teamtailor|successfactors)\.',
+    'recruiting_sender': r'\b(?:recruit(?:ing|ment|er)?|talent|careers?|hiring|hr|jobs)\b[^@\n]*@|@(?:[\w-]+\.)*(?:careers|jobs|talent|recruiting)\.',
+    'noreply_sender': r'\bno-?reply@|\bdo-?not-?reply@',
+    'marketing_sender': r'\b(?:newsletter|marketing|promo(?:tions)?|deals|offers|news|digest|info)@',
+    'job_alert': r'\bjob alerts?\b|\bjobs? (?:you may|for you|recommended)|\bnew jobs?\b|\brecommended jobs?\b|\bis hiring\b',
+    'application_subject': r'\b(?:your application|application (?:received|submitted|confirmation|update|status)|thank you for (?:applying|your application|your interest))\b',
+    'interview_subject': r'\binterview\b|\bschedule (?:a|your) (?:call|time|chat)\b|\bphone screen\b',
+    'offer_subject': r'\boffer (?:letter|of employment)\b|\bjob offer\b',
+    'assessment_subject': r'\b(?:assessment|coding challenge|take-?home|hackerrank|codility|codesignal)\b',
+    'update_subject': r'\bupdate on your\b|\bregarding your application\b|\byour candidacy\b',
+}
+_HEADER_AUTOMATON = re.compile(
+    '|'.join(f'(?P<{name}>{pattern})' for name, pattern in HEADER_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+# Phrase weights per class that the linear model starts from. Multi-word
+# phrases are spread over their bigrams; header features use their group name.
+LEXICON = {
+    'other': {
+        'unsubscribe': 1.5, 'newsletter': 2.0, 'job_alert': 4.0, 'marketing_sender': 2.5,
+        'jobs you may be interested': 3.0, 'recommended for you': 2.0, 'sale': 1.5, 'discount': 2.0,
+        'webinar': 2.0, 'order': 1.0, 'shipped': 2.0, 'receipt': 2.0, 'invoice': 2.0,
+        'password reset': 2.5, 'verify your email': 2.0, 'view in browser': 1.5, 'promo': 2.0,
+    },
+    'Applied': {
+        'application_subject': 3.0, 'thank you for applying': 3.0, 'application has been received': 3.0,
+        'application received': 3.0, 'we have received your application': 3.0,
+        'thank you for your application': 3.0, 'application submitted': 3.0,
+        'thank you for your interest': 2.0, 'successfully applied': 3.0, 'your application': 1.5,
+        'ats_sender': 1.5, 'recruiting_sender': 1.0,
+    },
+    'In Progress': {
+        'assessment_subject': 3.0, 'under review': 2.5, 'being reviewed': 2.5, 'next steps': 2.0,
+        'coding challenge': 3.0, 'technical assessment': 3.0, 'online assessment': 3.0,
+        'take home': 2.5, 'moving forward with your application': 3.0, 'additional information': 1.5,
+        'update_subject': 1.0, 'ats_sender': 1.0,
+    },
+    'Interview': {
+        'interview_subject': 3.5, 'schedule an interview': 3.0, 'invite you to interview': 3.5,
+        'interview invitation': 3.5, 'phone screen': 3.0, 'video interview': 3.0,
+        'technical interview': 3.0, 'onsite interview': 3.0, 'final interview': 3.0,
+        'availability': 1.5, 'calendly': 2.0, 'speak with you': 1.5, 'hiring manager': 1.5,
+        'recruiting_sender': 1.0,
+    },
+    'Offer': {
+        'offer_subject': 4.0, 'pleased to offer': 4.0, 'offer letter': 4.0, 'offer of employment': 4.0,
+        'job offer': 3.5, 'welcome to the team': 3.0, 'start date': 2.0, 'compensation package': 2.5,
+        'employment contract': 2.5, 'accept the offer': 3.0,
+    },
+    'Rejected': {
+        'unfortunately': 2.5, 'not selected': 3.5, 'other candidates': 3.0, 'not moving forward': 3.5,
+        'not to move forward': 3.5, 'regret to inform': 3.5, 'decided to pursue': 3.0,
+        'position has been filled': 3.5, 'after careful consideration': 2.5,
+        'will not be proceeding': 3.5, 'not be moving forward': 3.5, 'update_subject': 1.0,
+    },
+}
+
+# Bias per class; an email with no evidence either way is 'other'
+BIAS = {'other': 2.0}
+
+_TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9']+")
+
+# Emails from these domains say nothing about the company
+FREE_MAIL_DOMAINS = {
+    'gmail', 'googlemail', 'yahoo', 'ymail', 'hotmail', 'outlook', 'live', 'msn', 'aol', 'icloud',
+    'me', 'mac', 'protonmail', 'proton', 'gmx', 'mail', 'zoho', 'fastmail'
+}
+ATS_DOMAINS = {
+    'greenhouse', 'greenhouse-mail', 'lever', 'myworkday', 'myworkdayjobs', 'workday', 'smartrecruiters',
+    'icims', 'taleo', 'jobvite', 'ashbyhq', 'bamboohr', 'workable', 'recruitee', 'teamtailor',
+    'successfactors', 'linkedin', 'indeed', 'glassdoor', 'ziprecruiter', 'hackerrank', 'codility'
+}
+_SENDER_SUFFIX = re.compile(
+    r'\s*(?:[-|,]\s*)?\b(?:talent acquisition|recruiting|recruitment|recruiter|careers?|hiring team|'
+    r'hiring|talent|jobs|hr|people team|team|via \w+|@ ?\w+)\b.*$',
+    re.IGNORECASE
+)
+# A capitalized name of up to four words; a dot only continues it inside a word, as in "Monday.com"
+_WORD = r"[A-Z][\w&'-]*(?:\.(?=\w)[\w&'-]*)*"
+_NAME = rf"{_WORD}(?:\s+(?:&\s+)?{_WORD}){{0,3}}"
+_COMPANY_PATTERNS = [
+    re.compile(rf"\b(?:at|with|to|from|join|joining)\s+(?P<company>{_NAME})"),
+    re.compile(rf"(?P<company>{_NAME})\s+(?:is hiring|careers|recruiting|talent acquisition)\b"),
+]
+_COMPANY_STOPWORDS = {
+    'the', 'our', 'we', 'you', 'your', 'this', 'a', 'an', 'us', 'team', 'hiring', 'interview',
+    'application', 'position', 'role', 'job', 'unknown', 'thank', 'thanks', 'dear', 'hi', 'hello'
+}
+_ROLE_NOUNS = (
+    r'Engineer|Developer|Manager|Designer|Analyst|Scientist|Specialist|Director|Coordinator|'
+    r'Consultant|Architect|Intern|Internship|Associate|Administrator|Lead|Representative|'
+    r'Accountant|Recruiter|Technician|Researcher|Writer|Editor|Officer|Assistant|Strategist|SRE'
+)
+_POSITION_PATTERNS = [
+    re.compile(rf"\b(?:for|as)\s+(?:the\s+|an?\s+|our\s+)?(?P<position>[A-Z][\w/&+.()-]*(?:\s+[A-Z(][\w/&+.()-]*){{0,5}}?)\s+(?:position|role|opening|job)\b"),
+    re.compile(rf"\b(?:position|role|opening|job)(?:\s+of|\s*:|\s+for|\s+as)?\s+(?:the\s+|an?\s+)?(?P<position>(?:[A-Z][\w/&+.()-]*\s+){{0,4}}(?:{_ROLE_NOUNS}))\b"),
+    re.compile(rf"(?P<position>(?:[A-Z][\w/&+.()-]*\s+){{0,4}}(?:{_ROLE_NOUNS}))\b"),
+]
+
+
+def _feature_names(text, header_groups):
+    """Unigrams and bigrams of the text, plus the matched header groups"""
+    tokens = _TOKEN_PATTERN.findall(text)
+    names = list(tokens)
+    names.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    names.extend(f"__{group}" for group in header_groups)
+    return names
+
+
+def _phrase_features(phrase):
+    if phrase in HEADER_PATTERNS:
+        return [f"__{phrase}"]
+    tokens = _TOKEN_PATTERN.findall(phrase.lower())
+    if len(tokens) == 1:
+        return tokens
+    return [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class EmailClassifier:
+    """Classifies emails as job-related or not, and by application status.
+
+    Emails are classified in batches. Each one is turned into a row of a
+    sparse matrix of hashed unigram, bigram and header features; the header
+    features come from one precompiled regex over the subject and sender.
+    A linear model then scores the whole batch with one sparse matrix
+    multiply, followed by a softmax over CLASSES.
+
+    The model starts from the weights in LEXICON. A model trained with fit()
+    can be saved with save() and loaded from EMAIL_CLASSIFIER_MODEL. Its
+    version is a hash of the weights, so it changes whenever the model does.
+    """
+
+    def __init__(self, weights=None, bias=None, n_features=N_FEATURES):
+        self.n_features = n_features
+        if weights is None:
+            weights, bias = self._lexicon_weights(n_features)
+        self.weights = weights
+        self.bias = bias
+        # Hashes of feature names seen so far; most of a mailbox's vocabulary repeats
+        self._hashes = {}
+        self._version = None
+
+    @property
+    def version(self):
+        """Short hash of the weights and bias, for keys of cached classifications"""
+        if self._version is None:
+            digest = hashlib.sha256()
+            digest.update(np.ascontiguousarray(self.weights, dtype=np.float32).tobytes())
+            digest.update(np.ascontiguousarray(self.bias, dtype=np.float32).tobytes())
+            self._version = digest.hexdigest()[:16]
+        return self._version
+
+    @classmethod
+    def _lexicon_weights(cls, n_features):
+        weights = np.zeros((n_features, len(CLASSES)), dtype=np.float32)
+        for label, phrases in LEXICON.items():
+            column = CLASSES.index(label)
+            for phrase, weight in phrases.items():
+                features = _phrase_features(phrase)
+                for feature in features:
+                    weights[cls._hash(feature, n_features), column] += weight / len(features)
+        bias = np.array([BIAS.get(label, 0.0) for label in CLASSES], dtype=np.float32)
+        return weights, bias
+
+    @staticmethod
+    def _hash(name, n_features):
+        return zlib.crc32(name.encode('utf-8')) % n_features
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(weights=data['weights'], bias=data['bias'], n_features=data['weights'].shape[0])
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias)
+
+    def _header_groups(self, subject, from_email):
+        return {match.lastgroup for match in _HEADER_AUTOMATON.finditer(f"{subject}\n{from_email}")}
+
+    def vectorize(self, emails):
+        """
+        Build the feature matrix of a batch.
+
+        Args:
+            emails: List of (subject, body, from_email)
+
+        Returns:
+            tuple: (CSR matrix with one row per email, list of header groups per email)
+        """
+        hashes = self._hashes
+        indices = []
+        indptr = [0]
+        groups = []
+        for subject, body, from_email in emails:
+            subject = subject or ''
+            header_groups = self._header_groups(subject, from_email or '')
+            groups.append(header_groups)
+            # The subject counts twice; it is the best summary of the email
+            text = f"{subject} {subject} {(body or '')[:MAX_BODY_CHARS]}".lower()
+            for name in _feature_names(text, header_groups):
+                index = hashes.get(name)
+                if index is None:
+                    index = self._hash(name, self.n_features)
+                    if len(hashes) < self.n_features:
+                        hashes[name] = index
+                indices.append(index)
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(emails), self.n_features)
+        )
+        matrix.sum_duplicates()
+        # Presence rather than counts, so a long email is not more confident than a short one
+        matrix.data[:] = 1.0
+        return matrix, groups
+
+    def probabilities(self, matrix):
+        scores = matrix @ self.weights + self.bias
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def classify(self, emails):
+        """
+        Classify a batch of emails.
+
+        Args:
+            emails: List of (subject, body, from_email)
+
+        Returns:
+            list: One dict per email with is_job_related, company, position,
+                  status, confidence and validation_checks
+        """
+        if not emails:
+            return []
+        matrix, groups = self.vectorize(emails)
+        probabilities = self.probabilities(matrix)
+        job_probabilities = 1.0 - probabilities[:, OTHER]
+        statuses = probabilities[:, OTHER + 1:].argmax(axis=1) + OTHER + 1
+
+        results = []
+        for row, (subject, body, from_email) in enumerate(emails):
+            job_probability = float(job_probabilities[row])
+            is_job_related = job_probability >= JOB_THRESHOLD
+            result = {
+                'is_job_related': is_job_related,
+                'company': 'Unknown Company',
+                'position': 'Unknown Position',
+                'status': CLASSES[statuses[row]],
+                'confidence': round(job_probability if is_job_related else 1.0 - job_probability, 3),
+                'validation_checks': sorted(groups[row])
+            }
+            if is_job_related:
+                head = (body or '')[:MAX_BODY_CHARS]
+                result['company'] = extract_company(subject or '', head, from_email or '')
+                result['position'] = extract_position(subject or '', head)
+            results.append(result)
+        return results
+
+    def fit(self, emails, labels, epochs=20, learning_rate=0.5, l2=1e-4):
+        """
+        Train the model on labelled emails with softmax regression, starting
+        from the current weights.
+
+        Args:
+            emails: List of (subject, body, from_email)
+            labels: Class name from CLASSES for each email
+        """
+        matrix, _ = self.vectorize(emails)
+        targets = np.zeros((len(emails), len(CLASSES)), dtype=np.float32)
+        targets[np.arange(len(emails)), [CLASSES.index(label) for label in labels]] = 1.0
+        transposed = matrix.T.tocsr()
+        for _ in range(epochs):
+            error = (self.probabilities(matrix) - targets) / len(emails)
+            self.weights -= learning_rate * (transposed @ error + l2 * self.weights)
+            self.bias -= learning_rate * error.sum(axis=0)
+        self._version = None
+
+
+def _clean_name(value):
+    value = re.sub(r'\s+', ' ', value or '').strip(" \t\"'.,:;-|")
+    if not value or value.lower() in _COMPANY_STOPWORDS or len(value) < 2:
+        return None
+    return value
+
+
+def extract_company(subject, body, from_email):
+    """Company an email is from, judged from its sender and wording"""
+    display_name, address = parseaddr(from_email)
+    domain_parts = address.lower().rsplit('@', 1)[-1].split('.') if '@' in address else []
+    registered = domain_parts[-2] if len(domain_parts) >= 2 else None
+    generic_domain = registered is None or registered in FREE_MAIL_DOMAINS or registered in ATS_DOMAINS
+
+    # "Acme Recruiting", "Acme Talent Acquisition"
+    if display_name and _SENDER_SUFFIX.search(display_name):
+        name = _clean_name(_SENDER_SUFFIX.sub('', display_name))
+        if name:
+            return name
+
+    for text in (subject, body[:500]):
+        for pattern in _COMPANY_PATTERNS:
+            for match in pattern.finditer(text):
+                name = _clean_name(match.group('company'))
+                if name:
+                    return name
+
+    if not generic_domain:
+        return registered.replace('-', ' ').title()
+    if display_name and registered in ATS_DOMAINS:
+        name = _clean_name(display_name)
+        if name:
+            return name
+    return 'Unknown Company'
+
+
+def extract_position(subject, body):
+    """Job title an email is about, or 'Unknown Position'"""
+    for text in (subject, body[:1000]):
+        for pattern in _POSITION_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                position = re.sub(r'\s+', ' ', match.group('position')).strip(" .,:;-")
+                if position and position.lower() not in _COMPANY_STOPWORDS:
+                    return position
+    return 'Unknown Position'
+
+
+def _load_default():
+    path = os.environ.get('EMAIL_CLASSIFIER_MODEL')
+    if path:
+        try:
+            return EmailClassifier.load(path)
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"Could not load email classifier model {path}: {str(e)}")
+    return EmailClassifier()
+
+
+# Shared classifier
+email_classifier = _load_default()
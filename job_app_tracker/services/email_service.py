@@ -1,27 +1,75 @@
+import hashlib
+import imaplib
 import logging
+import os
+import re
 from datetime import datetime, timedelta
-import threading
-import time
-from flask import flash, current_app
+from flask import flash
 import random
 from bson.objectid import ObjectId
+from pymongo import ReplaceOne
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.utils.cache import TTLCache
+from job_app_tracker.models.user import User
+from job_app_tracker.models.email_suggestion import EmailSuggestion
+from job_app_tracker.models.application import Application
+from job_app_tracker.services.job_queue import JobError
+from job_app_tracker.services.imap_fetcher import ImapAccount, ImapFetcher
+from job_app_tracker.services.storage import document_storage
+from job_app_tracker.services.email_classifier import email_classifier
+from job_app_tracker.services.application_matcher import ApplicationIndex, is_status_advance
+from job_app_tracker.models.user_stats import UserStats
 
 logger = logging.getLogger('email_service')
 
+# Days of email read on an account's first scan
+INITIAL_SCAN_DAYS = 15
+
+# Headers worth downloading the body for
+JOB_HEADER_PATTERN = re.compile(
+    r'applica|interview|position|offer|candida|recruit|hiring|career|job|talent|opportunit|'
+    r'assessment|next steps|thank you for (?:your )?(?:interest|applying)',
+    re.IGNORECASE
+)
+
+# Seconds an email's analysis is kept; the analysis_cache TTL index removes older entries
+ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 30 * 24 * 3600))
+
+# Analyses by (user_id, email_id), in front of the analysis_cache collection
+_analysis_memory = TTLCache(
+    maxsize=int(os.environ.get('ANALYSIS_CACHE_SIZE', 4096)),
+    ttl=ANALYSIS_CACHE_TTL
+)
+
+
+class ScanResult:
+    """Outcome of an email scan"""
+    
+    def __init__(self, success, message, redirect_endpoint, processed_count=0, total_count=0):
+        self.success = success
+        self.message = message
+        self.redirect_endpoint = redirect_endpoint
+        self.processed_count = processed_count
+        self.total_count = total_count
+
+
 class EmailService:
     """Email Service class that provides email scanning functionality."""
     
     @staticmethod
     def _analyze_email_content(subject, body, from_email):
-        """Simplified email analysis that returns empty result."""
-        return {
-            'is_job_related': False,
-            'company': 'Unknown Company',
-            'position': 'Unknown Position',
-            'status': 'Applied',
-            'confidence': 0.5,
-            'validation_checks': []
-        }
+        """
+        Classify one email; see _analyze_emails for batches.
+        
+        Returns:
+            dict: is_job_related, company, position, status, confidence and validation_checks
+        """
+        return email_classifier.classify([(subject, body, from_email)])[0]
+    
+    @staticmethod
+    def _analyze_emails(messages):
+        """Classify a batch of downloaded messages with a single pass of the classifier"""
+        return email_classifier.classify([(m.subject, m.body, m.from_email) for m in messages])
     
     @staticmethod
     def generate_sample_job_suggestions(user, count=5):
@@ -36,10 +84,6 @@ class EmailService:
             dict: Result with count of suggestions created
         """
         try:
-            from flask_pymongo import PyMongo
-            
-            # Get MongoDB connection from app context
-            mongo = PyMongo(current_app)
             user_id = str(user.id)
             
             # Sample companies and positions
@@ -98,38 +142,13 @@ class EmailService:
                 
                 suggestions.append(suggestion)
             
-            # Check if user already has suggestions
-            existing = mongo.db.email_suggestions.find_one({
-                'user_id': user_id,
-                'processed': False
-            })
-            
-            if existing:
-                # Update existing suggestions
-                updated_suggestions = existing['suggestions'] + suggestions
-                mongo.db.email_suggestions.update_one(
-                    {'_id': existing['_id']},
-                    {'$set': {'suggestions': updated_suggestions}}
-                )
-                result = {
-                    'success': True,
-                    'count': len(suggestions),
-                    'total': len(updated_suggestions)
-                }
-            else:
-                # Create new suggestions document
-                suggestion_doc = {
-                    'user_id': user_id,
-                    'processed': False,
-                    'created_at': datetime.now(),
-                    'suggestions': suggestions
-                }
-                mongo.db.email_suggestions.insert_one(suggestion_doc)
-                result = {
-                    'success': True,
-                    'count': len(suggestions),
-                    'total': len(suggestions)
-                }
+            # Store one document per suggestion
+            created = EmailSuggestion.create_many(user_id, suggestions)
+            result = {
+                'success': True,
+                'count': created,
+                'total': EmailSuggestion.count_pending(user_id)
+            }
             
             logger.info(f"Generated {len(suggestions)} sample job suggestions for user {user_id}")
             return result
@@ -144,132 +163,165 @@ class EmailService:
             }
     
     @staticmethod
-    def scan_emails(user):
-        """Scan emails for job-related content."""
-        # This functionality is disabled in the free version
-        logger.info(f"Email scanning disabled - returning explanation to user {user.id}")
+    def run_scan_job(job, progress):
+        """
+        Run a queued email scan (job type 'scan_emails').
         
-        # Create a result class that works with both routes
-        class ScanResult:
-            def __init__(self, success, message, redirect_endpoint, processed_count=0, total_count=0, job_applications=None):
-                self.success = success
-                self.message = message
-                self.redirect_endpoint = redirect_endpoint
-                self.processed_count = processed_count
-                self.total_count = total_count
-                self.job_applications = job_applications or []
-            
-            def __getitem__(self, key):
-                if isinstance(key, int):
-                    if key == 0: return self.success
-                    elif key == 1: return self.message
-                    elif key == 2: return self.redirect_endpoint
-                    else: raise IndexError("Index out of range")
-                elif isinstance(key, str):
-                    if key == 'success': return self.success
-                    elif key == 'message': return self.message
-                    elif key == 'processed_count': return self.processed_count
-                    elif key == 'total_count': return self.total_count
-                    elif key == 'job_applications': return self.job_applications
-                    elif key == 'error': return None
-                    else: return None
+        Args:
+            job: Job document
+            progress: JobProgress used to report how many emails were processed
             
-            def get(self, key, default=None):
-                try:
-                    result = self[key]
-                    return result if result is not None else default
-                except (IndexError, KeyError):
-                    return default
-                    
-            def update(self, data):
-                # No-op method to avoid errors
-                pass
+        Returns:
+            dict: Result stored on the job
+        """
+        user = User.get_by_id(job['user_id'])
+        if not user:
+            raise JobError("User not found")
         
-        # Return a message explaining the feature is coming soon
-        return ScanResult(
-            False, 
-            "Email scanning is coming soon! This feature will be available in an upcoming update.", 
-            "main.dashboard"
-        )
+        progress.update(message='Scanning emails', force=True)
+        result = EmailService.scan_emails(user, progress=progress)
+        if not result.success:
+            raise JobError(result.message)
         
-        # ORIGINAL CODE COMMENTED OUT
+        progress.update(processed=result.processed_count, total=result.total_count, force=True)
+        return {
+            'message': result.message,
+            'suggestions': EmailSuggestion.count_pending(user.id)
+        }
+    
+    @staticmethod
+    def _is_candidate(message):
+        """Whether a message's headers look job-related enough to download its body"""
+        return bool(JOB_HEADER_PATTERN.search(f"{message.subject} {message.from_email}"))
+    
+    @staticmethod
+    def _process_messages(user, messages, index=None):
         """
-        # Check if user has connected email
-        if not hasattr(user, 'email_provider') or not user.email_provider:
-            logger.warning(f"User {user.id} has no connected email provider")
-            return ScanResult(False, "No email provider connected", "main.settings")
+        Analyze downloaded messages and store suggestions for the job-related ones.
         
-        # Use appropriate service based on email provider
-        email_provider = user.email_provider.lower()
+        An email about an application the user already tracks becomes an
+        'update' suggestion if it moves that application forward, and is
+        skipped otherwise; any other job-related email becomes a 'new' one.
         
-        if email_provider in ['yahoo', 'yahoo_imap']:
-            try:
-                from job_app_tracker.services.yahoo_mail_service import YahooMailService
-                logger.info(f"Using YahooMailService for user {user.id}")
-                
-                # Set user's last scan date to 15 days ago if not set
-                if not hasattr(user, 'email_settings') or not user.email_settings or 'last_scan' not in user.email_settings:
-                    from flask_pymongo import PyMongo
-                    
-                    # Get MongoDB connection from app context
-                    mongo = PyMongo(current_app)
-                    
-                    # Set last scan date to 15 days ago
-                    fifteen_days_ago = datetime.now() - timedelta(days=15)
-                    mongo.db.users.update_one(
-                        {'_id': ObjectId(user.id)},
-                        {'$set': {'email_settings.last_scan': fifteen_days_ago}}
-                    )
-                    
-                    logger.info(f"Updated user {user.id} last scan date to 15 days ago")
-                
-                # Perform Yahoo Mail scanning
-                success, message, redirect_endpoint = YahooMailService.scan_emails(user, limit=100)
-                
-                # Get the number of suggestions created during the scan
-                from flask_pymongo import PyMongo
-                mongo = PyMongo(current_app)
-                user_id = str(user.id)
-                
-                # Count unprocessed suggestions from scan
-                suggestion_doc = mongo.db.email_suggestions.find_one({
-                    'user_id': user_id,
-                    'processed': False
+        Args:
+            user: User object
+            messages: MailMessage objects; those without a body are skipped
+            index: ApplicationIndex of the user's applications, built if not given
+        
+        Returns:
+            int: Number of suggestions stored
+        """
+        downloaded = [message for message in messages if message.body is not None]
+        content_hashes = {
+            message.email_id: EmailService._content_hash(message.subject, message.body, message.from_email)
+            for message in downloaded
+        }
+        # Emails analyzed before, e.g. when a mailbox is re-read after a reset
+        cached = EmailService._get_cached_emails(user.id, content_hashes)
+        
+        uncached = [message for message in downloaded if message.email_id not in cached]
+        analyzed = []
+        for message, analysis in zip(uncached, EmailService._analyze_emails(uncached)):
+            cached[message.email_id] = analysis
+            analyzed.append((message.email_id, content_hashes[message.email_id], analysis))
+        
+        suggestions = []
+        for message in downloaded:
+            analysis = cached[message.email_id]
+            if not analysis.get('is_job_related'):
+                continue
+            
+            if index is None:
+                index = ApplicationIndex.for_user(user.id)
+            match = index.match(analysis.get('company'), analysis.get('position'), message.from_email)
+            if match is not None:
+                application = match.application
+                if not is_status_advance(application.get('status'), analysis.get('status')):
+                    continue
+                suggestions.append({
+                    'type': 'update',
+                    'email_id': message.email_id,
+                    'email_subject': message.subject,
+                    'email_from': message.from_email,
+                    'date': message.date or datetime.now(),
+                    'application_id': str(application['_id']),
+                    'company': application.get('company'),
+                    'position': application.get('position'),
+                    'current_status': application.get('status'),
+                    'new_status': analysis.get('status'),
+                    'confidence': analysis.get('confidence'),
+                    'reasoning': f"Matched to your application by {match.method}"
                 })
-                
-                suggestions_count = len(suggestion_doc.get('suggestions', [])) if suggestion_doc else 0
-                logger.info(f"Scanning found {suggestions_count} job applications")
-                
-                return ScanResult(
-                    success, 
-                    message, 
-                    redirect_endpoint,
-                    processed_count=suggestions_count,
-                    total_count=suggestions_count
-                )
-                
-            except ImportError as e:
-                logger.error(f"YahooMailService not available: {str(e)}")
-                return ScanResult(
-                    False, 
-                    f"Yahoo Mail service not available: {str(e)}", 
-                    "main.dashboard"
-                )
-            except Exception as e:
-                logger.error(f"Error during email scanning: {str(e)}")
-                return ScanResult(
-                    False, 
-                    f"Error scanning emails: {str(e)}", 
-                    "main.dashboard"
-                )
-        else:
-            logger.warning(f"Email provider '{user.email_provider}' not supported")
-            return ScanResult(
-                False, 
-                f"Email provider '{user.email_provider}' not supported", 
-                "main.settings"
-            )
+                continue
+            
+            suggestions.append({
+                'type': 'new',
+                'email_id': message.email_id,
+                'email_subject': message.subject,
+                'email_from': message.from_email,
+                'date': message.date or datetime.now(),
+                'company': analysis.get('company'),
+                'position': analysis.get('position'),
+                'status': analysis.get('status'),
+                'confidence': analysis.get('confidence')
+            })
+        EmailService._cache_emails(user.id, analyzed)
+        return EmailSuggestion.create_many(user.id, suggestions)
+    
+    @staticmethod
+    def scan_emails(user, progress=None, fetcher=None):
+        """
+        Scan the user's mailbox for job-related emails received since the last scan.
+        
+        Only messages above the stored UID watermark are fetched, and the
+        watermark is saved after every batch, so an interrupted scan resumes
+        where it stopped and nothing is downloaded twice.
+        
+        Args:
+            user: User object
+            progress: Optional JobProgress to report to
+            fetcher: ImapFetcher to use; the shared connection pool by default
+            
+        Returns:
+            ScanResult
         """
+        try:
+            account = ImapAccount.for_user(user)
+        except ValueError as e:
+            return ScanResult(False, str(e), "main.settings")
+        
+        fetcher = fetcher or ImapFetcher()
+        index = ApplicationIndex.for_user(user.id)
+        settings = user.email_settings or {}
+        since = settings.get('last_scan') or datetime.now() - timedelta(days=INITIAL_SCAN_DAYS)
+        started_at = datetime.now()
+        processed = 0
+        total = 0
+        found = 0
+        
+        try:
+            for batch in fetcher.fetch_new(
+                account,
+                last_uid=settings.get('last_uid', 0),
+                uid_validity=settings.get('uid_validity'),
+                since=since,
+                is_candidate=EmailService._is_candidate
+            ):
+                total = batch.total
+                found += EmailService._process_messages(user, batch.messages, index)
+                processed += len(batch.messages)
+                user.update_scan_state(uid_validity=batch.uid_validity, last_uid=batch.last_uid)
+                if progress:
+                    progress.update(processed=processed, total=total, message=f"Scanned {processed} of {total} emails")
+        except (imaplib.IMAP4.error, OSError) as e:
+            logger.error(f"Error scanning emails for user {user.id}: {str(e)}")
+            return ScanResult(False, f"Error scanning emails: {str(e)}", "main.email_suggestions",
+                              processed_count=processed, total_count=total)
+        
+        user.update_scan_state(last_scan=started_at)
+        logger.info(f"Scanned {processed} new emails for user {user.id}, stored {found} suggestions")
+        message = f"Found {found} potential job application emails" if found else "No new job application emails found"
+        return ScanResult(True, message, "main.email_suggestions", processed_count=processed, total_count=total)
     
     @staticmethod
     def get_gmail_auth_url(user_id):
@@ -296,26 +348,31 @@ class EmailService:
     def clear_all_user_data(user):
         """Clear all user data."""
         try:
-            from flask_pymongo import PyMongo
-            
-            # Get MongoDB connection from app context
-            mongo = PyMongo(current_app)
             user_id = str(user.id)
             
             # Clear email suggestions
             suggestions_result = mongo.db.email_suggestions.delete_many({'user_id': user_id})
             
-            # Clear applications
+            # Clear applications, then the files only they referred to
+            documents = Application.stored_documents(user_id)
             applications_result = mongo.db.applications.delete_many({'user_id': user_id})
+            UserStats.reset(user_id)
+            document_storage.release_documents(documents)
             
             # Clear analysis cache
             cache_result = mongo.db.analysis_cache.delete_many({'user_id': user_id})
+            EmailService._clear_cache()
             
-            # Reset last scan time
+            # Reset the sync position, so the next scan reads the mailbox again
             user_update_result = mongo.db.users.update_one(
                 {'_id': ObjectId(user.id)},
-                {'$unset': {'email_settings.last_scan': ''}}
+                {'$unset': {
+                    'email_settings.last_scan': '',
+                    'email_settings.last_uid': '',
+                    'email_settings.uid_validity': ''
+                }}
             )
+            User.invalidate_cache(user.id)
             
             logger.info(f"Cleared data for user {user_id}: {suggestions_result.deleted_count} suggestions, {applications_result.deleted_count} applications")
             
@@ -333,30 +390,110 @@ class EmailService:
             }
     
     @staticmethod
-    def _get_cached_email(email_id, user_id):
+    def _content_hash(subject, body, from_email):
+        """
+        Hash of what the analysis depends on, so a cached result is only
+        reused for the same content classified by the same model.
+        """
+        content = '\0'.join([email_classifier.version, from_email or '', subject or '', body or ''])
+        return hashlib.sha256(content.encode('utf-8', errors='replace')).hexdigest()
+    
+    @staticmethod
+    def _get_cached_emails(user_id, content_hashes):
+        """
+        Look up cached analyses, first in process memory and then in the
+        analysis_cache collection with a single query.
+        
+        Args:
+            user_id: User the emails belong to
+            content_hashes: dict of email_id to content hash
+            
+        Returns:
+            dict: email_id to analysis, for the emails whose cached content hash matches
+        """
+        user_id = str(user_id)
+        found = {}
+        missing = []
+        for email_id, content_hash in content_hashes.items():
+            entry = _analysis_memory.get((user_id, email_id))
+            if entry is not None and entry[0] == content_hash:
+                found[email_id] = entry[1]
+            else:
+                missing.append(email_id)
+        
+        if missing:
+            try:
+                cursor = mongo.db.analysis_cache.find(
+                    {'_id': {'$in': [f"{user_id}:{email_id}" for email_id in missing]}, 'expires_at': {'$gt': datetime.utcnow()}},
+                    {'email_id': 1, 'content_hash': 1, 'analysis': 1}
+                )
+                for entry in cursor:
+                    email_id = entry['email_id']
+                    if entry.get('content_hash') != content_hashes[email_id]:
+                        continue
+                    found[email_id] = entry['analysis']
+                    _analysis_memory.set((user_id, email_id), (entry['content_hash'], entry['analysis']))
+            except Exception as e:
+                logger.error(f"Error reading analysis cache for user {user_id}: {str(e)}")
+        
+        return found
+    
+    @staticmethod
+    def _cache_emails(user_id, entries):
+        """
+        Cache analyses in both tiers.
+        
+        Args:
+            user_id: User the emails belong to
+            entries: List of (email_id, content_hash, analysis)
+        """
+        if not entries:
+            return
+        user_id = str(user_id)
+        now = datetime.utcnow()
+        operations = []
+        for email_id, content_hash, analysis in entries:
+            _analysis_memory.set((user_id, email_id), (content_hash, analysis))
+            operations.append(ReplaceOne(
+                {'_id': f"{user_id}:{email_id}"},
+                {
+                    'user_id': user_id,
+                    'email_id': email_id,
+                    'content_hash': content_hash,
+                    'analysis': analysis,
+                    'created_at': now,
+                    'expires_at': now + timedelta(seconds=ANALYSIS_CACHE_TTL)
+                },
+                upsert=True
+            ))
+        try:
+            mongo.db.analysis_cache.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error writing analysis cache for user {user_id}: {str(e)}")
+    
+    @staticmethod
+    def _get_cached_email(email_id, user_id, content_hash):
         """Get cached email analysis data."""
-        return None
+        return EmailService._get_cached_emails(user_id, {email_id: content_hash}).get(email_id)
     
     @staticmethod
-    def _cache_email(email_id, user_id, analysis_data):
+    def _cache_email(email_id, user_id, analysis_data, content_hash):
         """Cache email analysis data."""
-        pass
+        EmailService._cache_emails(user_id, [(email_id, content_hash, analysis_data)])
     
     @staticmethod
     def _clear_cache():
-        """Clear the email analysis cache."""
-        pass
-    
-    @staticmethod
-    def _cleanup_expired_cache():
-        """Clean up expired cache entries."""
-        pass
+        """Clear this process's copy of the email analysis cache."""
+        _analysis_memory.clear()
     
     @staticmethod
     def clear_analysis_cache(user_id=None, older_than_days=None):
         """
         Clear the email analysis cache
         
+        Expired entries are removed by the TTL index on expires_at; this is
+        for dropping entries early, e.g. after the analysis itself changed.
+        
         Args:
             user_id (str): If provided, only clear cache for this user
             older_than_days (int): If provided, only clear cache entries older than this many days
@@ -364,25 +501,13 @@ class EmailService:
         Returns:
             int: Number of cache entries deleted
         """
-        logger.info(f"Clearing analysis cache for user: {user_id}, older than {older_than_days} days")
-        return 0
-    
-    @staticmethod
-    def ensure_cache_indexes():
-        """Ensure cache indexes exist."""
-        logger.info("Ensuring cache indexes")
-        return True
-    
-    @staticmethod
-    def schedule_cache_cleanup():
-        """Schedule cache cleanup task."""
-        def cleanup():
-            while True:
-                try:
-                    EmailService._cleanup_expired_cache()
-                except Exception as e:
-                    logger.error(f"Error in cache cleanup: {str(e)}")
-                time.sleep(3600)  # Run every hour
-
-        thread = threading.Thread(target=cleanup, daemon=True)
-        thread.start() 
\ No newline at end of file
+        query = {}
+        if user_id:
+            query['user_id'] = str(user_id)
+        if older_than_days is not None:
+            query['created_at'] = {'$lt': datetime.utcnow() - timedelta(days=older_than_days)}
+        
+        result = mongo.db.analysis_cache.delete_many(query)
+        EmailService._clear_cache()
+        logger.info(f"Cleared {result.deleted_count} analysis cache entries for user: {user_id}, older than {older_than_days} days")
+        return result.deleted_count
@@ -0,0 +1,404 @@
+import imaplib
+import logging
+import os
+import re
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email import policy
+from email.parser import BytesHeaderParser, BytesParser
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger('imap_fetcher')
+
+# IMAP servers by email provider; IMAP_HOST overrides them all, e.g. to point
+# scans at a local IMAP server
+IMAP_SERVERS = {
+    'yahoo': ('imap.mail.yahoo.com', 993),
+    'yahoo_imap': ('imap.mail.yahoo.com', 993),
+    'gmail': ('imap.gmail.com', 993),
+    'outlook': ('outlook.office365.com', 993)
+}
+
+# Providers whose stored token is an OAuth access token rather than an app password
+OAUTH_PROVIDERS = ('gmail', 'outlook')
+
+# Messages whose headers are fetched with one UID FETCH
+HEADER_BATCH_SIZE = 500
+
+# Candidate messages whose bodies are fetched with one UID FETCH
+BODY_BATCH_SIZE = 50
+
+# Bytes of each message body downloaded; enough for the text of any job email
+MAX_BODY_BYTES = 256 * 1024
+
+HEADER_FIELDS = 'SUBJECT FROM DATE MESSAGE-ID'
+
+_UID_PATTERN = re.compile(rb'UID (\d+)')
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+class ImapAccount:
+    """Connection details of one mailbox"""
+
+    def __init__(self, host, username, password, port=993, use_ssl=True, oauth=False, mailbox='INBOX', timeout=30):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.oauth = oauth
+        self.mailbox = mailbox
+        self.timeout = timeout
+
+    @property
+    def key(self):
+        return (self.host, self.port, self.username)
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Build the account for a user's connected email.
+
+        Raises:
+            ValueError: If the user has no connected email or its provider is not supported
+        """
+        if not user.email_connected or not user.connected_email or not user.email_token:
+            raise ValueError("Email not connected. Please connect an email account first.")
+
+        provider = (user.email_provider or '').lower()
+        host = os.environ.get('IMAP_HOST')
+        port = int(os.environ.get('IMAP_PORT', 993))
+        if not host:
+            if provider not in IMAP_SERVERS:
+                raise ValueError(f"Email provider '{user.email_provider}' not supported")
+            host, port = IMAP_SERVERS[provider]
+
+        return cls(
+            host=host,
+            port=port,
+            use_ssl=os.environ.get('IMAP_SSL', 'true').lower() == 'true',
+            username=user.connected_email,
+            password=user.email_token,
+            oauth=provider in OAUTH_PROVIDERS,
+            mailbox=os.environ.get('IMAP_MAILBOX', 'INBOX'),
+            timeout=int(os.environ.get('IMAP_TIMEOUT', 30))
+        )
+
+
+class ImapConnectionPool:
+    """Authenticated IMAP connections kept open between scans, per account.
+
+    A connection idle for longer than `max_idle` is closed instead of reused;
+    a reused one is checked with NOOP first, since servers drop idle clients.
+    """
+
+    def __init__(self, max_idle=timedelta(minutes=5), max_per_account=2):
+        self.max_idle = max_idle
+        self.max_per_account = max_per_account
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, account):
+        if account.use_ssl:
+            context = ssl.create_default_context()
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            imap = imaplib.IMAP4_SSL(account.host, account.port, ssl_context=context, timeout=account.timeout)
+        else:
+            imap = imaplib.IMAP4(account.host, account.port, timeout=account.timeout)
+
+        try:
+            if account.oauth:
+                auth_string = f"user={account.username}\1auth=Bearer {account.password}\1\1"
+                imap.authenticate('XOAUTH2', lambda _: auth_string.encode())
+            else:
+                imap.login(account.username, account.password)
+        except Exception:
+            _close(imap)
+            raise
+        return imap
+
+    def acquire(self, account):
+        """Take an idle connection for the account, or open a new one"""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get(account.key)
+                entry = idle.pop() if idle else None
+            if entry is None:
+                return self._connect(account)
+
+            imap, released_at = entry
+            if now - released_at > self.max_idle.total_seconds():
+                _close(imap)
+                continue
+            try:
+                imap.noop()
+                return imap
+            except (imaplib.IMAP4.error, OSError):
+                _close(imap)
+
+    def release(self, account, imap, broken=False):
+        """Return a connection to the pool; a broken one is closed"""
+        if broken:
+            _close(imap)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(account.key, [])
+            if len(idle) < self.max_per_account:
+                idle.append((imap, time.monotonic()))
+                return
+        _close(imap)
+
+    @contextmanager
+    def connection(self, account):
+        imap = self.acquire(account)
+        try:
+            yield imap
+        except BaseException:
+            # The connection may be dropped or mid-command; do not hand it out again
+            self.release(account, imap, broken=True)
+            raise
+        else:
+            self.release(account, imap)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for entries in idle.values():
+            for imap, _ in entries:
+                _close(imap)
+
+
+def _close(imap):
+    try:
+        imap.logout()
+    except Exception:
+        pass
+
+
+class MailMessage:
+    """A message's headers, plus its text body if it was downloaded"""
+
+    def __init__(self, uid, uid_validity, message_id, subject, from_email, date, body=None):
+        self.uid = uid
+        self.uid_validity = uid_validity
+        self.message_id = message_id
+        self.subject = subject
+        self.from_email = from_email
+        self.date = date
+        self.body = body
+
+    @property
+    def email_id(self):
+        """Stable id for the message, used to avoid suggesting it twice"""
+        return self.message_id or f"imap:{self.uid_validity}:{self.uid}"
+
+
+class MailBatch:
+    """One batch of new messages from a sync.
+
+    `last_uid` is the watermark to store once the batch has been processed;
+    `total` is the number of new messages in the whole sync.
+    """
+
+    def __init__(self, uid_validity, messages, last_uid, total):
+        self.uid_validity = uid_validity
+        self.messages = messages
+        self.last_uid = last_uid
+        self.total = total
+
+
+def uid_set(uids):
+    """Compress sorted UIDs into an IMAP sequence set, e.g. 1:4,7,9:10"""
+    ranges = []
+    start = previous = uids[0]
+    for uid in uids[1:]:
+        if uid == previous + 1:
+            previous = uid
+            continue
+        ranges.append((start, previous))
+        start = previous = uid
+    ranges.append((start, previous))
+    return ','.join(f"{a}:{b}" if a != b else str(a) for a, b in ranges)
+
+
+def _imap_date(value):
+    return f"{value.day:02d}-{_MONTHS[value.month - 1]}-{value.year}"
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _text_body(raw):
+    """The plain text of a message, falling back to its HTML with tags removed"""
+    message = BytesParser(policy=policy.default).parsebytes(raw)
+    for preference in ('plain', 'html'):
+        part = message.get_body(preferencelist=(preference,))
+        if part is None:
+            continue
+        try:
+            content = part.get_content()
+        except (LookupError, ValueError):
+            content = part.get_payload(decode=True) or b''
+            content = content.decode('utf-8', errors='replace')
+        return _TAG_PATTERN.sub(' ', content) if preference == 'html' else content
+    return ''
+
+
+class ImapFetcher:
+    """Fetches the messages that arrived since the last sync of a mailbox.
+
+    Sync state is the mailbox's UIDVALIDITY and the highest UID already
+    processed. Each sync searches for UIDs above that watermark, so messages
+    that were seen before are never downloaded again. Headers are fetched in
+    batches of UID ranges; bodies only for the messages `is_candidate`
+    accepts from their headers. Connections come from a pool, so consecutive
+    scans of an account skip connecting and logging in.
+
+    A mailbox that was never synced, or whose UIDVALIDITY changed, is synced
+    from the `since` date instead.
+    """
+
+    def __init__(self, pool=None, header_batch_size=HEADER_BATCH_SIZE, body_batch_size=BODY_BATCH_SIZE,
+                 max_body_bytes=MAX_BODY_BYTES):
+        self.pool = pool or imap_pool
+        self.header_batch_size = header_batch_size
+        self.body_batch_size = body_batch_size
+        self.max_body_bytes = max_body_bytes
+
+    @staticmethod
+    def _fetch(imap, uids, item):
+        """UID FETCH an item for a set of UIDs; returns {uid: bytes}"""
+        status, data = imap.uid('FETCH', uid_set(uids), f'(UID {item})')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"FETCH failed: {data}")
+
+        fetched = {}
+        pending = None
+        for part in data:
+            if isinstance(part, tuple):
+                match = _UID_PATTERN.search(part[0])
+                if match:
+                    fetched[int(match.group(1))] = part[1]
+                    pending = None
+                else:
+                    pending = part[1]
+            elif pending is not None and isinstance(part, bytes):
+                # Some servers send the UID after the literal
+                match = _UID_PATTERN.search(part)
+                if match:
+                    fetched[int(match.group(1))] = pending
+                pending = None
+        return fetched
+
+    @staticmethod
+    def _select(imap, mailbox):
+        status, data = imap.select(mailbox, readonly=True)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"Cannot open mailbox {mailbox}: {data}")
+        _, validity = imap.response('UIDVALIDITY')
+        _, uid_next = imap.response('UIDNEXT')
+        uid_validity = int(validity[0]) if validity and validity[0] else None
+        uid_next = int(uid_next[0]) if uid_next and uid_next[0] else None
+        return uid_validity, uid_next
+
+    def _search(self, imap, last_uid, since):
+        if last_uid:
+            status, data = imap.uid('SEARCH', 'UID', f'{last_uid + 1}:*')
+        else:
+            status, data = imap.uid('SEARCH', 'SINCE', _imap_date(since))
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"SEARCH failed: {data}")
+        # n:* always matches the highest UID, even when it is below n
+        return sorted(uid for uid in (int(u) for u in (data[0] or b'').split()) if uid > last_uid)
+
+    def _headers(self, imap, uids, uid_validity):
+        parser = BytesHeaderParser(policy=policy.default)
+        fetched = self._fetch(imap, uids, f'BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})]')
+        messages = []
+        for uid in uids:
+            raw = fetched.get(uid)
+            if raw is None:
+                # Expunged since the search
+                continue
+            headers = parser.parsebytes(raw)
+            messages.append(MailMessage(
+                uid=uid,
+                uid_validity=uid_validity,
+                message_id=str(headers.get('message-id') or '').strip() or None,
+                subject=str(headers.get('subject') or ''),
+                from_email=str(headers.get('from') or ''),
+                date=_parse_date(headers.get('date'))
+            ))
+        return messages
+
+    def _bodies(self, imap, messages):
+        for start in range(0, len(messages), self.body_batch_size):
+            batch = messages[start:start + self.body_batch_size]
+            fetched = self._fetch(imap, [m.uid for m in batch], f'BODY.PEEK[]<0.{self.max_body_bytes}>')
+            for message in batch:
+                raw = fetched.get(message.uid)
+                if raw is None:
+                    continue
+                try:
+                    message.body = _text_body(raw)
+                except Exception as e:
+                    logger.warning(f"Could not parse body of message {message.uid}: {str(e)}")
+                    message.body = ''
+
+    def fetch_new(self, account, last_uid=0, uid_validity=None, since=None, is_candidate=None):
+        """
+        Yield MailBatch objects for the messages after the watermark.
+
+        Args:
+            account: ImapAccount to read
+            last_uid: Highest UID already processed
+            uid_validity: UIDVALIDITY that last_uid belongs to
+            since: Date to start from when the mailbox has no usable watermark
+            is_candidate: Called with each MailMessage; only accepted messages get a body
+
+        A final batch is always yielded, so the caller can store the watermark
+        even when there was nothing new.
+        """
+        since = since or datetime.now() - timedelta(days=15)
+        with self.pool.connection(account) as imap:
+            current_validity, uid_next = self._select(imap, account.mailbox)
+            if current_validity != uid_validity:
+                if uid_validity is not None:
+                    logger.info(f"UIDVALIDITY of {account.username} changed, syncing from {since:%Y-%m-%d}")
+                last_uid = 0
+
+            uids = self._search(imap, last_uid, since)
+            # Everything below UIDNEXT existed when the mailbox was opened
+            final_uid = max([last_uid, (uid_next or 1) - 1] + uids[-1:])
+            total = len(uids)
+            if not uids:
+                yield MailBatch(current_validity, [], final_uid, 0)
+                return
+
+            for start in range(0, total, self.header_batch_size):
+                chunk = uids[start:start + self.header_batch_size]
+                messages = self._headers(imap, chunk, current_validity)
+                candidates = [m for m in messages if is_candidate is None or is_candidate(m)]
+                if candidates:
+                    self._bodies(imap, candidates)
+
+                is_last = start + self.header_batch_size >= total
+                yield MailBatch(current_validity, messages, final_uid if is_last else chunk[-1], total)
+
+
+# Shared pool, one per process
+imap_pool = ImapConnectionPool()
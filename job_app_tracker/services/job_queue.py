@@ -0,0 +1,357 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from job_app_tracker.config.mongodb import mongo
+
+logger = logging.getLogger('job_queue')
+
+# Job states; queued -> running -> completed | failed
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    """A job failed in a way that retrying will not fix"""
+
+
+class JobProgress:
+    """Progress reporter handed to job handlers.
+
+    Writes are throttled to one every `interval` seconds. Each write also
+    extends the job's lease, as does the heartbeat run_one keeps going while
+    the handler runs.
+    """
+
+    def __init__(self, queue, job, interval=1.0):
+        self.queue = queue
+        self.job_id = job['_id']
+        self.worker_id = job.get('worker_id')
+        self.interval = interval
+        self.processed = job.get('progress', {}).get('processed', 0)
+        self.total = job.get('progress', {}).get('total')
+        self.message = job.get('progress', {}).get('message')
+        self._last_write = 0
+
+    def update(self, processed=None, total=None, message=None, force=False):
+        if processed is not None:
+            self.processed = processed
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+        now = time.monotonic()
+        if not force and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        mongo.db.jobs.update_one(
+            {'_id': self.job_id, 'worker_id': self.worker_id},
+            {'$set': {
+                'progress': {'processed': self.processed, 'total': self.total, 'message': self.message},
+                'lease_until': datetime.now() + self.queue.lease,
+                'updated_at': datetime.now()
+            }}
+        )
+
+    def advance(self, count=1, message=None):
+        self.update(processed=self.processed + count, message=message)
+
+    def renew_lease(self):
+        """Extend the lease; returns False if the job is no longer this worker's"""
+        result = mongo.db.jobs.update_one(
+            {'_id': self.job_id, 'worker_id': self.worker_id, 'status': RUNNING},
+            {'$set': {'lease_until': datetime.now() + self.queue.lease}}
+        )
+        return result.matched_count > 0
+
+
+class LeaseHeartbeat:
+    """Renews a job's lease from a background thread while its handler runs.
+
+    A handler can block for a long time between progress updates (one IMAP
+    batch, one large PDF), and without renewals another worker would claim
+    the job once the lease ran out and run it a second time.
+    """
+
+    def __init__(self, progress, interval):
+        self.progress = progress
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'lease-{progress.job_id}', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.progress.renew_lease():
+                    logger.warning(f"Job {self.progress.job_id} was taken over by another worker")
+                    return
+            except Exception as e:
+                logger.error(f"Could not renew the lease of job {self.progress.job_id}: {str(e)}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class JobQueue:
+    """A queue of background jobs stored in the jobs collection.
+
+    Each job document doubles as its progress record, so the web process can
+    report progress by reading a single document. Workers claim jobs with
+    find_one_and_update and hold a lease that a heartbeat renews while the job
+    runs. A job whose worker died is picked up again once the lease runs out,
+    until it has used up max_attempts; then it is failed, so a job that kills
+    its worker every time is not retried forever.
+    """
+
+    def __init__(self, lease=timedelta(minutes=2), max_attempts=3, retry_delay=timedelta(seconds=30)):
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def enqueue(self, job_type, user_id, payload=None, unique=True):
+        """
+        Queue a job.
+
+        With unique=True, a user has at most one queued or running job of a
+        type; enqueueing another returns the existing one instead.
+
+        Returns:
+            dict: The job document
+        """
+        now = datetime.now()
+        job = {
+            'type': job_type,
+            'user_id': str(user_id),
+            'payload': payload or {},
+            'status': QUEUED,
+            # Set while queued or running; a unique index keeps one active job per type and user
+            'active': True,
+            'progress': {'processed': 0, 'total': None, 'message': 'Waiting to start'},
+            'attempts': 0,
+            'run_after': now,
+            'created_at': now,
+            'updated_at': now
+        }
+        if not unique:
+            job.pop('active')
+            job['_id'] = mongo.db.jobs.insert_one(job).inserted_id
+            return job
+
+        # Upsert on the active job of this type, so two clicks queue one job
+        query = {'type': job_type, 'user_id': str(user_id), 'active': True}
+        try:
+            return mongo.db.jobs.find_one_and_update(
+                query, {'$setOnInsert': job}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent request inserted it first
+            return mongo.db.jobs.find_one(query)
+
+    @staticmethod
+    def get(job_id, user_id=None):
+        """Get a job by id, optionally only if it belongs to user_id"""
+        if not ObjectId.is_valid(str(job_id)):
+            return None
+        query = {'_id': ObjectId(str(job_id))}
+        if user_id is not None:
+            query['user_id'] = str(user_id)
+        return mongo.db.jobs.find_one(query)
+
+    @staticmethod
+    def active(job_type, user_id):
+        """A user's queued or running job of a type, if any"""
+        return mongo.db.jobs.find_one({'type': job_type, 'user_id': str(user_id), 'active': True})
+
+    @property
+    def heartbeat_interval(self):
+        """Seconds between lease renewals; several fit in one lease"""
+        return self.lease.total_seconds() / 3
+
+    def fail_abandoned(self, job_types):
+        """
+        Fail running jobs whose lease expired after their last allowed attempt.
+
+        Returns:
+            int: Number of jobs failed
+        """
+        now = datetime.now()
+        result = mongo.db.jobs.update_many(
+            {
+                'type': {'$in': list(job_types)},
+                'status': RUNNING,
+                'lease_until': {'$lt': now},
+                'attempts': {'$gte': self.max_attempts}
+            },
+            {
+                '$set': {
+                    'status': FAILED,
+                    'error': 'The worker running this job stopped responding',
+                    'progress.message': 'Failed',
+                    'finished_at': now,
+                    'updated_at': now
+                },
+                '$unset': {'lease_until': '', 'active': ''}
+            }
+        )
+        if result.modified_count:
+            logger.warning(f"Failed {result.modified_count} jobs whose workers stopped on every attempt")
+        return result.modified_count
+
+    def claim(self, worker_id, job_types):
+        """Claim the oldest runnable job of the given types, or return None"""
+        self.fail_abandoned(job_types)
+        now = datetime.now()
+        return mongo.db.jobs.find_one_and_update(
+            {
+                'type': {'$in': list(job_types)},
+                '$or': [
+                    {'status': QUEUED, 'run_after': {'$lte': now}},
+                    # Running, but its worker stopped renewing the lease; retried while attempts remain
+                    {'status': RUNNING, 'lease_until': {'$lt': now}, 'attempts': {'$lt': self.max_attempts}}
+                ]
+            },
+            {
+                '$set': {
+                    'status': RUNNING,
+                    'worker_id': worker_id,
+                    'lease_until': now + self.lease,
+                    'started_at': now,
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def complete(job, result=None):
+        now = datetime.now()
+        mongo.db.jobs.update_one(
+            {'_id': job['_id'], 'worker_id': job['worker_id']},
+            {
+                '$set': {
+                    'status': COMPLETED,
+                    'result': result or {},
+                    'progress.message': 'Done',
+                    'finished_at': now,
+                    'updated_at': now
+                },
+                '$unset': {'lease_until': '', 'active': ''}
+            }
+        )
+
+    def fail(self, job, error, retry=True):
+        """Record a failure, queueing the job again unless it is out of attempts"""
+        now = datetime.now()
+        unset = {'lease_until': ''}
+        if retry and job.get('attempts', 0) < self.max_attempts:
+            update = {
+                'status': QUEUED,
+                'error': error,
+                'run_after': now + self.retry_delay * job.get('attempts', 1),
+                'progress.message': 'Retrying after an error',
+                'updated_at': now
+            }
+        else:
+            update = {
+                'status': FAILED,
+                'error': error,
+                'progress.message': 'Failed',
+                'finished_at': now,
+                'updated_at': now
+            }
+            unset['active'] = ''
+        mongo.db.jobs.update_one(
+            {'_id': job['_id'], 'worker_id': job['worker_id']},
+            {'$set': update, '$unset': unset}
+        )
+
+    def run_one(self, worker_id, handlers):
+        """
+        Claim and run one job.
+
+        Returns:
+            bool: Whether a job was run
+        """
+        job = self.claim(worker_id, handlers.keys())
+        if job is None:
+            return False
+
+        logger.info(f"Worker {worker_id} running {job['type']} job {job['_id']} (attempt {job['attempts']})")
+        progress = JobProgress(self, job)
+        try:
+            with LeaseHeartbeat(progress, self.heartbeat_interval):
+                result = handlers[job['type']](job, progress)
+        except JobError as e:
+            self.fail(job, str(e), retry=False)
+        except Exception as e:
+            logger.error(f"Job {job['_id']} failed: {str(e)}\n{traceback.format_exc()}")
+            self.fail(job, str(e))
+        else:
+            self.complete(job, result)
+        return True
+
+    def work(self, handlers, idle_sleep=1.0, stop=None):
+        """Run jobs until `stop()` returns True, sleeping while the queue is empty"""
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        logger.info(f"Job worker {worker_id} started for {', '.join(handlers)}")
+        while not (stop and stop()):
+            try:
+                ran = self.run_one(worker_id, handlers)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} could not claim a job: {str(e)}")
+                ran = False
+            if not ran:
+                time.sleep(idle_sleep)
+
+
+def job_status(job):
+    """The public view of a job, as returned by /api/jobs/<job_id>"""
+    progress = job.get('progress', {})
+    total = progress.get('total')
+    processed = progress.get('processed', 0)
+    return {
+        'id': str(job['_id']),
+        'type': job['type'],
+        'status': job['status'],
+        'processed': processed,
+        'total': total,
+        'percent': round(processed / total * 100) if total else None,
+        'message': progress.get('message'),
+        'result': job.get('result'),
+        'error': job.get('error') if job['status'] == FAILED else None,
+        'created_at': job.get('created_at'),
+        'finished_at': job.get('finished_at')
+    }
+
+
+def default_handlers():
+    """Handlers for every job type the application queues"""
+    from job_app_tracker.services.document_processor import run_document_job
+    from job_app_tracker.services.email_service import EmailService
+    return {
+        'scan_emails': EmailService.run_scan_job,
+        'process_document': run_document_job
+    }
+
+
+# Shared queue used by the routes and the worker script
+job_queue = JobQueue()
@@ -0,0 +1,212 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import requests
+from bson import ObjectId
+from requests.adapters import HTTPAdapter
+
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.utils.cache import TTLCache
+from job_app_tracker.utils.metrics import LOGO_LOOKUPS_PENDING, LOGO_RESOLVER_THREADS
+
+logger = logging.getLogger('logo_resolver')
+
+DEFAULT_FAVICON_SERVICE = 'https://www.google.com/s2/favicons'
+
+
+class LogoResolver:
+    """Resolves company logo (favicon) URLs for application websites.
+
+    Results are cached per domain, first in an in-process LRU and then in the
+    logo_cache collection, whose TTL index expires entries after
+    LOGO_CACHE_TTL seconds. Domains without a logo are cached as well, for a
+    shorter time, so a dead site is not probed on every save.
+
+    Network lookups use one shared requests.Session with a bounded connection
+    pool and timeouts. resolve_async() runs them on a small thread pool and
+    fills in the application's company_logo once a logo is found, so creating
+    or updating an application never waits on a third-party site. The number
+    of lookups pending and of live resolver threads is exported to /metrics.
+
+    Configuration (read in init_app):
+        LOGO_FAVICON_SERVICE  Favicon service base URL; point it at a stub
+                              server to keep tests off the network
+        LOGO_REQUEST_TIMEOUT  Seconds to wait for each HEAD request
+        LOGO_CACHE_TTL        Seconds to cache a found logo
+        LOGO_MISS_TTL         Seconds to cache a domain without a logo
+        LOGO_RESOLVER_WORKERS Background resolver threads
+    """
+
+    def __init__(self):
+        self.favicon_service = DEFAULT_FAVICON_SERVICE
+        self.timeout = 3
+        self.cache_ttl = 7 * 24 * 3600
+        self.miss_ttl = 24 * 3600
+        self.max_workers = 4
+        self._memory = TTLCache(maxsize=2048, ttl=self.cache_ttl)
+        self._session = None
+        self._executor = None
+        self._app = None
+
+    def init_app(self, app):
+        self._app = app
+        self.favicon_service = app.config.get('LOGO_FAVICON_SERVICE', DEFAULT_FAVICON_SERVICE)
+        self.timeout = float(app.config.get('LOGO_REQUEST_TIMEOUT', self.timeout))
+        self.cache_ttl = int(app.config.get('LOGO_CACHE_TTL', self.cache_ttl))
+        self.miss_ttl = int(app.config.get('LOGO_MISS_TTL', self.miss_ttl))
+        self.max_workers = int(app.config.get('LOGO_RESOLVER_WORKERS', self.max_workers))
+        self._memory = TTLCache(maxsize=2048, ttl=self.cache_ttl)
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='logo-resolver')
+        return self._executor
+
+    @staticmethod
+    def domain_for(url):
+        """Lowercased host of a website URL, or None if it has none"""
+        if not url:
+            return None
+        if '://' not in url:
+            url = f"https://{url}"
+        host = urlparse(url).hostname
+        return host.lower() if host else None
+
+    def cached(self, url):
+        """
+        Look up a URL's logo without touching the network.
+
+        Returns:
+            tuple: (found, logo_url); found is False when the domain is not cached
+        """
+        domain = self.domain_for(url)
+        if not domain:
+            return True, None
+
+        entry = self._memory.get(domain)
+        if entry is not None:
+            return True, entry['logo_url']
+
+        try:
+            entry = mongo.db.logo_cache.find_one({'_id': domain, 'expires_at': {'$gt': datetime.utcnow()}})
+        except Exception as e:
+            logger.error(f"Error reading logo cache for {domain}: {str(e)}")
+            entry = None
+        if entry is not None:
+            self._memory.set(domain, {'logo_url': entry.get('logo_url')})
+            return True, entry.get('logo_url')
+
+        return False, None
+
+    def _store(self, domain, logo_url):
+        ttl = self.cache_ttl if logo_url else self.miss_ttl
+        self._memory.set(domain, {'logo_url': logo_url}, ttl=ttl)
+        try:
+            mongo.db.logo_cache.replace_one(
+                {'_id': domain},
+                {
+                    '_id': domain,
+                    'logo_url': logo_url,
+                    'resolved_at': datetime.utcnow(),
+                    'expires_at': datetime.utcnow() + timedelta(seconds=ttl)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error writing logo cache for {domain}: {str(e)}")
+
+    def _exists(self, url):
+        try:
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def _fetch(self, domain):
+        """Probe the favicon service, then the site's own favicon.ico"""
+        base_url = f"https://{domain}"
+
+        service_url = f"{self.favicon_service}?domain={base_url}&sz=128"
+        if self._exists(service_url):
+            return service_url
+
+        favicon_url = f"{base_url}/favicon.ico"
+        if self._exists(favicon_url):
+            return favicon_url
+
+        return None
+
+    def resolve(self, url):
+        """Get the logo URL for a website, or None if it has no reachable logo"""
+        found, logo_url = self.cached(url)
+        if found:
+            return logo_url
+
+        domain = self.domain_for(url)
+        try:
+            logo_url = self._fetch(domain)
+        except Exception as e:
+            logger.error(f"Error fetching company logo for {url}: {str(e)}")
+            return None
+        self._store(domain, logo_url)
+        return logo_url
+
+    def _resolve_for_application(self, application_id, url):
+        with self._app.app_context():
+            logo_url = self.resolve(url)
+            if not logo_url:
+                return
+            # Only fill in the logo if the URL was not changed in the meantime
+            mongo.db.applications.update_one(
+                {'_id': ObjectId(application_id), 'url': url},
+                {'$set': {'company_logo': logo_url}}
+            )
+
+    def resolve_async(self, application_id, url):
+        """Resolve a website's logo in the background and fill in the application's company_logo"""
+        if self._app is None:
+            logger.warning("Logo resolver used before init_app; skipping logo lookup")
+            return
+
+        LOGO_LOOKUPS_PENDING.inc()
+        try:
+            future = self.executor.submit(self._resolve_for_application, str(application_id), url)
+        except RuntimeError as e:
+            LOGO_LOOKUPS_PENDING.dec()
+            logger.error(f"Could not queue logo lookup for {url}: {str(e)}")
+            return
+        self._report_threads()
+        future.add_done_callback(self._finished)
+
+    def live_threads(self):
+        """Number of resolver threads still running"""
+        if self._executor is None:
+            return 0
+        return sum(1 for thread in self._executor._threads if thread.is_alive())
+
+    def _report_threads(self):
+        LOGO_RESOLVER_THREADS.set(self.live_threads())
+
+    def _finished(self, future):
+        LOGO_LOOKUPS_PENDING.dec()
+        self._report_threads()
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Background logo lookup failed: {str(error)}")
+
+
+# Shared resolver, configured by create_app
+logo_resolver = LogoResolver()
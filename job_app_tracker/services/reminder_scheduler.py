@@ -0,0 +1,347 @@
+import heapq
+import logging
+import os
+import smtplib
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from job_app_tracker.config.mongodb import mongo
+
+logger = logging.getLogger('reminder_scheduler')
+
+
+class Notifier:
+    """Delivers reminder notifications; subclasses implement send()"""
+
+    def send(self, notifications):
+        """
+        Deliver a batch of notifications.
+
+        Args:
+            notifications: List of dicts with reminder_id, email, name, title,
+                           description, reminder_date, reminder_type, company
+                           and position
+
+        Returns:
+            list: reminder_ids of the notifications that were delivered
+        """
+        raise NotImplementedError
+
+
+class LogNotifier(Notifier):
+    """Logs notifications instead of sending them; keeps them in `sent` for inspection"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, notifications):
+        for notification in notifications:
+            logger.info(f"Reminder for {notification['email']}: {notification['title']} ({notification['reminder_date']})")
+        self.sent.extend(notifications)
+        return [notification['reminder_id'] for notification in notifications]
+
+
+class SMTPNotifier(Notifier):
+    """Emails notifications, using one SMTP connection per batch"""
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True, sender=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender or username
+        self.timeout = timeout
+
+    def _message(self, notification):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = notification['email']
+        message['Subject'] = f"Reminder: {notification['title']}"
+
+        lines = [f"Hi {notification.get('name') or 'there'},", '', notification['title']]
+        if notification.get('company'):
+            lines.append(f"Application: {notification.get('position') or ''} at {notification['company']}".replace('  ', ' '))
+        if notification.get('reminder_date'):
+            lines.append(f"When: {notification['reminder_date'].strftime('%Y-%m-%d %H:%M')}")
+        if notification.get('description'):
+            lines.extend(['', notification['description']])
+        message.set_content('\n'.join(lines))
+        return message
+
+    def send(self, notifications):
+        delivered = []
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for notification in notifications:
+                try:
+                    smtp.send_message(self._message(notification))
+                    delivered.append(notification['reminder_id'])
+                except smtplib.SMTPException as e:
+                    logger.error(f"Failed to email reminder {notification['reminder_id']}: {str(e)}")
+        return delivered
+
+
+def notifier_from_env():
+    """Build the notifier selected by REMINDER_NOTIFIER ('smtp' or 'log')"""
+    if os.environ.get('REMINDER_NOTIFIER', 'log').lower() == 'smtp':
+        return SMTPNotifier(
+            host=os.environ['SMTP_HOST'],
+            port=int(os.environ.get('SMTP_PORT', 587)),
+            username=os.environ.get('SMTP_USERNAME'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            use_tls=os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true',
+            sender=os.environ.get('SMTP_SENDER')
+        )
+    return LogNotifier()
+
+
+class ReminderScheduler:
+    """Fires notifications for due reminders.
+
+    Only the reminders due within the next `lookahead` are read from MongoDB,
+    at most `heap_size` at a time, using the pending_notification_reminder_date
+    index. They are kept in a heap ordered by reminder_date; each tick pops the
+    due ones, claims them and hands them to the notifier in batches.
+
+    A reminder is claimed with find_one_and_update, which sets claimed_by and
+    claimed_until only if no other worker holds an unexpired claim. Any number
+    of workers can run side by side and each reminder is sent once. A claim
+    that is never released, e.g. because its worker died, expires after
+    `claim_timeout` and the reminder is picked up again.
+
+    Every claim counts as an attempt. After `max_attempts` failed deliveries
+    or abandoned claims the reminder is marked as failed and no longer
+    retried. Claimed reminders are left out of the refill, so retries and
+    reminders held by a dead worker do not take the place of due ones.
+
+    Reminders more than `max_lateness` overdue when claimed are marked as
+    skipped instead of sent, so a backlog is not mailed out all at once.
+    """
+
+    def __init__(self, notifier, lookahead=timedelta(minutes=10), heap_size=5000, batch_size=100,
+                 claim_timeout=timedelta(minutes=5), max_lateness=timedelta(days=1),
+                 refill_interval=timedelta(minutes=1), max_attempts=5, worker_id=None):
+        self.notifier = notifier
+        self.lookahead = lookahead
+        self.heap_size = heap_size
+        self.batch_size = batch_size
+        self.claim_timeout = claim_timeout
+        self.max_lateness = max_lateness
+        self.refill_interval = refill_interval
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._heap = []
+        self._queued = set()
+        self._next_refill = None
+
+    @staticmethod
+    def pending_filter():
+        """Reminders that still need a notification; matches the partial index"""
+        return {'status': 'pending', 'notification_sent': False}
+
+    @staticmethod
+    def backfill():
+        """Mark reminders created before notifications existed as not yet notified"""
+        result = mongo.db.reminders.update_many(
+            {'notification_sent': {'$exists': False}},
+            {'$set': {'notification_sent': False}}
+        )
+        if result.modified_count:
+            logger.info(f"Backfilled notification_sent on {result.modified_count} reminders")
+
+    def _unclaimed(self, now):
+        """Conditions for a reminder that no worker holds and that has attempts left"""
+        return {
+            '$or': [{'claimed_until': {'$exists': False}}, {'claimed_until': {'$lt': now}}],
+            'notification_attempts': {'$not': {'$gte': self.max_attempts}}
+        }
+
+    def expire_claims(self, now):
+        """Give up on reminders whose last allowed claim expired without a delivery"""
+        query = self.pending_filter()
+        query.update({
+            'claimed_until': {'$lt': now},
+            'notification_attempts': {'$gte': self.max_attempts}
+        })
+        result = mongo.db.reminders.update_many(query, {
+            '$set': {'notification_sent': True, 'notification_failed': True, 'updated_at': now},
+            '$unset': {'claimed_by': '', 'claimed_until': ''}
+        })
+        if result.modified_count:
+            logger.warning(f"Gave up on {result.modified_count} reminders after {self.max_attempts} attempts")
+        return result.modified_count
+
+    def refill(self, now):
+        """Queue the unclaimed reminders due before now + lookahead that are not queued yet"""
+        self.expire_claims(now)
+        query = self.pending_filter()
+        query['reminder_date'] = {'$lte': now + self.lookahead}
+        query.update(self._unclaimed(now))
+        cursor = mongo.db.reminders.find(query, {'reminder_date': 1}).sort('reminder_date', 1).limit(self.heap_size)
+
+        added = 0
+        for reminder in cursor:
+            reminder_id = reminder['_id']
+            if reminder_id in self._queued:
+                continue
+            heapq.heappush(self._heap, (reminder['reminder_date'], reminder_id))
+            self._queued.add(reminder_id)
+            added += 1
+
+        self._next_refill = now + self.refill_interval
+        return added
+
+    def _claim(self, reminder_id, now):
+        query = self.pending_filter()
+        query.update(self._unclaimed(now))
+        query.update({'_id': reminder_id, 'reminder_date': {'$lte': now}})
+        return mongo.db.reminders.find_one_and_update(
+            query,
+            {
+                '$set': {'claimed_by': self.worker_id, 'claimed_until': now + self.claim_timeout},
+                '$inc': {'notification_attempts': 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _notifications(self, reminders):
+        """Join a batch of reminders with their users and applications"""
+        user_ids = {ObjectId(r['user_id']) for r in reminders if ObjectId.is_valid(r.get('user_id'))}
+        app_ids = {ObjectId(r['application_id']) for r in reminders if ObjectId.is_valid(r.get('application_id'))}
+        users = {
+            str(user['_id']): user
+            for user in mongo.db.users.find({'_id': {'$in': list(user_ids)}}, {'email': 1, 'name': 1})
+        }
+        applications = {
+            str(app['_id']): app
+            for app in mongo.db.applications.find({'_id': {'$in': list(app_ids)}}, {'company': 1, 'position': 1})
+        }
+
+        notifications = []
+        for reminder in reminders:
+            user = users.get(str(reminder.get('user_id')))
+            if not user or not user.get('email'):
+                continue
+            application = applications.get(str(reminder.get('application_id')), {})
+            notifications.append({
+                'reminder_id': str(reminder['_id']),
+                'email': user['email'],
+                'name': user.get('name'),
+                'title': reminder.get('title') or 'Reminder',
+                'description': reminder.get('description', ''),
+                'reminder_date': reminder.get('reminder_date'),
+                'reminder_type': reminder.get('reminder_type'),
+                'company': application.get('company'),
+                'position': application.get('position')
+            })
+        return notifications
+
+    def _finish(self, reminder_ids, now, **fields):
+        """Record the outcome for claimed reminders and release the claims"""
+        if not reminder_ids:
+            return
+        mongo.db.reminders.update_many(
+            {'_id': {'$in': [ObjectId(r) for r in reminder_ids]}, 'claimed_by': self.worker_id},
+            {
+                '$set': dict(fields, updated_at=now),
+                '$unset': {'claimed_by': '', 'claimed_until': ''}
+            }
+        )
+
+    def _retry_later(self, reminder_ids, now):
+        """Release claims after a failed delivery, keeping other workers off them until claim_timeout"""
+        if not reminder_ids:
+            return
+        mongo.db.reminders.update_many(
+            {'_id': {'$in': [ObjectId(r) for r in reminder_ids]}, 'claimed_by': self.worker_id},
+            {
+                '$set': {'claimed_until': now + self.claim_timeout},
+                '$unset': {'claimed_by': ''}
+            }
+        )
+
+    def _dispatch(self, reminders, now):
+        notifications = self._notifications(reminders)
+        try:
+            delivered = set(self.notifier.send(notifications)) if notifications else set()
+        except Exception as e:
+            logger.error(f"Notifier failed for a batch of {len(notifications)} reminders: {str(e)}")
+            delivered = set()
+
+        claimed = {str(r['_id']) for r in reminders}
+        addressable = {n['reminder_id'] for n in notifications}
+        self._finish(delivered, now, notification_sent=True, notified_at=now)
+        # No user or email to send to; nothing later would change that
+        self._finish(claimed - addressable, now, notification_sent=True, notification_skipped=True)
+        failed = addressable - delivered
+        exhausted = {str(r['_id']) for r in reminders if r.get('notification_attempts', 0) >= self.max_attempts}
+        self._finish(failed & exhausted, now, notification_sent=True, notification_failed=True)
+        # Other failed deliveries stay pending and are retried once the claim expires
+        self._retry_later(failed - exhausted, now)
+        return len(delivered)
+
+    def run_once(self, now=None):
+        """
+        Send the notifications that are due.
+
+        Returns:
+            int: Number of notifications delivered
+        """
+        now = now or datetime.now()
+        if self._next_refill is None or now >= self._next_refill:
+            self.refill(now)
+
+        sent = 0
+        batch = []
+        late = []
+        while self._heap and self._heap[0][0] <= now:
+            _, reminder_id = heapq.heappop(self._heap)
+            self._queued.discard(reminder_id)
+
+            reminder = self._claim(reminder_id, now)
+            if reminder is None:
+                # Sent, completed, rescheduled or claimed elsewhere since it was queued
+                continue
+            if reminder['reminder_date'] < now - self.max_lateness:
+                late.append(str(reminder['_id']))
+                continue
+
+            batch.append(reminder)
+            if len(batch) >= self.batch_size:
+                sent += self._dispatch(batch, now)
+                batch = []
+
+        if batch:
+            sent += self._dispatch(batch, now)
+        self._finish(late, now, notification_sent=True, notification_skipped=True)
+        return sent
+
+    def seconds_until_next(self, now=None, max_sleep=30):
+        """How long to sleep before the next reminder or refill is due"""
+        now = now or datetime.now()
+        wake_at = self._next_refill or now
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return min(max((wake_at - now).total_seconds(), 0.5), max_sleep)
+
+    def run_forever(self):
+        logger.info(f"Reminder scheduler {self.worker_id} started")
+        self.backfill()
+        while True:
+            try:
+                sent = self.run_once()
+                if sent:
+                    logger.info(f"Sent {sent} reminder notifications")
+            except Exception as e:
+                logger.error(f"Reminder scheduler tick failed: {str(e)}")
+            time.sleep(self.seconds_until_next())
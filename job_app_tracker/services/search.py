@@ -0,0 +1,158 @@
+import re
+from html import escape
+
+from job_app_tracker.config.mongodb import mongo
+
+# Highlights returned per hit, and characters of context around each
+MAX_HIGHLIGHTS = 3
+SNIPPET_CHARS = 120
+
+# Fields loaded for each hit; the text index covers these
+_PROJECTION = {
+    'score': {'$meta': 'textScore'},
+    'company': 1,
+    'position': 1,
+    'status': 1,
+    'date_applied': 1,
+    'company_logo': 1,
+    'tags': 1,
+    'notes': 1,
+    'notes_list.id': 1,
+    'notes_list.content': 1,
+    'interviews.id': 1,
+    'interviews.type': 1,
+    'interviews.notes': 1,
+    'documents.id': 1,
+    'documents.name': 1,
+    'documents.text': 1
+}
+
+_SUFFIXES = ('ing', 'ies', 'ied', 'es', 'ed', 's', 'y', 'e')
+_PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+_TERM_PATTERN = re.compile(r'\w+')
+
+
+def _stem(word):
+    """Rough stem, so 'engineering' highlights 'engineer' as MongoDB's stemmer would match it"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def highlight_pattern(query):
+    """
+    Regex matching the words of a $text search, or None if it has none.
+
+    Words prefixed with '-' are excluded from a $text search, so they are
+    not highlighted; words inside quoted phrases are.
+    """
+    phrases = _PHRASE_PATTERN.findall(query)
+    words = [word for word in _PHRASE_PATTERN.sub(' ', query).split() if not word.startswith('-')]
+    terms = {_stem(term.lower()) for text in words + phrases for term in _TERM_PATTERN.findall(text)}
+    if not terms:
+        return None
+    alternatives = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternatives})\w*', re.IGNORECASE)
+
+
+def snippet(text, pattern):
+    """
+    HTML-escaped excerpt of text around its first match, with matches in <mark>.
+
+    Returns None if nothing in text matches.
+    """
+    if not text:
+        return None
+    first = pattern.search(text)
+    if not first:
+        return None
+
+    start = max(first.start() - SNIPPET_CHARS // 3, 0)
+    end = min(start + SNIPPET_CHARS, len(text))
+    # Don't cut words in half
+    if start > 0:
+        space = text.find(' ', start, first.start())
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(' ', first.end(), end)
+        end = space if space != -1 else end
+
+    excerpt = text[start:end]
+    parts = []
+    position = 0
+    for match in pattern.finditer(excerpt):
+        parts.append(escape(excerpt[position:match.start()]))
+        parts.append(f"<mark>{escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(escape(excerpt[position:]))
+    return ('…' if start > 0 else '') + ''.join(parts).replace('\n', ' ') + ('…' if end < len(text) else '')
+
+
+def _highlights(app, pattern):
+    """Snippets of the fields of an application that match, most heavily weighted first"""
+    candidates = [
+        ('company', None, app.get('company')),
+        ('position', None, app.get('position')),
+        ('tags', None, ', '.join(tag for tag in app.get('tags') or [] if isinstance(tag, str)))
+    ]
+    notes_list = app.get('notes_list') or []
+    candidates += [('note', note.get('id'), note.get('content')) for note in notes_list]
+    if not notes_list:
+        # Applications created before notes_list only have the notes field
+        candidates.append(('note', None, app.get('notes')))
+    candidates += [('interview', interview.get('id'), interview.get('notes')) for interview in app.get('interviews') or []]
+    for document in app.get('documents') or []:
+        candidates.append(('document', document.get('id'), document.get('name')))
+        candidates.append(('document', document.get('id'), document.get('text')))
+
+    highlights = []
+    seen = set()
+    for field, item_id, text in candidates:
+        if (field, item_id) in seen or not isinstance(text, str):
+            continue
+        excerpt = snippet(text, pattern)
+        if excerpt:
+            seen.add((field, item_id))
+            highlights.append({'field': field, 'id': item_id, 'snippet': excerpt})
+            if len(highlights) == MAX_HIGHLIGHTS:
+                break
+    return highlights
+
+
+def search_applications(user_id, query, page=1, limit=20):
+    """
+    Search a user's applications, including their notes, interviews, tags
+    and the text extracted from their documents.
+
+    Uses the applications text index, which MongoDB keeps up to date on every
+    write, so nothing has to be reindexed when an application changes. Hits
+    are ranked by text score; the query supports "quoted phrases" and
+    -excluded words.
+
+    Returns:
+        tuple: (hits as dicts with their score and highlights,
+                next page number or None)
+    """
+    cursor = (mongo.db.applications
+              .find({'user_id': str(user_id), '$text': {'$search': query}}, _PROJECTION)
+              .sort([('score', {'$meta': 'textScore'})])
+              .skip((page - 1) * limit)
+              .limit(limit + 1))
+    docs = list(cursor)
+    next_page = page + 1 if len(docs) > limit else None
+
+    pattern = highlight_pattern(query)
+    hits = []
+    for app in docs[:limit]:
+        hits.append({
+            'id': str(app['_id']),
+            'company': app.get('company'),
+            'position': app.get('position'),
+            'status': app.get('status'),
+            'date_applied': app.get('date_applied'),
+            'company_logo': app.get('company_logo'),
+            'score': round(app.get('score', 0), 3),
+            'highlights': _highlights(app, pattern) if pattern else []
+        })
+    return hits, next_page
@@ -0,0 +1,401 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import gridfs
+from bson import ObjectId
+from flask import current_app, request, send_file
+from pymongo import ReturnDocument
+from werkzeug.wsgi import wrap_file
+
+from job_app_tracker.config.mongodb import mongo
+
+logger = logging.getLogger('storage')
+
+# Bytes read from an upload, written to storage and sent to a client at a time
+CHUNK_SIZE = 256 * 1024
+
+# GridFS bucket holding uploaded documents
+GRIDFS_BUCKET = 'documents'
+
+# Collection counting the document entries and thumbnails that refer to each stored file
+REFS_COLLECTION = 'stored_files'
+
+# How long a release may take to delete a file before its claim is considered abandoned
+RELEASE_TIMEOUT = timedelta(seconds=30)
+
+# Seconds between checks while waiting for a release to finish
+RELEASE_POLL_INTERVAL = 0.05
+
+# Content types shown in the browser; anything else, such as HTML or SVG an
+# uploader could put script in, is always served as a download
+INLINE_MIMETYPES = {'application/pdf', 'image/png', 'image/jpeg', 'text/plain'}
+
+
+class StoredFile:
+    """Where an uploaded file was stored"""
+
+    def __init__(self, backend, key, size, sha256):
+        self.backend = backend
+        self.key = key
+        self.size = size
+        self.sha256 = sha256
+
+
+class LocalStorage:
+    """Content-addressed storage on local (or shared network) disk.
+
+    Files are stored as <root>/objects/<first two hex digits>/<sha256>, so
+    uploading the same content twice stores it once. An upload is streamed
+    to a temporary file while it is hashed, then renamed into place.
+    """
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, 'objects', key[:2], key)
+
+    def save(self, stream):
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            path = self._path(key)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredFile(self.name, key, size, key)
+
+    def local_path(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+    def open(self, key):
+        """Open a stored file; returns (file object, size)"""
+        path = self._path(key)
+        return open(path, 'rb'), os.path.getsize(path)
+
+    def delete(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class GridFSStorage:
+    """Storage in a GridFS bucket, shared by every node using the database.
+
+    Each file records its SHA-256 in metadata. When the upload can be read
+    twice (werkzeug spools uploads to a temporary file), it is hashed first
+    and not uploaded at all if the same content is already stored.
+    """
+
+    name = 'gridfs'
+
+    def __init__(self, bucket_name=GRIDFS_BUCKET):
+        self.bucket_name = bucket_name
+
+    @property
+    def bucket(self):
+        return gridfs.GridFSBucket(mongo.db, bucket_name=self.bucket_name, chunk_size_bytes=CHUNK_SIZE)
+
+    @property
+    def files(self):
+        return mongo.db[f'{self.bucket_name}.files']
+
+    def _existing(self, sha256, exclude=None):
+        query = {'metadata.sha256': sha256}
+        if exclude is not None:
+            query['_id'] = {'$ne': exclude}
+        return self.files.find_one(query, {'_id': 1, 'length': 1})
+
+    def save(self, stream):
+        seekable = hasattr(stream, 'seekable') and stream.seekable()
+        if seekable:
+            start = stream.tell()
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+            sha256 = digest.hexdigest()
+            existing = self._existing(sha256)
+            if existing:
+                return StoredFile(self.name, str(existing['_id']), existing['length'], sha256)
+            stream.seek(start)
+            file_id = self.bucket.upload_from_stream('document', stream, metadata={'sha256': sha256})
+            size = self.files.find_one({'_id': file_id}, {'length': 1})['length']
+            return StoredFile(self.name, str(file_id), size, sha256)
+
+        # Hash while uploading, then drop the upload if it turns out to be a duplicate
+        hashing = _HashingReader(stream)
+        file_id = self.bucket.upload_from_stream('document', hashing)
+        sha256 = hashing.digest.hexdigest()
+        existing = self._existing(sha256, exclude=file_id)
+        if existing:
+            self.bucket.delete(file_id)
+            return StoredFile(self.name, str(existing['_id']), existing['length'], sha256)
+        self.files.update_one({'_id': file_id}, {'$set': {'metadata.sha256': sha256}})
+        return StoredFile(self.name, str(file_id), hashing.size, sha256)
+
+    def local_path(self, key):
+        return None
+
+    def open(self, key):
+        grid_out = self.bucket.open_download_stream(ObjectId(key))
+        return grid_out, grid_out.length
+
+    def delete(self, key):
+        try:
+            self.bucket.delete(ObjectId(key))
+        except gridfs.errors.NoFile:
+            pass
+
+
+def legacy_path(document):
+    """Path of a document saved straight into UPLOAD_FOLDER, if it is still there"""
+    path = document.get('file_path')
+    root = os.path.realpath(current_app.config['UPLOAD_FOLDER'])
+    if not path or not os.path.realpath(path).startswith(root + os.sep) or not os.path.exists(path):
+        return None
+    return path
+
+
+class _HashingReader:
+    """File-like wrapper that hashes what is read through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+
+class DocumentStorage:
+    """Stores uploaded application documents.
+
+    New uploads go to the backend named by DOCUMENT_STORAGE ('local' or
+    'gridfs'). Each document entry records its backend and key, so
+    documents stored before a switch can still be read. Both backends
+    deduplicate by SHA-256.
+
+    Every file has a reference count in the stored_files collection. save()
+    and retain() take a reference, release() drops one and deletes the file
+    with the last one. The delete runs under a claim on the count: a save
+    of the same content that lands while the file is being deleted waits
+    for the release to finish and stores the file again.
+
+    Configuration (read in init_app):
+        DOCUMENT_STORAGE       Backend for new uploads, 'local' by default
+        DOCUMENT_STORAGE_PATH  Root directory of the local backend;
+                               UPLOAD_FOLDER by default
+    """
+
+    def __init__(self):
+        self.default = 'local'
+        self.backends = {}
+
+    def init_app(self, app):
+        self.default = app.config.get('DOCUMENT_STORAGE', 'local')
+        root = app.config.get('DOCUMENT_STORAGE_PATH') or app.config['UPLOAD_FOLDER']
+        self.backends = {
+            LocalStorage.name: LocalStorage(root),
+            GridFSStorage.name: GridFSStorage()
+        }
+        if self.default not in self.backends:
+            raise ValueError(f"Unknown DOCUMENT_STORAGE: {self.default}")
+
+    def backend(self, name=None):
+        return self.backends[name or self.default]
+
+    @staticmethod
+    def _refs():
+        return mongo.db[REFS_COLLECTION]
+
+    @staticmethod
+    def _ref_id(backend, key):
+        return f"{backend}:{key}"
+
+    def save(self, stream):
+        """
+        Store an upload without reading it into memory and take a reference
+        to it; returns a StoredFile.
+
+        The stream is read again if a release was deleting the same content
+        meanwhile, so it must be seekable.
+        """
+        start = stream.tell()
+        backend = self.backend()
+        while True:
+            stored = backend.save(stream)
+            ref_id = self._ref_id(stored.backend, stored.key)
+            ref = self._refs().find_one_and_update(
+                {'_id': ref_id}, {'$inc': {'refs': 1}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+            if not ref.get('deleting'):
+                return stored
+            # Claimed for deletion before this reference was taken; the file
+            # may be gone once the release finishes, so store it again
+            self._wait_for_release(ref_id, ref['deleting'], ref.get('deleting_since'))
+            self._refs().update_one({'_id': ref_id}, {'$inc': {'refs': -1}})
+            stream.seek(start)
+
+    def _wait_for_release(self, ref_id, token, since):
+        """Wait until the release holding the claim `token` has finished, or its claim expired"""
+        deadline = (since or datetime.now()) + RELEASE_TIMEOUT
+        while datetime.now() < deadline:
+            ref = self._refs().find_one({'_id': ref_id}, {'deleting': 1})
+            if ref is None or ref.get('deleting') != token:
+                return
+            time.sleep(RELEASE_POLL_INTERVAL)
+        logger.warning(f"Release of {ref_id} did not finish; dropping its claim")
+        self._refs().update_one({'_id': ref_id, 'deleting': token}, {'$unset': {'deleting': '', 'deleting_since': ''}})
+
+    def retain(self, backend, key):
+        """
+        Take another reference to a stored file, e.g. a thumbnail shared with
+        another document.
+
+        Returns:
+            bool: False if the file is unknown or being deleted
+        """
+        ref = self._refs().find_one_and_update(
+            {'_id': self._ref_id(backend, key), 'deleting': {'$exists': False}},
+            {'$inc': {'refs': 1}}
+        )
+        return ref is not None
+
+    def release(self, backend, key):
+        """Drop a reference to a stored file, deleting the file with the last one"""
+        refs = self._refs()
+        ref_id = self._ref_id(backend, key)
+        ref = refs.find_one_and_update({'_id': ref_id}, {'$inc': {'refs': -1}}, return_document=ReturnDocument.AFTER)
+        if ref is None:
+            # Stored before files were reference counted
+            in_use = mongo.db.applications.find_one(
+                {'$or': [{'documents.storage_key': key}, {'documents.thumbnail.key': key}]},
+                {'_id': 1}
+            )
+            if in_use:
+                return False
+            self.backend(backend).delete(key)
+            return True
+        if ref['refs'] > 0:
+            return False
+
+        token = ObjectId()
+        claimed = refs.find_one_and_update(
+            {'_id': ref_id, 'refs': {'$lte': 0}, 'deleting': {'$exists': False}},
+            {'$set': {'deleting': token, 'deleting_since': datetime.now()}}
+        )
+        if claimed is None:
+            # Referenced again, or another release is deleting it
+            return False
+        try:
+            self.backend(backend).delete(key)
+        finally:
+            if not refs.delete_one({'_id': ref_id, 'deleting': token, 'refs': {'$lte': 0}}).deleted_count:
+                # A save took a reference meanwhile and stores the file again
+                refs.update_one({'_id': ref_id, 'deleting': token}, {'$unset': {'deleting': '', 'deleting_since': ''}})
+        return True
+
+    def release_documents(self, documents):
+        """Release the stored files and thumbnails of deleted document entries"""
+        for document in documents:
+            try:
+                if document.get('storage_key'):
+                    self.release(document.get('storage'), document['storage_key'])
+                if document.get('thumbnail'):
+                    self.release(document['thumbnail']['storage'], document['thumbnail']['key'])
+            except Exception as e:
+                # A leaked file costs disk space only; the deletion itself went through
+                logger.error(f"Failed to release files of document {document.get('id')}: {str(e)}")
+
+    def send(self, document, as_attachment=False):
+        """
+        Response serving a document, with Range support, or None if its file is missing.
+
+        Files on local disk go through send_file, so they are served with
+        sendfile by the WSGI server, or by the front-end server when
+        USE_X_SENDFILE is on. Files in GridFS are streamed chunk by chunk,
+        seeking to the requested range.
+
+        The content type is the one given at upload, so only INLINE_MIMETYPES
+        are shown inline, and the browser is told not to guess another type.
+        """
+        key = document.get('storage_key')
+        download_name = document.get('name') or key
+        mimetype = document.get('file_type') or 'application/octet-stream'
+        if mimetype.split(';')[0].strip().lower() not in INLINE_MIMETYPES:
+            as_attachment = True
+
+        if not key:
+            # Uploaded before documents had a storage backend
+            path = legacy_path(document)
+            if not path:
+                return None
+            response = send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                                 download_name=download_name, conditional=True)
+            return self._protect(response, mimetype)
+
+        backend = self.backend(document.get('storage'))
+        path = backend.local_path(key)
+        if path:
+            response = send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                                 download_name=download_name, conditional=True, etag=key)
+            return self._protect(response, mimetype)
+
+        try:
+            stream, size = backend.open(key)
+        except (OSError, gridfs.errors.NoFile):
+            return None
+        response = current_app.response_class(
+            wrap_file(request.environ, stream, CHUNK_SIZE),
+            mimetype=mimetype,
+            direct_passthrough=True
+        )
+        response.content_length = size
+        response.set_etag(key)
+        disposition = 'attachment' if as_attachment else 'inline'
+        response.headers.set('Content-Disposition', disposition, filename=download_name)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=size)
+        return self._protect(response, mimetype)
+
+    @staticmethod
+    def _protect(response, mimetype):
+        """Keep an uploaded file from running script in the app's origin"""
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        # Browsers refuse to show a sandboxed PDF, and a PDF viewer's script does not run in the app's origin
+        if not mimetype.lower().startswith('application/pdf'):
+            response.headers['Content-Security-Policy'] = 'sandbox'
+        return response
+
+
+# Shared storage, configured in create_app
+document_storage = DocumentStorage()
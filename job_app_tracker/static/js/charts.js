@@ -25,10 +25,16 @@ async function fetchStatusCounts() {
     }
 }
 
+// Pick a bucket size that keeps the number of points on the chart manageable
+function granularityForRange(days) {
+    if (days === 'all') return 'month';
+    return parseInt(days, 10) > 90 ? 'week' : 'day';
+}
+
 // Function to fetch timeline data from the API
-async function fetchTimelineData(days = 28) {
+async function fetchTimelineData(days = 28, granularity = granularityForRange(days)) {
     try {
-        const response = await fetch(`/api/applications/timeline?days=${days}`);
+        const response = await fetch(`/api/applications/timeline?days=${days}&granularity=${granularity}`);
         if (!response.ok) {
             throw new Error('Failed to fetch timeline data');
         }
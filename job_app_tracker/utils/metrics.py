@@ -0,0 +1,245 @@
+import hmac
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+from pymongo.monitoring import ConnectionPoolListener
+
+from job_app_tracker.utils.query_profiler import query_profiler
+
+logger = logging.getLogger('metrics')
+
+# With gunicorn, every worker writes its values to files in this directory
+# (set in gunicorn.conf.py before prometheus_client is imported) and
+# /metrics adds them up. Without it, values live in process memory.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUEST_LATENCY = Histogram(
+    'applizz_http_request_duration_seconds',
+    'Time to handle a request, by route',
+    ['blueprint', 'endpoint', 'method', 'status']
+)
+REQUEST_DB_TIME = Histogram(
+    'applizz_http_request_db_seconds',
+    'Time a request spent waiting on MongoDB, by route',
+    ['blueprint', 'endpoint'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+REQUEST_DB_COMMANDS = Histogram(
+    'applizz_http_request_db_commands',
+    'MongoDB commands issued by a request, by route',
+    ['blueprint', 'endpoint'],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+# Counted by the web routes that create applications; imports and sample data
+# added from the command line run in their own process and are not exported
+APPLICATIONS_CREATED = Counter(
+    'applizz_applications_created_total',
+    'Applications created in the web app, whether by hand, from an email suggestion or by an import'
+)
+SUGGESTIONS_ACCEPTED = Counter(
+    'applizz_email_suggestions_accepted_total',
+    'Email suggestions accepted, by type (new application or status update)',
+    ['type']
+)
+
+POOL_CONNECTIONS = Gauge(
+    'applizz_mongo_pool_connections',
+    'Open MongoDB connections, by server',
+    ['server'],
+    multiprocess_mode='livesum'
+)
+POOL_IN_USE = Gauge(
+    'applizz_mongo_pool_connections_in_use',
+    'MongoDB connections checked out of the pool, by server',
+    ['server'],
+    multiprocess_mode='livesum'
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    'applizz_mongo_pool_checkout_seconds',
+    'Time to check a connection out of the pool',
+    ['server'],
+    buckets=(.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .5, 1)
+)
+POOL_CHECKOUT_FAILURES = Counter(
+    'applizz_mongo_pool_checkout_failures_total',
+    'Connection checkouts that failed, by server and reason',
+    ['server', 'reason']
+)
+
+LOGO_LOOKUPS_PENDING = Gauge(
+    'applizz_logo_lookups_pending',
+    'Background logo lookups queued or running',
+    multiprocess_mode='livesum'
+)
+LOGO_RESOLVER_THREADS = Gauge(
+    'applizz_logo_resolver_threads',
+    'Live logo resolver threads; lookups pending with none alive are stuck',
+    multiprocess_mode='livesum'
+)
+
+
+def _server(address):
+    return f"{address[0]}:{address[1]}"
+
+
+class PoolMetricsListener(ConnectionPoolListener):
+    """Feeds MongoDB connection pool events into the Prometheus metrics"""
+
+    def __init__(self):
+        self._checkout_started = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.at = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        server = _server(event.address)
+        POOL_IN_USE.labels(server).inc()
+        started = getattr(self._checkout_started, 'at', None)
+        if started is not None:
+            POOL_CHECKOUT_WAIT.labels(server).observe(time.perf_counter() - started)
+
+    def connection_check_out_failed(self, event):
+        POOL_CHECKOUT_FAILURES.labels(_server(event.address), str(event.reason)).inc()
+
+    def connection_checked_in(self, event):
+        POOL_IN_USE.labels(_server(event.address)).dec()
+
+    def connection_created(self, event):
+        POOL_CONNECTIONS.labels(_server(event.address)).inc()
+
+    def connection_closed(self, event):
+        POOL_CONNECTIONS.labels(_server(event.address)).dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class BacklogCollector:
+    """Health of the background workers, read from MongoDB when /metrics is scraped.
+
+    Job and reminder workers run as separate processes, possibly on other
+    machines, so their health is measured by what they leave behind: jobs
+    waiting or stuck with an expired lease, and reminders past due that no
+    worker has sent. The logo resolver runs inside each web worker instead,
+    so it reports through the LOGO_* gauges, added up like the pool gauges.
+    """
+
+    def collect(self):
+        from job_app_tracker.config.mongodb import mongo
+
+        now = datetime.now()
+        jobs = GaugeMetricFamily('applizz_background_jobs', 'Queued and running background jobs', labels=['type', 'status'])
+        stale = GaugeMetricFamily('applizz_background_jobs_stale', 'Running jobs whose worker stopped renewing the lease', labels=['type'])
+        oldest = GaugeMetricFamily('applizz_background_job_oldest_queued_seconds', 'Age of the oldest queued job', labels=['type'])
+        reminders = GaugeMetricFamily('applizz_reminders_due', 'Reminders past due that have not been sent')
+        scrape_error = GaugeMetricFamily('applizz_backlog_scrape_error', 'Whether reading the backlog from MongoDB failed')
+        try:
+            rows = mongo.db.jobs.aggregate([
+                {'$match': {'status': {'$in': ['queued', 'running']}}},
+                {'$group': {
+                    '_id': {'type': '$type', 'status': '$status'},
+                    'count': {'$sum': 1},
+                    'oldest': {'$min': '$created_at'},
+                    'stale': {'$sum': {'$cond': [{'$lt': ['$lease_until', now]}, 1, 0]}}
+                }}
+            ])
+            for row in rows:
+                job_type, status = row['_id']['type'], row['_id']['status']
+                jobs.add_metric([job_type, status], row['count'])
+                if status == 'running':
+                    stale.add_metric([job_type], row['stale'])
+                elif row.get('oldest'):
+                    oldest.add_metric([job_type], (now - row['oldest']).total_seconds())
+            reminders.add_metric([], mongo.db.reminders.count_documents(
+                {'status': 'pending', 'notification_sent': False, 'reminder_date': {'$lte': now}}
+            ))
+            scrape_error.add_metric([], 0)
+        except Exception as e:
+            logger.warning(f"Could not read the background backlog: {str(e)}")
+            scrape_error.add_metric([], 1)
+        return [jobs, stale, oldest, reminders, scrape_error]
+
+
+class Metrics:
+    """Prometheus metrics for the web app, served at /metrics.
+
+    Records the latency, database time and command count of every request by
+    blueprint and endpoint, using the query profiler for the database part.
+
+    Configuration (read in init_app):
+        METRICS_TOKEN  If set, /metrics requires "Authorization: Bearer <token>"
+    """
+
+    def __init__(self):
+        self.token = None
+        self.backlog = BacklogCollector()
+        self.pool_listener = PoolMetricsListener()
+        self._backlog_registered = False
+
+    def init_app(self, app):
+        self.token = app.config.get('METRICS_TOKEN')
+        if not MULTIPROCESS and not self._backlog_registered:
+            REGISTRY.register(self.backlog)
+            self._backlog_registered = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.serve)
+
+    @staticmethod
+    def _before_request():
+        g.metrics_started_at = time.perf_counter()
+
+    @staticmethod
+    def _after_request(response):
+        started = g.pop('metrics_started_at', None)
+        if started is None or request.endpoint == 'metrics':
+            return response
+        # Unmatched URLs are grouped, so random paths don't create new series
+        blueprint = request.blueprint or ''
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(blueprint, endpoint, request.method, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+        profile = query_profiler.current()
+        if profile is not None:
+            REQUEST_DB_TIME.labels(blueprint, endpoint).observe(profile.db_ms / 1000)
+            REQUEST_DB_COMMANDS.labels(blueprint, endpoint).observe(profile.command_count)
+        return response
+
+    def serve(self):
+        if self.token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f"Bearer {self.token}"):
+                return "Unauthorized", 401
+
+        if MULTIPROCESS:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            registry.register(self.backlog)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+# Shared metrics, configured in create_app
+metrics = Metrics()
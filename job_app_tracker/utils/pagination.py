@@ -0,0 +1,69 @@
+import base64
+from datetime import datetime
+
+from bson import Decimal128, Int64, ObjectId, json_util
+
+def encode_cursor(value, doc_id):
+    """Encode the sort value and _id of the last item on a page as an opaque cursor"""
+    payload = json_util.dumps({'v': value, 'id': doc_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor into (value, _id)"""
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return payload['v'], payload['id']
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# Scalar BSON types in the order MongoDB sorts them, after null. $lt and $gt
+# only match values of the same type as the cursor's, so values of the types
+# that sort after it are matched by type.
+SORT_TYPE_ORDER = ['number', 'string', 'objectId', 'bool', 'date']
+
+def _sort_type(value):
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float, Int64, Decimal128)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, datetime):
+        return 'date'
+    if isinstance(value, ObjectId):
+        return 'objectId'
+    return None
+
+def keyset_filter(field, direction, cursor):
+    """
+    Build a query matching the items that come after a cursor when sorting
+    by (field, _id) in the given direction.
+
+    MongoDB sorts null/missing values before everything else, so they come
+    first in ascending order and last in descending order. Values of other
+    types sort by type first, e.g. a date_applied stored as a string by older
+    code comes after every date in descending order, so those are included
+    by type.
+    """
+    value, doc_id = decode_cursor(cursor)
+    after = '$gt' if direction == 1 else '$lt'
+
+    if value is None:
+        clauses = [{field: None, '_id': {after: doc_id}}]
+        if direction == 1:
+            # Past the null values, every non-null value follows
+            clauses.append({field: {'$ne': None}})
+        return {'$or': clauses}
+
+    clauses = [
+        {field: {after: value}},
+        {field: value, '_id': {after: doc_id}}
+    ]
+    value_type = _sort_type(value)
+    if value_type in SORT_TYPE_ORDER:
+        position = SORT_TYPE_ORDER.index(value_type)
+        following = SORT_TYPE_ORDER[position + 1:] if direction == 1 else SORT_TYPE_ORDER[:position]
+        clauses.extend({field: {'$type': name}} for name in following)
+    if direction == -1:
+        clauses.append({field: None})
+    return {'$or': clauses}
@@ -0,0 +1,215 @@
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+
+from flask import g, request
+from pymongo.monitoring import CommandListener
+
+logger = logging.getLogger('query_profiler')
+
+# Commands that carry no query of the app's own
+IGNORED_COMMANDS = {'endSessions', 'hello', 'isMaster', 'ismaster', 'saslStart', 'saslContinue', 'killCursors'}
+
+# Where each command names its collection and its filter
+_FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query'
+}
+_BULK_FIELDS = {
+    'update': ('updates', 'q'),
+    'delete': ('deletes', 'q')
+}
+
+# Commands kept in full per request; later ones are only counted
+MAX_RECORDED_COMMANDS = 200
+
+_current = contextvars.ContextVar('query_profile', default=None)
+
+
+def filter_shape(value):
+    """A query with its values replaced by '?', e.g. {'user_id': '?', 'date': {'$gte': '?'}}"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in lists and the like: one placeholder, so lists of any length share a shape
+        shapes = [filter_shape(item) for item in value]
+        if all(shape == '?' for shape in shapes):
+            return ['?'] if shapes else []
+        return shapes
+    return '?'
+
+
+def _pipeline_shape(pipeline):
+    shape = []
+    for stage in pipeline or []:
+        name = next(iter(stage), None)
+        shape.append({name: filter_shape(stage[name])} if name == '$match' else name)
+    return shape
+
+
+def describe_command(name, command):
+    """(collection, filter shape) of a command as sent to the server"""
+    if name == 'getMore':
+        return command.get('collection'), None
+    collection = command.get(name)
+    collection = collection if isinstance(collection, str) else None
+    if name in _FILTER_FIELDS:
+        return collection, filter_shape(command.get(_FILTER_FIELDS[name]) or {})
+    if name == 'aggregate':
+        return collection, _pipeline_shape(command.get('pipeline'))
+    if name in _BULK_FIELDS:
+        field, key = _BULK_FIELDS[name]
+        statements = command.get(field) or []
+        return collection, filter_shape(statements[0].get(key, {})) if statements else None
+    return collection, None
+
+
+def _documents_returned(name, reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    if name == 'findAndModify':
+        return 1 if reply.get('value') else 0
+    if name == 'distinct':
+        return len(reply.get('values', []))
+    return reply.get('n')
+
+
+class RequestProfile:
+    """The database commands issued while handling one request"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.commands = []
+        self.command_count = 0
+        self.db_ms = 0.0
+        self.shapes = Counter()
+        self._pending = {}
+
+    def start(self, event):
+        collection, shape = describe_command(event.command_name, event.command)
+        self._pending[event.request_id] = {
+            'collection': collection,
+            'operation': event.command_name,
+            'filter': shape
+        }
+
+    def finish(self, event, reply=None, failure=None):
+        command = self._pending.pop(event.request_id, None)
+        if command is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        self.command_count += 1
+        self.db_ms += duration_ms
+        self.shapes[json.dumps([command['collection'], command['operation'], command['filter']], sort_keys=True)] += 1
+        if len(self.commands) < MAX_RECORDED_COMMANDS:
+            command['duration_ms'] = round(duration_ms, 3)
+            if failure is not None:
+                command['error'] = str(failure.get('errmsg', failure))
+            else:
+                command['documents'] = _documents_returned(event.command_name, reply or {})
+            self.commands.append(command)
+
+    def repeated(self):
+        """Query shapes issued more than once in the request, the mark of an N+1 loop"""
+        return [
+            {'query': json.loads(shape), 'count': count}
+            for shape, count in self.shapes.most_common() if count > 1
+        ]
+
+
+class QueryProfiler(CommandListener):
+    """Records every MongoDB command issued during a Flask request.
+
+    pymongo runs command listeners in the thread that issued the command, so
+    the profile of the current request is kept in a context variable set by
+    a before_request hook. Commands outside a request (job workers, scripts)
+    are not recorded.
+
+    Each response gets a Server-Timing header with the database time and
+    command count, and requests whose database time passes
+    SLOW_REQUEST_DB_MS are logged as JSON with every command they issued.
+
+    Configuration (read in init_app):
+        QUERY_PROFILER       Profile requests; true by default
+        SLOW_REQUEST_DB_MS   Database time above which a request is logged, 100 by default
+        SERVER_TIMING        Add the Server-Timing header; true by default
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.slow_ms = 100.0
+        self.server_timing = True
+
+    def init_app(self, app):
+        self.enabled = str(app.config.get('QUERY_PROFILER', 'true')).lower() == 'true'
+        self.slow_ms = float(app.config.get('SLOW_REQUEST_DB_MS', self.slow_ms))
+        self.server_timing = str(app.config.get('SERVER_TIMING', 'true')).lower() == 'true'
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def current():
+        """The profile of the request being handled, or None"""
+        return _current.get()
+
+    def _before_request(self):
+        g.query_profile_token = _current.set(RequestProfile())
+
+    def _after_request(self, response):
+        profile = _current.get()
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile.started_at) * 1000
+
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={profile.db_ms:.1f};desc="{profile.command_count} queries", app;dur={total_ms:.1f}'
+            )
+
+        if profile.db_ms >= self.slow_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'db_ms': round(profile.db_ms, 1),
+                'queries': profile.command_count,
+                'repeated': profile.repeated(),
+                'commands': profile.commands
+            }, default=str))
+        return response
+
+    def _teardown_request(self, exc):
+        token = g.pop('query_profile_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None and event.command_name not in IGNORED_COMMANDS:
+            profile.start(event)
+
+    def succeeded(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.finish(event, reply=event.reply)
+
+    def failed(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.finish(event, failure=event.failure)
+
+
+# Shared profiler, registered as a listener on the MongoDB client
+query_profiler = QueryProfiler()
@@ -0,0 +1,34 @@
+import mongomock
+import pytest
+
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.user import User
+from tests.imap_server import FakeImapServer
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """An in-memory database in place of MongoDB, empty for each test"""
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mongo, 'cx', client, raising=False)
+    monkeypatch.setattr(mongo, 'db', client['applizz_test'], raising=False)
+    User._cache.clear()
+    yield mongo.db
+    User._cache.clear()
+
+
+@pytest.fixture
+def imap_server():
+    """A local IMAP server with an empty mailbox"""
+    server = FakeImapServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def imap_env(monkeypatch, imap_server):
+    """Point scans at the local IMAP server, as IMAP_HOST does for development"""
+    monkeypatch.setenv('IMAP_HOST', '127.0.0.1')
+    monkeypatch.setenv('IMAP_PORT', str(imap_server.port))
+    monkeypatch.setenv('IMAP_SSL', 'false')
+    return imap_server
@@ -0,0 +1,221 @@
+"""A small IMAP4rev1 server for tests.
+
+It speaks just enough of the protocol for ImapFetcher and imaplib: LOGIN,
+CAPABILITY, SELECT/EXAMINE with UIDVALIDITY and UIDNEXT, UID SEARCH (UID
+ranges and SINCE), UID FETCH of header fields and partial bodies, NOOP and
+LOGOUT. It records every UID whose headers or body it sent, so tests can
+check that nothing is downloaded twice.
+"""
+import re
+import socketserver
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import format_datetime, parsedate_to_datetime
+
+_ATOM = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+_PARTIAL = re.compile(r'BODY\.PEEK\[\]<(\d+)\.(\d+)>')
+_HEADER_FIELDS = re.compile(r'BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]')
+
+
+def make_message(subject, from_email, body, date=None, message_id=None):
+    """Raw bytes of a plain-text email"""
+    message = EmailMessage()
+    message['Subject'] = subject
+    message['From'] = from_email
+    message['To'] = 'me@example.com'
+    message['Date'] = format_datetime(date or datetime.now().astimezone())
+    if message_id:
+        message['Message-ID'] = message_id
+    message.set_content(body)
+    return message.as_bytes()
+
+
+class Mailbox:
+    """Messages by UID, with the mailbox's UIDVALIDITY"""
+
+    def __init__(self, uid_validity=1):
+        self.uid_validity = uid_validity
+        self.messages = {}
+        self.uid_next = 1
+
+    def append(self, raw):
+        uid = self.uid_next
+        self.messages[uid] = raw
+        self.uid_next += 1
+        return uid
+
+    def reset(self, uid_validity):
+        """Renumber every message, as a server does when UIDVALIDITY changes"""
+        messages = [self.messages[uid] for uid in sorted(self.messages)]
+        self.uid_validity = uid_validity
+        self.messages = {}
+        self.uid_next = 1
+        for raw in messages:
+            self.append(raw)
+
+
+def _uids_in(sequence_set, uids):
+    highest = max(uids) if uids else 0
+    selected = set()
+    for part in sequence_set.split(','):
+        if ':' in part:
+            start, end = part.split(':')
+            start = highest if start == '*' else int(start)
+            end = highest if end == '*' else int(end)
+            low, high = min(start, end), max(start, end)
+            selected.update(uid for uid in uids if low <= uid <= high)
+        else:
+            uid = highest if part == '*' else int(part)
+            if uid in uids:
+                selected.add(uid)
+    return sorted(selected)
+
+
+def _header_fields(raw, names):
+    wanted = {name.lower() for name in names}
+    header = raw.split(b'\r\n\r\n', 1)[0].split(b'\n\n', 1)[0]
+    lines = []
+    keep = False
+    for line in header.splitlines():
+        if line[:1] in (b' ', b'\t'):
+            if keep:
+                lines.append(line)
+            continue
+        keep = line.split(b':', 1)[0].decode('ascii', 'replace').lower() in wanted
+        if keep:
+            lines.append(line)
+    return b'\r\n'.join(lines) + b'\r\n\r\n'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def send(self, line):
+        self.wfile.write(line if isinstance(line, bytes) else line.encode())
+        self.wfile.write(b'\r\n')
+
+    def handle(self):
+        server = self.server.imap
+        self.send('* OK [CAPABILITY IMAP4rev1] Test IMAP server ready')
+        authenticated = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            words = [re.sub(r'\\(.)', r'\1', quoted) if not unquoted else unquoted
+                     for quoted, unquoted in _ATOM.findall(line.decode().strip())]
+            if len(words) < 2:
+                continue
+            tag, command, args = words[0], words[1].upper(), words[2:]
+
+            if command == 'CAPABILITY':
+                self.send('* CAPABILITY IMAP4rev1')
+                self.send(f'{tag} OK CAPABILITY completed')
+            elif command == 'LOGIN':
+                if tuple(args) != (server.username, server.password):
+                    self.send(f'{tag} NO [AUTHENTICATIONFAILED] Invalid credentials')
+                    continue
+                authenticated = True
+                server.logins += 1
+                self.send(f'{tag} OK LOGIN completed')
+            elif command == 'NOOP':
+                self.send(f'{tag} OK NOOP completed')
+            elif command == 'LOGOUT':
+                self.send('* BYE Logging out')
+                self.send(f'{tag} OK LOGOUT completed')
+                return
+            elif not authenticated:
+                self.send(f'{tag} NO Not authenticated')
+            elif command in ('SELECT', 'EXAMINE'):
+                mailbox = server.mailbox
+                self.send(f'* {len(mailbox.messages)} EXISTS')
+                self.send(f'* OK [UIDVALIDITY {mailbox.uid_validity}] UIDs valid')
+                self.send(f'* OK [UIDNEXT {mailbox.uid_next}] Predicted next UID')
+                self.send(f'{tag} OK [READ-ONLY] {command} completed')
+            elif command == 'UID' and args and args[0].upper() == 'SEARCH':
+                self._search(tag, args[1:])
+            elif command == 'UID' and args and args[0].upper() == 'FETCH':
+                self._fetch(tag, args[1], ' '.join(args[2:]))
+            else:
+                self.send(f'{tag} BAD Unsupported command')
+
+    def _search(self, tag, criteria):
+        server = self.server.imap
+        uids = sorted(server.mailbox.messages)
+        if criteria[0].upper() == 'UID':
+            found = _uids_in(criteria[1], uids)
+        elif criteria[0].upper() == 'SINCE':
+            since = datetime.strptime(criteria[1], '%d-%b-%Y').date()
+            found = []
+            for uid in uids:
+                raw = server.mailbox.messages[uid]
+                date = _header_fields(raw, ['Date']).decode().partition(':')[2].strip()
+                if parsedate_to_datetime(date).date() >= since:
+                    found.append(uid)
+        else:
+            found = uids
+        server.searches.append(criteria)
+        self.send('* SEARCH' + ''.join(f' {uid}' for uid in found))
+        self.send(f'{tag} OK SEARCH completed')
+
+    def _fetch(self, tag, sequence_set, items):
+        server = self.server.imap
+        mailbox = server.mailbox
+        partial = _PARTIAL.search(items)
+        fields = _HEADER_FIELDS.search(items)
+        for sequence, uid in enumerate(_uids_in(sequence_set, sorted(mailbox.messages)), start=1):
+            raw = mailbox.messages[uid]
+            if fields:
+                data = _header_fields(raw, fields.group(1).split())
+                name = f'BODY[HEADER.FIELDS ({fields.group(1)})]'
+                server.fetched_headers.append(uid)
+            elif partial:
+                start, length = int(partial.group(1)), int(partial.group(2))
+                data = raw[start:start + length]
+                name = f'BODY[]<{start}>'
+                server.fetched_bodies.append(uid)
+            else:
+                self.send(f'{tag} BAD Unsupported FETCH items')
+                return
+            self.wfile.write(f'* {sequence} FETCH (UID {uid} {name} {{{len(data)}}}\r\n'.encode())
+            self.wfile.write(data)
+            self.send(')')
+        self.send(f'{tag} OK FETCH completed')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeImapServer:
+    """Serves one mailbox on localhost, in a background thread"""
+
+    def __init__(self, username='me@example.com', password='app-password'):
+        self.username = username
+        self.password = password
+        self.mailbox = Mailbox()
+        self.logins = 0
+        self.searches = []
+        self.fetched_headers = []
+        self.fetched_bodies = []
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.imap = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        self.searches = []
+        self.fetched_headers = []
+        self.fetched_bodies = []
@@ -0,0 +1,32 @@
+from job_app_tracker.services import email_service
+from job_app_tracker.services.email_classifier import EmailClassifier
+from job_app_tracker.services.email_service import EmailService, _analysis_memory
+
+EMAIL = ('Interview invitation for the Backend Engineer role at Acme',
+         'We would like to schedule an interview with you.',
+         'recruiting@acme.com')
+
+
+def test_training_changes_the_classifier_version():
+    classifier = EmailClassifier()
+    version = classifier.version
+    assert EmailClassifier().version == version
+
+    classifier.fit([EMAIL], ['Interview'], epochs=1)
+    assert classifier.version != version
+
+
+def test_cached_analysis_is_not_reused_by_another_model(db, monkeypatch):
+    _analysis_memory.clear()
+    subject, body, from_email = EMAIL
+    content_hash = EmailService._content_hash(subject, body, from_email)
+    EmailService._cache_email('email-1', 'user-1', {'is_job_related': True}, content_hash)
+    assert EmailService._get_cached_email('email-1', 'user-1', content_hash) == {'is_job_related': True}
+
+    retrained = EmailClassifier()
+    retrained.fit([EMAIL], ['Rejected'], epochs=1)
+    monkeypatch.setattr(email_service, 'email_classifier', retrained)
+
+    new_hash = EmailService._content_hash(subject, body, from_email)
+    assert new_hash != content_hash
+    assert EmailService._get_cached_email('email-1', 'user-1', new_hash) is None
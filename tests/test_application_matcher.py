@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from job_app_tracker.services.application_matcher import ApplicationIndex
+
+
+def test_ties_are_broken_by_date_even_when_stored_as_strings():
+    index = ApplicationIndex([
+        {'_id': 1, 'company': 'Acme', 'position': 'Backend Engineer', 'status': 'Applied',
+         'date_applied': datetime(2024, 1, 10)},
+        {'_id': 2, 'company': 'Acme Inc.', 'position': 'Backend Engineer', 'status': 'Applied',
+         'date_applied': '2024-03-01T09:00:00'},
+        {'_id': 3, 'company': 'Acme', 'position': 'Backend Engineer', 'status': 'Applied',
+         'date_applied': None}
+    ])
+
+    match = index.match('Acme', 'Backend Engineer')
+
+    assert match.application['_id'] == 2
+    assert match.method == 'company name'
+
+
+def test_position_overlap_wins_over_date():
+    index = ApplicationIndex([
+        {'_id': 1, 'company': 'Acme', 'position': 'Data Scientist', 'date_applied': '2025-01-01'},
+        {'_id': 2, 'company': 'Acme', 'position': 'Backend Engineer', 'date_applied': datetime(2020, 1, 1)}
+    ])
+
+    assert index.match('Acme', 'Senior Backend Engineer').application['_id'] == 2
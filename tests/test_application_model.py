@@ -0,0 +1,72 @@
+from job_app_tracker.config.mongodb import mongo
+from job_app_tracker.models.application import Application
+
+
+class _CountingCollection:
+    """Forwards to a collection, counting find_one calls"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.find_one_calls = []
+
+    def find_one(self, *args, **kwargs):
+        self.find_one_calls.append(args)
+        return self.collection.find_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class _Database:
+    def __init__(self, db, applications):
+        self.db = db
+        self.applications = applications
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def _insert(db):
+    return str(db.applications.insert_one({
+        'user_id': 'user-1',
+        'company': 'Acme',
+        'position': 'Engineer',
+        'status': 'Applied',
+        'notes_list': [{'content': 'Called the recruiter'}],
+        'documents': [{'name': 'resume.pdf'}],
+        'contacts': [],
+        'interviews': [{'type': 'Phone'}]
+    }).inserted_id)
+
+
+def _count_queries(db, monkeypatch):
+    applications = _CountingCollection(db.applications)
+    monkeypatch.setattr(mongo, 'db', _Database(db, applications))
+    return applications
+
+
+def test_to_dict_loads_the_missing_sub_collections_in_one_query(db, monkeypatch):
+    app_id = _insert(db)
+    application = Application.get_by_id(app_id, include=())
+    applications = _count_queries(db, monkeypatch)
+
+    data = application.to_dict()
+
+    assert len(applications.find_one_calls) == 1
+    assert data['notes_list'] == [{'content': 'Called the recruiter'}]
+    assert data['documents'] == [{'name': 'resume.pdf'}]
+    assert data['interviews'] == [{'type': 'Phone'}]
+
+
+def test_first_read_of_a_sub_collection_loads_the_other_missing_ones(db, monkeypatch):
+    app_id = _insert(db)
+    application = Application.get_by_id(app_id, include=('notes_list',))
+    applications = _count_queries(db, monkeypatch)
+
+    assert application.interviews == [{'type': 'Phone'}]
+    assert application.documents == [{'name': 'resume.pdf'}]
+    assert application.contacts == []
+    application.to_dict()
+
+    assert len(applications.find_one_calls) == 1
+    assert 'notes_list' not in applications.find_one_calls[0][1]
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from job_app_tracker.config.mongodb import mongo_client
+from job_app_tracker.services.bulk_export import CSV_COLUMNS, export_applications
+from job_app_tracker.services.bulk_import import import_applications
+
+
+def _add(db, user_id, company, date_applied, **fields):
+    return str(db.applications.insert_one(dict({
+        'user_id': user_id, 'company': company, 'position': 'Engineer', 'status': 'Applied',
+        'date_applied': date_applied
+    }, **fields)).inserted_id)
+
+
+@pytest.fixture
+def applications(db):
+    """Three applications of user-1, newest first, and one of another user"""
+    ids = [
+        _add(db, 'user-1', 'Initech', datetime(2024, 5, 3), tags=['remote', 'python'],
+             interviews=[{'type': 'Phone', 'date': datetime(2024, 5, 10)}]),
+        _add(db, 'user-1', 'Globex', datetime(2024, 5, 2), status='Interview', notes='Met, Sam at a meetup'),
+        _add(db, 'user-1', 'Acme', datetime(2024, 5, 1), url='https://acme.com/jobs/1'),
+    ]
+    _add(db, 'user-2', 'Hooli', datetime(2024, 5, 4))
+    for title, day, application_id in [('Second follow up', 9, ids[1]), ('Follow up', 8, ids[1]),
+                                       ('Thank you note', 5, ids[2])]:
+        db.reminders.insert_one({'user_id': 'user-1', 'application_id': application_id, 'title': title,
+                                 'reminder_date': datetime(2024, 5, day), 'status': 'pending'})
+    # Another user's reminder pointing at one of user-1's applications is left out
+    db.reminders.insert_one({'user_id': 'user-2', 'application_id': ids[2], 'title': 'Not mine',
+                             'reminder_date': datetime(2024, 5, 6)})
+    return ids
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 500])
+def test_json_and_ndjson_hold_every_application_with_its_reminders(applications, batch_size):
+    exported = json.loads(''.join(export_applications('user-1', 'json', batch_size=batch_size)))
+    lines = ''.join(export_applications('user-1', 'ndjson', batch_size=batch_size)).splitlines()
+
+    assert [json.loads(line) for line in lines] == exported
+    assert [application['id'] for application in exported] == applications
+    assert [application['company'] for application in exported] == ['Initech', 'Globex', 'Acme']
+    assert [[reminder['title'] for reminder in application['reminders']] for application in exported] == [
+        [], ['Follow up', 'Second follow up'], ['Thank you note']
+    ]
+    assert exported[0]['date_applied'] == '2024-05-03T00:00:00'
+    assert exported[0]['interviews'] == [{'type': 'Phone', 'date': '2024-05-10T00:00:00'}]
+    assert 'user_id' not in exported[0]
+
+
+def test_empty_export_is_still_valid(db):
+    assert json.loads(''.join(export_applications('user-1', 'json'))) == []
+    assert ''.join(export_applications('user-1', 'ndjson')) == ''
+    assert ''.join(export_applications('user-1', 'csv')).splitlines() == [','.join(CSV_COLUMNS)]
+
+
+def test_csv_export_is_streamed_per_batch_and_can_be_imported_again(db, applications):
+    chunks = list(export_applications('user-1', 'csv', batch_size=2))
+    assert len(chunks) == 2
+
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [row['company'] for row in rows] == ['Initech', 'Globex', 'Acme']
+    assert rows[0]['tags'] == 'remote, python'
+    assert rows[1]['notes'] == 'Met, Sam at a meetup'
+    assert [reminder['title'] for reminder in json.loads(rows[1]['reminders'])] == ['Follow up', 'Second follow up']
+
+    result = import_applications('user-3', io.BytesIO(''.join(chunks).encode()), 'csv')
+    assert result.inserted == 3 and result.errors == []
+    imported = {application['company']: application for application in db.applications.find({'user_id': 'user-3'})}
+    assert imported['Globex']['status'] == 'Interview'
+    assert imported['Initech']['date_applied'] == datetime(2024, 5, 3)
+    assert imported['Acme']['url'] == 'https://acme.com/jobs/1'
+
+
+def test_unknown_format_is_rejected(db):
+    with pytest.raises(ValueError, match='Unsupported export format'):
+        export_applications('user-1', 'xlsx')
+
+
+def test_export_reads_the_latest_writes_from_the_primary(db, monkeypatch):
+    # A lagging secondary that has not seen the user's applications yet
+    monkeypatch.setattr(mongo_client, '_analytics_db', db.client['applizz_secondary'])
+    app_id = db.applications.insert_one({
+        'user_id': 'user-1', 'company': 'Acme', 'position': 'Engineer', 'status': 'Applied',
+        'date_applied': datetime(2024, 5, 1)
+    }).inserted_id
+    db.reminders.insert_one({'user_id': 'user-1', 'application_id': str(app_id), 'title': 'Follow up',
+                             'reminder_date': datetime(2024, 5, 8)})
+
+    exported = json.loads(''.join(export_applications('user-1', 'json', batch_size=1)))
+
+    assert [application['company'] for application in exported] == ['Acme']
+    assert [reminder['title'] for reminder in exported[0]['reminders']] == ['Follow up']
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+from job_app_tracker.services import bulk_import
+from job_app_tracker.services.bulk_import import import_applications, iter_json_rows
+
+
+def _rows(text):
+    return list(iter_json_rows(io.BytesIO(text.encode())))
+
+
+def test_json_array_elements_are_read_across_chunks(monkeypatch):
+    monkeypatch.setattr(bulk_import, 'READ_CHUNK_SIZE', 3)
+
+    assert _rows(' [ {"company": "Acme"} ,\n{"company": "Globex"}, 12345 ] \n') == [
+        (1, {'company': 'Acme'}), (2, {'company': 'Globex'}), (3, 12345)
+    ]
+    assert _rows('[]') == []
+
+
+@pytest.mark.parametrize('text, message', [
+    ('[{"a": 1},,{"b": 2}]', 'Expected item 2'),
+    ('[{"a": 1} {"b": 2}]', "Expected ',' or ']' after item 1"),
+    ('[{"a": 1},]', 'Expected item 2'),
+    ('[,{"a": 1}]', 'Expected item 1'),
+    ('[{"a": 1}] junk', 'Unexpected content after the JSON array'),
+    ('[{"a": 1}][{"b": 2}]', 'Unexpected content after the JSON array'),
+    ('[{"a": 1},', 'Expected item 2'),
+    ('[{"a": 1}', "Expected ',' or ']' after item 1"),
+    ('{"a": 1}', 'Expected a JSON array'),
+])
+def test_malformed_json_arrays_are_rejected(text, message):
+    with pytest.raises(ValueError, match=message):
+        _rows(text)
+
+
+def test_an_invalid_element_does_not_buffer_the_rest_of_the_file(monkeypatch):
+    monkeypatch.setattr(bulk_import, 'READ_CHUNK_SIZE', 16)
+    monkeypatch.setattr(bulk_import, 'MAX_JSON_ITEM_CHARS', 64)
+    read = []
+    stream = io.BytesIO(('[{"a": 1}, {"b": oops ' + ' ' * 10000 + '}]').encode())
+    original_read = stream.read
+
+    def counting_read(size=-1):
+        data = original_read(size)
+        read.append(len(data))
+        return data
+
+    stream.read = counting_read
+    with pytest.raises(ValueError, match='Invalid JSON in item 2'):
+        list(iter_json_rows(stream))
+    assert sum(read) < 200
+
+
+def test_trailing_content_is_reported_as_a_file_error(db):
+    result = import_applications('user-1', io.BytesIO(b'[{"company": "Acme", "position": "Engineer"}] junk'), 'json')
+
+    assert result.inserted == 1
+    assert result.errors == [{'row': None, 'error': 'Could not read file: Unexpected content after the JSON array'}]
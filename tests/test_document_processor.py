@@ -0,0 +1,148 @@
+import io
+import zipfile
+
+import pymupdf
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+from job_app_tracker.services import document_processor
+from job_app_tracker.services.document_processor import extract_docx, extract_pdf, extract_txt, run_document_job
+from job_app_tracker.services.storage import DocumentStorage
+
+_W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def _pdf(*pages):
+    pdf = pymupdf.open()
+    for text in pages:
+        pdf.new_page(width=300, height=400).insert_text((40, 60), text)
+    return pdf.tobytes()
+
+
+def _docx(paragraphs, pages=None):
+    body = ''.join(f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>' for text in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document xmlns:w="{_W}"><w:body>{body}</w:body></w:document>')
+        if pages is not None:
+            archive.writestr('docProps/app.xml', (
+                '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+                f'<Pages>{pages}</Pages></Properties>'
+            ))
+    buffer.seek(0)
+    return buffer
+
+
+class _Progress:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **fields):
+        self.updates.append(fields)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path))
+    storage = DocumentStorage()
+    storage.init_app(app)
+    monkeypatch.setattr(document_processor, 'document_storage', storage)
+    return storage
+
+
+def test_txt_text_is_decoded_and_cleaned():
+    assert extract_txt(io.BytesIO('Sam  Doe\t\n\n\n\nBackend   Engineer \n'.encode())) == {
+        'text': 'Sam Doe\n\nBackend Engineer', 'page_count': None
+    }
+    # Not UTF-8; decoded from a guess of the encoding
+    assert 'Résumé' in extract_txt(io.BytesIO('Résumé of Sam Doe, backend engineer'.encode('latin-1')))['text']
+
+
+def test_txt_cut_at_the_character_limit(monkeypatch):
+    monkeypatch.setattr(document_processor, 'MAX_TEXT_CHARS', 10)
+
+    assert extract_txt(io.BytesIO(('é' * 30).encode()))['text'] == 'é' * 10
+
+
+def test_docx_paragraphs_and_page_count():
+    assert extract_docx(_docx(['Sam Doe', 'Backend Engineer'], pages=2)) == {
+        'text': 'Sam Doe\nBackend Engineer', 'page_count': 2
+    }
+    # Saved by an editor that does not record pages
+    assert extract_docx(_docx(['Cover letter']))['page_count'] is None
+
+
+def test_pdf_read_with_pypdf_without_pymupdf(monkeypatch):
+    data = _pdf('Sam Doe', 'Experience at Acme')
+    monkeypatch.setattr(document_processor, 'pymupdf', None)
+
+    assert extract_pdf(io.BytesIO(data)) == {'text': 'Sam Doe\nExperience at Acme', 'page_count': 2}
+
+
+def test_pdf_read_with_pymupdf_gets_a_thumbnail():
+    extracted = extract_pdf(io.BytesIO(_pdf('Sam Doe', 'Experience at Acme')))
+
+    assert extracted['text'] == 'Sam Doe\n\nExperience at Acme'
+    assert extracted['page_count'] == 2
+    assert extracted['thumbnail'].startswith(b'\x89PNG')
+
+
+def _upload(db, storage, user_id, data, name='resume.pdf', file_type='application/pdf'):
+    stored = storage.save(io.BytesIO(data))
+    document = {'id': str(ObjectId()), 'name': name, 'file_type': file_type, 'storage': stored.backend,
+                'storage_key': stored.key, 'sha256': stored.sha256, 'processing': 'pending'}
+    application_id = db.applications.insert_one({'user_id': user_id, 'company': 'Acme',
+                                                 'documents': [document]}).inserted_id
+    job = {'user_id': user_id, 'payload': {'application_id': str(application_id), 'document_id': document['id']}}
+    return application_id, job
+
+
+def _document(db, application_id):
+    return db.applications.find_one({'_id': application_id})['documents'][0]
+
+
+def test_job_writes_the_results_to_the_document_entry(db, storage):
+    application_id, job = _upload(db, storage, 'user-1', _pdf('Sam Doe', 'Experience at Acme'))
+    progress = _Progress()
+
+    assert run_document_job(job, progress) == {'processing': 'done', 'page_count': 2}
+
+    document = _document(db, application_id)
+    assert document['processing'] == 'done'
+    assert document['text'] == 'Sam Doe\n\nExperience at Acme'
+    assert document['page_count'] == 2
+    assert storage.backend().local_path(document['thumbnail']['key'])
+    assert progress.updates[-1]['processed'] == 1
+
+
+def test_job_records_a_file_it_cannot_read(db, storage):
+    application_id, job = _upload(db, storage, 'user-1', b'%PDF-1.4 not really a pdf')
+
+    assert run_document_job(job, _Progress()) == {'processing': 'failed', 'page_count': None}
+    document = _document(db, application_id)
+    assert document['processing'] == 'failed' and document['processing_error']
+
+
+def test_same_file_uploaded_again_reuses_the_results_and_thumbnail(db, storage, monkeypatch):
+    data = _pdf('Sam Doe')
+    first_id, first_job = _upload(db, storage, 'user-1', data)
+    run_document_job(first_job, _Progress())
+    thumbnail = _document(db, first_id)['thumbnail']
+
+    second_id, second_job = _upload(db, storage, 'user-1', data)
+    monkeypatch.setitem(document_processor.EXTRACTORS, 'pdf', pytest.fail)
+    run_document_job(second_job, _Progress())
+
+    assert _document(db, second_id)['thumbnail'] == thumbnail
+    # Each entry holds its own reference, so deleting one keeps the thumbnail
+    assert storage.release(thumbnail['storage'], thumbnail['key']) is False
+    assert storage.backend().local_path(thumbnail['key'])
+
+
+def test_job_for_a_deleted_document_does_nothing(db, storage):
+    application_id, job = _upload(db, storage, 'user-1', _pdf('Sam Doe'))
+    db.applications.delete_one({'_id': application_id})
+
+    assert run_document_job(job, _Progress()) == {'processing': None}
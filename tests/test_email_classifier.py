@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+from job_app_tracker.services.email_classifier import EmailClassifier
+from job_app_tracker.services.email_service import EmailService
+
+# (subject, body, from_email), is_job_related, status, company, position
+EMAILS = [
+    (('Thank you for applying to Acme',
+      'Hi Sam,\n\nThank you for applying for the Backend Engineer position. We have received your '
+      'application and our team will review it.',
+      'Acme Recruiting <no-reply@acme.com>'),
+     True, 'Applied', 'Acme', 'Backend Engineer'),
+    (('Update on your application',
+      'Dear Sam,\n\nThank you for your interest in the Data Analyst role at Globex. Unfortunately, after '
+      'careful consideration we have decided to move forward with other candidates.',
+      'careers@globex.com'),
+     True, 'Rejected', 'Globex', 'Data Analyst'),
+    (('Interview invitation: Product Designer',
+      'Hi Sam,\n\nWe would like to invite you to interview for the Product Designer position at Initech. '
+      'Please share your availability for a video interview next week.',
+      'Initech Talent <talent@initech.io>'),
+     True, 'Interview', 'Initech', 'Product Designer'),
+    (('Offer letter from Hooli',
+      'Hi Sam,\n\nWe are pleased to offer you the Site Reliability Engineer role at Hooli. Your offer '
+      'letter and start date are attached.',
+      'Hooli People Team <people@hooli.com>'),
+     True, 'Offer', 'Hooli', 'Site Reliability Engineer'),
+    (('Your order has shipped',
+      'Your order #1234 has shipped. View your receipt online. Unsubscribe from these emails.',
+      'deals@shop.example'),
+     False, None, 'Unknown Company', 'Unknown Position'),
+]
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return EmailClassifier()
+
+
+def test_batch_labels_and_extracts_representative_emails(classifier):
+    results = classifier.classify([email for email, *_ in EMAILS])
+
+    assert len(results) == len(EMAILS)
+    for result, (email, is_job_related, status, company, position) in zip(results, EMAILS):
+        assert result['is_job_related'] is is_job_related, email[0]
+        if is_job_related:
+            assert result['status'] == status, email[0]
+        assert (result['company'], result['position']) == (company, position), email[0]
+        assert 0.5 <= result['confidence'] <= 1.0
+
+
+def test_single_and_batch_classification_agree(classifier, monkeypatch):
+    monkeypatch.setattr('job_app_tracker.services.email_service.email_classifier', classifier)
+    messages = [SimpleNamespace(subject=subject, body=body, from_email=sender) for (subject, body, sender), *_ in EMAILS]
+
+    batch = EmailService._analyze_emails(messages)
+    single = [EmailService._analyze_email_content(m.subject, m.body, m.from_email) for m in messages]
+
+    assert batch == single
+    # The order of a batch does not change any result
+    assert EmailService._analyze_emails(messages[::-1]) == batch[::-1]
+
+
+def test_empty_batch(classifier):
+    assert classifier.classify([]) == []
+
+
+def test_saved_model_classifies_the_same(classifier, tmp_path):
+    path = tmp_path / 'model.npz'
+    classifier.save(path)
+    loaded = EmailClassifier.load(path)
+
+    emails = [email for email, *_ in EMAILS]
+    assert loaded.classify(emails) == classifier.classify(emails)
+    assert loaded.version == classifier.version
+
+
+def test_fit_learns_a_missed_phrase():
+    classifier = EmailClassifier()
+    email = ('Quick question', 'Are you free for a coffee chat with our founders about the Staff Engineer opening?',
+             'founder@startup.example')
+    assert classifier.classify([email])[0]['is_job_related'] is False
+
+    classifier.fit([email, EMAILS[-1][0]], ['Interview', 'other'], epochs=30)
+
+    result = classifier.classify([email])[0]
+    assert result['is_job_related'] and result['status'] == 'Interview'
+    assert classifier.classify([EMAILS[-1][0]])[0]['is_job_related'] is False
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from job_app_tracker.models.email_suggestion import EmailSuggestion
+from job_app_tracker.models.user import User
+from job_app_tracker.services.email_service import EmailService, _analysis_memory
+from job_app_tracker.services.imap_fetcher import ImapAccount, ImapConnectionPool, ImapFetcher, uid_set
+from tests.imap_server import make_message
+
+INTERVIEW = ('Interview invitation for the Backend Engineer role at Acme',
+             'Acme Recruiting <recruiting@acme.com>',
+             'We would like to schedule an interview with you. Please share your availability.')
+NEWSLETTER = ('Weekly deals', 'deals@shop.example', 'Our biggest sale of the year. Unsubscribe here.')
+
+
+def _account(server):
+    return ImapAccount('127.0.0.1', server.username, server.password, port=server.port, use_ssl=False)
+
+
+def _fill(server, count, template=NEWSLETTER, date=None):
+    subject, sender, body = template
+    return [server.mailbox.append(make_message(f"{subject} {i}", sender, body, date=date, message_id=f"<{i}.{subject[:5]}@test>"))
+            for i in range(count)]
+
+
+def _sync(fetcher, account, **kwargs):
+    batches = list(fetcher.fetch_new(account, is_candidate=EmailService._is_candidate, **kwargs))
+    return batches, [m for batch in batches for m in batch.messages]
+
+
+def test_uid_set_compresses_ranges():
+    assert uid_set([1, 2, 3, 4, 7, 9, 10]) == '1:4,7,9:10'
+    assert uid_set([5]) == '5'
+
+
+def test_first_sync_fetches_headers_in_batches_and_bodies_of_candidates(imap_server):
+    _fill(imap_server, 3)
+    interview_uids = _fill(imap_server, 2, INTERVIEW)
+    fetcher = ImapFetcher(pool=ImapConnectionPool(), header_batch_size=2)
+
+    batches, messages = _sync(fetcher, _account(imap_server))
+
+    assert [len(batch.messages) for batch in batches] == [2, 2, 1]
+    assert [m.uid for m in messages] == [1, 2, 3, 4, 5]
+    assert imap_server.fetched_bodies == interview_uids
+    assert all(m.body for m in messages if m.uid in interview_uids)
+    assert all(m.body is None for m in messages if m.uid not in interview_uids)
+    assert batches[-1].last_uid == 5
+    assert batches[-1].uid_validity == imap_server.mailbox.uid_validity
+
+
+def test_first_sync_only_reads_messages_since_the_given_date(imap_server):
+    _fill(imap_server, 2, date=datetime.now().astimezone() - timedelta(days=40))
+    recent = _fill(imap_server, 1)
+    fetcher = ImapFetcher(pool=ImapConnectionPool())
+
+    batches, messages = _sync(fetcher, _account(imap_server), since=datetime.now() - timedelta(days=15))
+
+    assert [m.uid for m in messages] == recent
+    # Older messages are below the watermark now, so they are never read later either
+    assert batches[-1].last_uid == 3
+
+
+def test_incremental_sync_never_downloads_a_message_twice(imap_server):
+    _fill(imap_server, 4, INTERVIEW)
+    fetcher = ImapFetcher(pool=ImapConnectionPool())
+    account = _account(imap_server)
+    batches, _ = _sync(fetcher, account)
+    watermark = batches[-1]
+
+    imap_server.reset_counters()
+    batches, messages = _sync(fetcher, account, last_uid=watermark.last_uid, uid_validity=watermark.uid_validity)
+    assert messages == []
+    assert imap_server.fetched_headers == [] and imap_server.fetched_bodies == []
+    assert batches[-1].last_uid == watermark.last_uid
+
+    new_uid = _fill(imap_server, 1, INTERVIEW)[0]
+    batches, messages = _sync(fetcher, account, last_uid=watermark.last_uid, uid_validity=watermark.uid_validity)
+    assert [m.uid for m in messages] == [new_uid]
+    assert imap_server.fetched_headers == [new_uid]
+    assert imap_server.fetched_bodies == [new_uid]
+
+
+def test_changed_uid_validity_resyncs_from_the_date(imap_server):
+    _fill(imap_server, 2)
+    fetcher = ImapFetcher(pool=ImapConnectionPool())
+    account = _account(imap_server)
+    batches, _ = _sync(fetcher, account)
+
+    imap_server.mailbox.reset(uid_validity=7)
+    batches, messages = _sync(fetcher, account, last_uid=batches[-1].last_uid, uid_validity=batches[-1].uid_validity)
+    assert [m.uid for m in messages] == [1, 2]
+    assert batches[-1].uid_validity == 7
+
+
+def test_pool_reuses_the_logged_in_connection(imap_server):
+    fetcher = ImapFetcher(pool=ImapConnectionPool())
+    account = _account(imap_server)
+    _sync(fetcher, account)
+    _sync(fetcher, account)
+    assert imap_server.logins == 1
+
+
+def _connected_user(db, server, **settings):
+    user_id = db.users.insert_one({
+        'email': 'owner@example.com',
+        'email_connected': True,
+        'connected_email': server.username,
+        'email_token': server.password,
+        'email_provider': 'yahoo',
+        'email_settings': settings
+    }).inserted_id
+    return User.get_by_id(str(user_id))
+
+
+def test_scan_emails_stores_suggestions_and_the_watermark(db, imap_env):
+    _analysis_memory.clear()
+    _fill(imap_env, 3)
+    _fill(imap_env, 2, INTERVIEW)
+    user = _connected_user(db, imap_env)
+    fetcher = ImapFetcher(pool=ImapConnectionPool())
+
+    result = EmailService.scan_emails(user, fetcher=fetcher)
+
+    assert result.success, result.message
+    assert result.processed_count == 5
+    assert EmailSuggestion.count_pending(user.id) == 2
+    settings = db.users.find_one({'_id': ObjectId(user.id)})['email_settings']
+    assert settings['last_uid'] == 5
+    assert settings['uid_validity'] == imap_env.mailbox.uid_validity
+    assert isinstance(settings['last_scan'], datetime)
+
+    # Saving the settings form keeps the watermark, so the next scan reads nothing again
+    user = User.get_by_id(user.id)
+    user.update_email_settings({'auto_scan': True, 'require_approval': True, 'scan_attachments': False})
+    settings = db.users.find_one({'_id': ObjectId(user.id)})['email_settings']
+    assert settings['last_uid'] == 5 and settings['auto_scan'] is True
+
+    imap_env.reset_counters()
+    result = EmailService.scan_emails(User.get_by_id(user.id), fetcher=fetcher)
+    assert result.success and result.processed_count == 0
+    assert imap_env.fetched_headers == [] and imap_env.fetched_bodies == []
+    assert EmailSuggestion.count_pending(user.id) == 2
+
+
+def test_scan_emails_reports_a_failed_login(db, imap_env):
+    user = _connected_user(db, imap_env)
+    user.email_token = 'wrong-password'
+
+    result = EmailService.scan_emails(user, fetcher=ImapFetcher(pool=ImapConnectionPool()))
+
+    assert not result.success
+    assert 'Error scanning emails' in result.message
+
+
+def test_clearing_all_data_rereads_the_mailbox(db, imap_env):
+    _analysis_memory.clear()
+    _fill(imap_env, 2, INTERVIEW)
+    user = _connected_user(db, imap_env)
+    fetcher = ImapFetcher(pool=ImapConnectionPool())
+    assert EmailService.scan_emails(user, fetcher=fetcher).success
+    assert EmailSuggestion.count_pending(user.id) == 2
+
+    EmailService.clear_all_user_data(user)
+    settings = db.users.find_one({'_id': ObjectId(user.id)})['email_settings']
+    assert 'last_uid' not in settings and 'uid_validity' not in settings
+    assert EmailSuggestion.count_pending(user.id) == 0
+
+    imap_env.reset_counters()
+    result = EmailService.scan_emails(User.get_by_id(user.id), fetcher=fetcher)
+    assert result.success and result.processed_count == 2
+    assert imap_env.fetched_bodies == [1, 2]
+    assert EmailSuggestion.count_pending(user.id) == 2
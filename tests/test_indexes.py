@@ -0,0 +1,25 @@
+from job_app_tracker.config.indexes import INDEXES, query_shapes
+from job_app_tracker.models.user import User
+
+
+def _shape(name):
+    return next(shape for shape in query_shapes() if shape['name'] == name)
+
+
+def test_login_lookup_is_issued_as_registered(db, monkeypatch):
+    db.users.insert_one({'email': 'someone@example.com'})
+    calls = []
+    find_one = db.users.find_one
+
+    def recording_find_one(filter, *args, **kwargs):
+        calls.append((filter, kwargs.get('collation')))
+        return find_one(filter, *args, **kwargs)
+
+    monkeypatch.setattr(type(db.users), 'find_one', lambda self, *a, **kw: recording_find_one(*a, **kw))
+    assert User.get_by_email('Someone@Example.com') is not None
+
+    shape = _shape('login by email')
+    assert calls == [(shape['filter'], shape['collation'])]
+    index = next(spec for spec in INDEXES if spec['name'] == 'email_1')
+    # A query only uses an index with the same collation
+    assert shape['collation'] == index['options']['collation']
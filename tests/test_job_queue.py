@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+
+from job_app_tracker.services.email_service import _analysis_memory
+from job_app_tracker.services.imap_fetcher import imap_pool
+from job_app_tracker.services.job_queue import (COMPLETED, FAILED, QUEUED, RUNNING, JobError, JobQueue,
+                                                default_handlers, job_status)
+from tests.imap_server import make_message
+
+
+def _queue(**kwargs):
+    return JobQueue(retry_delay=timedelta(0), **kwargs)
+
+
+def _expire_lease(db, job):
+    db.jobs.update_one({'_id': job['_id']}, {'$set': {'lease_until': datetime.now() - timedelta(seconds=1)}})
+
+
+def test_enqueue_keeps_one_active_job_per_type_and_user(db):
+    queue = _queue()
+    first = queue.enqueue('scan_emails', 'user-1')
+    second = queue.enqueue('scan_emails', 'user-1')
+
+    assert first['_id'] == second['_id']
+    assert db.jobs.count_documents({}) == 1
+    assert queue.enqueue('scan_emails', 'user-2')['_id'] != first['_id']
+
+
+def test_completed_job_reports_its_result(db):
+    queue = _queue()
+    job = queue.enqueue('echo', 'user-1', {'value': 3})
+
+    def handler(job, progress):
+        progress.update(processed=1, total=1, force=True)
+        return {'value': job['payload']['value']}
+
+    assert queue.run_one('worker-a', {'echo': handler})
+    status = job_status(queue.get(job['_id']))
+    assert status['status'] == COMPLETED
+    assert status['result'] == {'value': 3}
+    assert status['percent'] == 100
+    assert not queue.run_one('worker-a', {'echo': handler})
+
+
+def test_errors_are_retried_until_attempts_run_out(db):
+    queue = _queue(max_attempts=2)
+    job = queue.enqueue('flaky', 'user-1')
+
+    def handler(job, progress):
+        raise RuntimeError('mailbox unavailable')
+
+    queue.run_one('worker-a', {'flaky': handler})
+    assert queue.get(job['_id'])['status'] == QUEUED
+    queue.run_one('worker-a', {'flaky': handler})
+    failed = queue.get(job['_id'])
+    assert failed['status'] == FAILED and failed['attempts'] == 2
+    assert 'active' not in failed
+
+
+def test_job_errors_are_not_retried(db):
+    queue = _queue()
+    job = queue.enqueue('broken', 'user-1')
+
+    def handler(job, progress):
+        raise JobError('User not found')
+
+    queue.run_one('worker-a', {'broken': handler})
+    assert queue.get(job['_id'])['status'] == FAILED
+
+
+def test_job_whose_worker_dies_is_reclaimed_then_failed(db):
+    queue = _queue(max_attempts=2)
+    job = queue.enqueue('crashy', 'user-1')
+
+    # The worker dies while running the job, each time
+    claimed = queue.claim('worker-a', ['crashy'])
+    assert claimed['attempts'] == 1
+    _expire_lease(db, claimed)
+    claimed = queue.claim('worker-b', ['crashy'])
+    assert claimed['_id'] == job['_id'] and claimed['attempts'] == 2
+    _expire_lease(db, claimed)
+
+    assert queue.claim('worker-c', ['crashy']) is None
+    failed = queue.get(job['_id'])
+    assert failed['status'] == FAILED
+    assert 'active' not in failed and 'lease_until' not in failed
+    # The user can queue a new one
+    assert queue.enqueue('crashy', 'user-1')['_id'] != job['_id']
+
+
+def test_heartbeat_keeps_a_blocked_job_from_being_claimed_twice(db):
+    queue = _queue(lease=timedelta(seconds=0.3))
+    job = queue.enqueue('slow', 'user-1')
+    claims = []
+
+    def handler(job, progress):
+        # Blocks for several leases without reporting progress
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            claims.append(queue.claim('worker-b', ['slow']))
+            time.sleep(0.1)
+        return {}
+
+    queue.run_one('worker-a', {'slow': handler})
+
+    assert claims and all(claim is None for claim in claims)
+    finished = queue.get(job['_id'])
+    assert finished['status'] == COMPLETED and finished['worker_id'] == 'worker-a'
+
+
+def test_heartbeat_stops_renewing_a_job_taken_over(db):
+    queue = _queue(lease=timedelta(seconds=0.3))
+    job = queue.enqueue('slow', 'user-1')
+
+    def handler(job, progress):
+        db.jobs.update_one({'_id': job['_id']}, {'$set': {'worker_id': 'worker-b'}})
+        time.sleep(0.4)
+        return {}
+
+    queue.run_one('worker-a', {'slow': handler})
+    # Neither the heartbeat nor completion touched worker-b's job
+    taken = queue.get(job['_id'])
+    assert taken['status'] == RUNNING and taken['worker_id'] == 'worker-b'
+
+
+def test_scan_job_reads_the_local_imap_server(db, imap_env):
+    _analysis_memory.clear()
+    imap_env.mailbox.append(make_message(
+        'Interview invitation for the Backend Engineer role at Acme',
+        'Acme Recruiting <recruiting@acme.com>',
+        'We would like to schedule an interview with you. Please share your availability.'
+    ))
+    imap_env.mailbox.append(make_message('Weekly deals', 'deals@shop.example', 'Our biggest sale. Unsubscribe.'))
+    user_id = str(db.users.insert_one({
+        'email': 'owner@example.com',
+        'email_connected': True,
+        'connected_email': imap_env.username,
+        'email_token': imap_env.password,
+        'email_provider': 'yahoo'
+    }).inserted_id)
+    queue = _queue()
+    job = queue.enqueue('scan_emails', user_id)
+
+    try:
+        assert queue.run_one('worker-a', default_handlers())
+    finally:
+        imap_pool.close_all()
+
+    status = job_status(queue.get(job['_id']))
+    assert status['status'] == COMPLETED, status['error']
+    assert status['processed'] == 2 and status['total'] == 2
+    assert status['result']['suggestions'] == 1
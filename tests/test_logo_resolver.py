@@ -0,0 +1,95 @@
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+
+from job_app_tracker.services.logo_resolver import LogoResolver
+
+
+class _FaviconHandler(BaseHTTPRequestHandler):
+    """Answers HEAD /favicons?domain=... with 200 for the domains that have a logo"""
+
+    def do_HEAD(self):
+        self.server.requests.append(self.path)
+        domain = urlparse(parse_qs(urlparse(self.path).query)['domain'][0]).hostname
+        self.send_response(200 if domain in self.server.logos else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def favicon_service():
+    """A local favicon service, so lookups never leave the machine"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FaviconHandler)
+    server.requests = []
+    server.logos = {'www.acme.com'}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/favicons"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _resolver(service, **config):
+    app = Flask(__name__)
+    app.config.update(LOGO_FAVICON_SERVICE=service.url, LOGO_REQUEST_TIMEOUT=2, **config)
+    resolver = LogoResolver()
+    resolver.init_app(app)
+    return resolver
+
+
+def test_found_logo_is_cached_in_memory_and_in_the_database(db, favicon_service):
+    resolver = _resolver(favicon_service)
+
+    logo_url = resolver.resolve('https://www.Acme.com/careers')
+    assert logo_url == f"{favicon_service.url}?domain=https://www.acme.com&sz=128"
+    favicon_service.requests.clear()
+
+    assert resolver.resolve('www.acme.com/jobs') == logo_url
+    # Another process has an empty memory cache but shares the collection
+    assert _resolver(favicon_service).resolve('https://www.acme.com') == logo_url
+    assert favicon_service.requests == []
+
+
+def test_missing_logo_is_cached_for_the_miss_ttl(db, favicon_service):
+    # localhost has no logo at the service and nothing listening for its favicon.ico
+    resolver = _resolver(favicon_service, LOGO_CACHE_TTL=3600, LOGO_MISS_TTL=60)
+
+    assert resolver.resolve('http://localhost/about') is None
+    assert len(favicon_service.requests) == 1
+    entry = db.logo_cache.find_one({'_id': 'localhost'})
+    assert entry['logo_url'] is None
+    assert timedelta(seconds=55) < entry['expires_at'] - entry['resolved_at'] <= timedelta(seconds=60)
+
+    assert resolver.resolve('localhost') is None
+    assert len(favicon_service.requests) == 1
+
+    # Once the miss expires the domain is probed again
+    db.logo_cache.update_one({'_id': 'localhost'}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+    assert _resolver(favicon_service).resolve('localhost') is None
+    assert len(favicon_service.requests) == 2
+
+
+def test_pending_lookups_and_live_threads_are_exported(favicon_service, monkeypatch):
+    resolver = _resolver(favicon_service, LOGO_RESOLVER_WORKERS=1)
+    release = threading.Event()
+    monkeypatch.setattr(resolver, '_resolve_for_application', lambda application_id, url: release.wait(5))
+    pending = REGISTRY.get_sample_value('applizz_logo_lookups_pending')
+
+    resolver.resolve_async('a' * 24, 'https://www.acme.com')
+    resolver.resolve_async('b' * 24, 'https://www.globex.com')
+    assert REGISTRY.get_sample_value('applizz_logo_lookups_pending') == pending + 2
+    assert REGISTRY.get_sample_value('applizz_logo_resolver_threads') == 1
+
+    release.set()
+    resolver.executor.shutdown(wait=True)
+    assert REGISTRY.get_sample_value('applizz_logo_lookups_pending') == pending
+    assert resolver.live_threads() == 0
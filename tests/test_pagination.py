@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+from job_app_tracker.models.application import Application
+
+USER_ID = 'user-1'
+
+
+def _all_pages(sort, limit=2):
+    ids, cursor = [], None
+    while True:
+        docs, cursor, _ = Application.get_page_for_user(USER_ID, sort=sort, cursor=cursor, limit=limit)
+        ids.extend(doc['_id'] for doc in docs)
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture
+def mixed_dates(db):
+    dates = [
+        datetime(2024, 5, 1), datetime(2024, 4, 1), datetime(2024, 3, 1),
+        # Stored as strings by older versions
+        '2024-04-15', '2023-12-01',
+        None
+    ]
+    docs = [{'user_id': USER_ID, 'company': f'Company {i}', 'position': 'Engineer', 'status': 'Applied',
+             'date_applied': value} for i, value in enumerate(dates)]
+    docs.append({'user_id': USER_ID, 'company': 'No date', 'position': 'Engineer', 'status': 'Applied'})
+    db.applications.insert_many(docs)
+    return [str(doc['_id']) for doc in docs]
+
+
+@pytest.mark.parametrize('sort', ['date-desc', 'date-asc', 'company'])
+def test_every_application_is_listed_once_across_pages(mixed_dates, sort):
+    ids = _all_pages(sort)
+    assert sorted(ids) == sorted(mixed_dates)
+
+
+def test_string_dates_follow_dates_when_newest_first(mixed_dates):
+    docs, cursor, _ = Application.get_page_for_user(USER_ID, sort='date-desc', limit=3)
+    assert [doc['company'] for doc in docs] == ['Company 0', 'Company 1', 'Company 2']
+    docs, cursor, _ = Application.get_page_for_user(USER_ID, sort='date-desc', cursor=cursor, limit=3)
+    # The legacy string dates come next, converted on read, then the applications without a date
+    assert [doc['company'] for doc in docs] == ['Company 3', 'Company 4', 'No date']
+    assert [doc['date_applied'] for doc in docs[:2]] == [datetime(2024, 4, 15), datetime(2023, 12, 1)]
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+from job_app_tracker.services.reminder_scheduler import LogNotifier, Notifier, ReminderScheduler
+
+NOW = datetime(2024, 5, 15, 9, 0)
+
+
+class _FailingNotifier(Notifier):
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, notifications):
+        self.calls += 1
+        return []
+
+
+def _user(db):
+    return str(db.users.insert_one({'email': 'owner@example.com', 'name': 'Owner'}).inserted_id)
+
+
+def _reminder(db, user_id, due, **fields):
+    document = dict({
+        'user_id': user_id,
+        'title': 'Follow up',
+        'reminder_date': due,
+        'status': 'pending',
+        'notification_sent': False
+    }, **fields)
+    return db.reminders.insert_one(document).inserted_id
+
+
+def _sent_ids(notifier):
+    return [notification['reminder_id'] for notification in notifier.sent]
+
+
+def test_two_workers_send_each_due_reminder_once(db):
+    user_id = _user(db)
+    reminder_ids = [str(_reminder(db, user_id, NOW - timedelta(minutes=i))) for i in range(5)]
+    other = ReminderScheduler(LogNotifier(), batch_size=2, worker_id='worker-b')
+
+    class RacingNotifier(LogNotifier):
+        def send(self, notifications):
+            # The other worker ticks while this one is still delivering
+            other.run_once(NOW)
+            return super().send(notifications)
+
+    first = ReminderScheduler(RacingNotifier(), batch_size=2, worker_id='worker-a')
+    first.refill(NOW)
+    other.refill(NOW)
+    first.run_once(NOW)
+    other.run_once(NOW + timedelta(minutes=6))
+
+    sent = _sent_ids(first.notifier) + _sent_ids(other.notifier)
+    assert sorted(sent) == sorted(reminder_ids)
+    assert db.reminders.count_documents({'notification_sent': True, 'claimed_by': {'$exists': False}}) == 5
+
+
+def test_reminders_past_max_lateness_are_skipped(db):
+    user_id = _user(db)
+    stale = _reminder(db, user_id, NOW - timedelta(days=2))
+    due = _reminder(db, user_id, NOW - timedelta(hours=1))
+    scheduler = ReminderScheduler(LogNotifier(), max_lateness=timedelta(days=1))
+
+    assert scheduler.run_once(NOW) == 1
+    assert _sent_ids(scheduler.notifier) == [str(due)]
+    skipped = db.reminders.find_one({'_id': stale})
+    assert skipped['notification_sent'] and skipped['notification_skipped']
+
+
+def test_refill_leaves_out_claimed_reminders(db):
+    user_id = _user(db)
+    # Held by a worker that died; their claims have not expired yet
+    for minutes in (30, 20):
+        _reminder(db, user_id, NOW - timedelta(minutes=minutes), claimed_by='dead-worker',
+                  claimed_until=NOW + timedelta(minutes=3), notification_attempts=1)
+    due = _reminder(db, user_id, NOW - timedelta(minutes=10))
+    upcoming = _reminder(db, user_id, NOW + timedelta(minutes=5))
+    scheduler = ReminderScheduler(LogNotifier(), heap_size=2)
+
+    assert scheduler.refill(NOW) == 2
+    assert scheduler.run_once(NOW) == 1
+    assert _sent_ids(scheduler.notifier) == [str(due)]
+
+    # Once the dead worker's claims expire they are picked up again
+    assert scheduler.run_once(NOW + timedelta(minutes=6)) == 3
+    assert str(upcoming) in _sent_ids(scheduler.notifier)
+
+
+def test_failed_deliveries_stop_after_max_attempts(db):
+    user_id = _user(db)
+    reminder_id = _reminder(db, user_id, NOW - timedelta(minutes=1))
+    notifier = _FailingNotifier()
+    scheduler = ReminderScheduler(notifier, max_attempts=3)
+
+    for tick in range(6):
+        scheduler.run_once(NOW + tick * timedelta(minutes=6))
+
+    assert notifier.calls == 3
+    reminder = db.reminders.find_one({'_id': reminder_id})
+    assert reminder['notification_attempts'] == 3
+    assert reminder['notification_sent'] and reminder['notification_failed']
+
+
+def test_claim_abandoned_on_the_last_attempt_is_given_up(db):
+    user_id = _user(db)
+    reminder_id = _reminder(db, user_id, NOW - timedelta(minutes=30), claimed_by='dead-worker',
+                            claimed_until=NOW - timedelta(minutes=1), notification_attempts=5)
+    scheduler = ReminderScheduler(LogNotifier(), max_attempts=5)
+
+    assert scheduler.run_once(NOW) == 0
+    reminder = db.reminders.find_one({'_id': reminder_id})
+    assert reminder['notification_failed'] and 'claimed_by' not in reminder
@@ -0,0 +1,155 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from job_app_tracker.models.application import Application
+from job_app_tracker.services.storage import DocumentStorage, LocalStorage
+
+CONTENT = b'%PDF-1.4 resume of a backend engineer'
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path))
+    return app
+
+
+@pytest.fixture
+def storage(app):
+    storage = DocumentStorage()
+    storage.init_app(app)
+    return storage
+
+
+def _objects(root):
+    return [name for _, _, names in os.walk(os.path.join(root, 'objects')) for name in names]
+
+
+def test_local_storage_stores_the_same_content_once(tmp_path):
+    local = LocalStorage(str(tmp_path))
+
+    first = local.save(io.BytesIO(CONTENT))
+    second = local.save(io.BytesIO(CONTENT))
+    other = local.save(io.BytesIO(b'cover letter'))
+
+    assert first.key == second.key == first.sha256
+    assert first.size == len(CONTENT)
+    assert other.key != first.key
+    assert sorted(_objects(tmp_path)) == sorted([first.key, other.key])
+    assert os.listdir(tmp_path / 'tmp') == []
+    with open(local.local_path(first.key), 'rb') as stored:
+        assert stored.read() == CONTENT
+
+
+def test_release_keeps_a_file_until_the_last_reference_is_dropped(db, storage):
+    stored = storage.save(io.BytesIO(CONTENT))
+    assert storage.save(io.BytesIO(CONTENT)).key == stored.key
+    assert storage.retain(stored.backend, stored.key)
+
+    assert storage.release(stored.backend, stored.key) is False
+    assert storage.release(stored.backend, stored.key) is False
+    assert storage.backend().local_path(stored.key)
+
+    assert storage.release(stored.backend, stored.key) is True
+    assert storage.backend().local_path(stored.key) is None
+    assert db.stored_files.count_documents({}) == 0
+    assert storage.retain(stored.backend, stored.key) is False
+
+
+def test_upload_during_a_release_stores_the_file_again(db, storage, monkeypatch):
+    stored = storage.save(io.BytesIO(CONTENT))
+    local = storage.backend()
+    delete = local.delete
+    uploads = []
+    threads = []
+
+    def delete_while_uploading(key):
+        # The same content is uploaded after the release claimed the file
+        upload = threading.Thread(target=lambda: uploads.append(storage.save(io.BytesIO(CONTENT))))
+        upload.start()
+        threads.append(upload)
+        time.sleep(0.2)
+        delete(key)
+
+    monkeypatch.setattr(local, 'delete', delete_while_uploading)
+    assert storage.release(stored.backend, stored.key) is True
+    threads[0].join(5)
+
+    assert uploads[0].key == stored.key
+    with open(local.local_path(stored.key), 'rb') as restored:
+        assert restored.read() == CONTENT
+    ref = db.stored_files.find_one({'_id': f"local:{stored.key}"})
+    assert ref['refs'] == 1 and 'deleting' not in ref
+
+
+def test_deleting_applications_releases_their_files(db, storage):
+    shared = storage.save(io.BytesIO(CONTENT))
+    own = storage.save(io.BytesIO(b'cover letter'))
+    thumbnail = storage.save(io.BytesIO(b'thumbnail png'))
+    db.applications.insert_one({'user_id': 'user-1', 'documents': [
+        {'id': 'd1', 'storage': 'local', 'storage_key': shared.key},
+        {'id': 'd2', 'storage': 'local', 'storage_key': own.key,
+         'thumbnail': {'storage': 'local', 'key': thumbnail.key}}
+    ]})
+    # Another user uploaded the same file
+    storage.save(io.BytesIO(CONTENT))
+
+    documents = Application.stored_documents('user-1')
+    db.applications.delete_many({'user_id': 'user-1'})
+    storage.release_documents(documents)
+
+    assert storage.backend().local_path(shared.key)
+    assert storage.backend().local_path(own.key) is None
+    assert storage.backend().local_path(thumbnail.key) is None
+
+
+def test_send_answers_range_requests_with_partial_content(db, app, storage):
+    stored = storage.save(io.BytesIO(CONTENT))
+    document = {'storage': stored.backend, 'storage_key': stored.key, 'name': 'resume.pdf',
+                'file_type': 'application/pdf'}
+
+    with app.test_request_context(headers={'Range': 'bytes=5-7'}):
+        response = storage.send(document)
+        response.direct_passthrough = False
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == f'bytes 5-7/{len(CONTENT)}'
+        assert response.get_data() == CONTENT[5:8]
+        assert response.headers['Content-Disposition'].startswith('inline')
+
+    with app.test_request_context():
+        response = storage.send(document, as_attachment=True)
+        response.direct_passthrough = False
+        assert response.status_code == 200
+        assert response.get_data() == CONTENT
+        assert response.headers['Content-Disposition'].startswith('attachment')
+
+
+@pytest.mark.parametrize('file_type, disposition', [
+    ('application/pdf', 'inline'),
+    ('image/png', 'inline'),
+    ('text/plain; charset=utf-8', 'inline'),
+    ('text/html', 'attachment'),
+    ('image/svg+xml', 'attachment'),
+    (None, 'attachment'),
+])
+def test_send_shows_only_safe_types_inline(db, app, storage, file_type, disposition):
+    stored = storage.save(io.BytesIO(b'<script>alert(document.cookie)</script>'))
+    document = {'storage': stored.backend, 'storage_key': stored.key, 'name': 'page', 'file_type': file_type}
+
+    with app.test_request_context():
+        response = storage.send(document)
+        assert response.headers['Content-Disposition'].startswith(disposition)
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
+        if file_type != 'application/pdf':
+            assert response.headers['Content-Security-Policy'] == 'sandbox'
+        response.close()
+
+
+def test_send_returns_none_for_a_missing_file(app, storage):
+    with app.test_request_context():
+        assert storage.send({'storage': 'local', 'storage_key': 'ab' * 32}) is None
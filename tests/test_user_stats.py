@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from job_app_tracker.config.mongodb import mongo_client
+from job_app_tracker.models.user_stats import UserStats
+from job_app_tracker.services.dashboard_stats import DashboardStatsService
+
+
+@pytest.fixture(autouse=True)
+def dates_only_stage(monkeypatch):
+    """
+    mongomock does not implement $convert; project date_applied only where
+    it is a date (dates sort after every other type but a few), so the rest
+    of the real pipeline runs.
+    """
+    stage = {'$project': {
+        'status': 1,
+        'applied': {'$cond': [{'$gte': ['$date_applied', datetime.min]}, '$date_applied', None]}
+    }}
+    monkeypatch.setattr(UserStats, '_applied_stage', staticmethod(lambda: stage))
+
+
+def _add(db, status, date_applied, user_id='user-1'):
+    db.applications.insert_one({'user_id': user_id, 'status': status, 'date_applied': date_applied})
+    UserStats.record_created(user_id, status, date_applied)
+
+
+def test_increments_before_the_first_read_are_kept(db):
+    _add(db, 'Applied', datetime(2024, 5, 1))
+    partial = db.user_stats.find_one({'_id': 'user-1'})
+    assert partial['total'] == 1 and 'built_at' not in partial
+
+    _add(db, 'Interview', datetime(2024, 5, 2))
+    stats = UserStats.get('user-1')
+    assert stats['total'] == 2
+    assert stats['status_counts'] == {'Applied': 1, 'Interview': 1}
+    assert 'built_at' in db.user_stats.find_one({'_id': 'user-1'})
+
+    _add(db, 'Applied', datetime(2024, 5, 3))
+    assert UserStats.get('user-1')['total'] == 3
+
+
+def test_rebuild_counts_again_when_an_increment_lands_meanwhile(db, monkeypatch):
+    _add(db, 'Applied', datetime(2024, 5, 1))
+    compute = UserStats.compute
+    calls = []
+
+    def racing_compute(user_id):
+        stats = compute(user_id)
+        if not calls:
+            # Another request creates an application while the rebuild counts
+            _add(db, 'Offer', datetime(2024, 5, 2))
+        calls.append(stats)
+        return stats
+
+    monkeypatch.setattr(UserStats, 'compute', staticmethod(racing_compute))
+    stats, _ = UserStats.rebuild('user-1')
+
+    assert len(calls) == 2
+    assert stats['total'] == 2
+    assert db.user_stats.find_one({'_id': 'user-1'})['status_counts'] == {'Applied': 1, 'Offer': 1}
+
+
+def test_missing_stats_on_a_lagging_secondary_are_read_from_the_primary(db, monkeypatch):
+    _add(db, 'Applied', datetime(2024, 5, 1))
+    UserStats.rebuild('user-1')
+    secondary = mongomock.MongoClient()['applizz_test']
+
+    def rebuild(user_id):
+        raise AssertionError('rebuilt although the primary has the stats')
+
+    monkeypatch.setattr(UserStats, 'rebuild', staticmethod(rebuild))
+    assert UserStats.get('user-1', db=secondary)['total'] == 1
+
+
+def test_undated_applications_count_as_applied_today(db, monkeypatch):
+    monkeypatch.setattr(mongo_client, '_analytics_db', db)
+    now = datetime(2024, 5, 15, 12)
+    _add(db, 'Applied', now - timedelta(days=2))
+    _add(db, 'Interview', None)
+    _add(db, 'Interview', 7)
+
+    stats = DashboardStatsService.compute('user-1', days=7, now=now, include_upcoming=False)
+
+    assert stats.weekly_stats['last_week'] == 3
+    assert stats.timeline_counts['2024-05-15'] == {'Interview': 2}
+    assert stats.timeline_counts['2024-05-13'] == {'Applied': 1}
+    assert stats.velocity_metrics['apps_per_week'] == 1
+
+
+def test_aware_dates_count_on_their_utc_day():
+    eastern = timezone(timedelta(hours=-5))
+    assert UserStats._coerce_date(datetime(2024, 5, 1, 23, 30, tzinfo=eastern)) == datetime(2024, 5, 2, 4, 30)
+    assert UserStats._coerce_date('2024-05-01T23:30:00-05:00') == datetime(2024, 5, 2, 4, 30)
+    assert UserStats._coerce_date('2024-05-01T23:30:00Z') == datetime(2024, 5, 1, 23, 30)
+    assert UserStats._coerce_date(datetime(2024, 5, 1, 23, 30)) == datetime(2024, 5, 1, 23, 30)
+    assert UserStats._coerce_date('not a date') is None
+
+
+def test_compute_matches_the_increments(db):
+    eastern = timezone(timedelta(hours=-5))
+    _add(db, 'Applied', datetime(2024, 5, 1, 10))
+    _add(db, 'Applied', datetime(2024, 5, 1, 23, 30, tzinfo=eastern))
+    _add(db, 'Interview', datetime(2024, 5, 2, 9))
+    _add(db, 'Interview', None)
+    _add(db, 'Rejected', datetime(2024, 4, 20))
+    _add(db, 'Applied', datetime(2024, 5, 3), user_id='user-2')
+    incremented = db.user_stats.find_one({'_id': 'user-1'})
+
+    stats = UserStats.compute('user-1')
+
+    assert stats['total'] == incremented['total'] == 5
+    assert stats['status_counts'] == incremented['status_counts'] == {'Applied': 2, 'Interview': 2, 'Rejected': 1}
+    assert stats['daily'] == incremented['daily'] == {
+        '2024-04-20': {'Rejected': 1},
+        '2024-05-01': {'Applied': 1},
+        '2024-05-02': {'Applied': 1, 'Interview': 1}
+    }
+    assert stats['first_applied'] == incremented['first_applied'] == datetime(2024, 4, 20)
+    assert stats['last_applied'] == incremented['last_applied'] == datetime(2024, 5, 2, 9)
+
+
+def test_pipeline_converts_date_applied_before_grouping(monkeypatch):
+    monkeypatch.undo()
+    stages = UserStats.pipeline('user-1')
+
+    assert stages[0] == {'$match': {'user_id': 'user-1'}}
+    # Strings older code stored are converted too; anything unparseable counts as undated
+    assert stages[1]['$project']['applied'] == {'$convert': {
+        'input': '$date_applied', 'to': 'date', 'onError': None, 'onNull': None
+    }}
+    assert stages[2] == UserStats._group_stage()